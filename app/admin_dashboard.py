@@ -1,9 +1,23 @@
 import streamlit as st
-from database import initialize_db, get_connection
-from collections import Counter
+from database import (
+    initialize_db,
+    DB_PATH,
+    HOT_LEAD_SCORE,
+    get_change_version,
+    get_pipeline_stats,
+    count_leads_by_priority,
+    get_field_fill_rates,
+    get_leads_page,
+    get_bookings_page,
+    get_slot_capacity,
+    set_slot_capacity
+)
+from config import DEMO_MODES, DEMO_SLOT_TIMES
+import analytics
 import pandas as pd
-import os
-st.write("Using DB Path:", os.path.abspath("wizklub.db"))
+from snapshots import read_snapshot_manifest
+from datetime import datetime, timedelta, timezone
+st.write("Using DB Path:", DB_PATH)
 
 # ===============================
 # INIT
@@ -14,32 +28,128 @@ initialize_db()
 st.set_page_config(page_title="WizKlub CRM Dashboard", page_icon="📊")
 st.title("📊 WizKlub AI-Powered CRM Dashboard")
 
+WARM_SCORE = 60
+QUALIFICATION_FIELDS = ["grade", "interest"]
+PAGE_SIZES = [25, 50, 100, 250]
+TREND_DAYS = 30
+COHORT_DAYS = 14
+
 # ===============================
 # LOAD DATA DYNAMICALLY
 # ===============================
 
-conn = get_connection()
-cursor = conn.cursor()
+# Every query below runs in SQLite and is cached on the change counter
+# (bumped by triggers on leads and bookings), so a rerun with no new writes
+# costs one single-row read. A write from the chat app or the CRM worker
+# changes the version and the next rerun sees fresh numbers. Counts come
+# from the trigger-maintained pipeline_stats table, a few rows per stage.
+
+version = get_change_version()
+
+
+@st.cache_data(max_entries=8)
+def load_pipeline_stats(version):
+    return get_pipeline_stats()
+
+
+@st.cache_data(max_entries=8)
+def load_priority_counts(version):
+    return count_leads_by_priority(HOT_LEAD_SCORE, WARM_SCORE)
+
+
+@st.cache_data(max_entries=8)
+def load_fill_rates(version):
+    return get_field_fill_rates(QUALIFICATION_FIELDS)
+
+
+@st.cache_data(max_entries=8)
+def load_funnel_trends(version):
+    """
+    Daily stage arrivals, time in stage and cohort funnels from the
+    lead_events rollups. Read-only: refresh the rollups before calling.
+    """
+    now = datetime.now(timezone.utc)
+    end = now + timedelta(days=1)
+
+    arrivals = analytics.get_stage_arrivals(now - timedelta(days=TREND_DAYS), end, grain="day")
+    in_stage = analytics.get_time_in_stage(now - timedelta(days=TREND_DAYS), end)
+    cohorts = analytics.get_cohort_funnel(now - timedelta(days=COHORT_DAYS), end)
+
+    return (
+        pd.DataFrame.from_dict(arrivals, orient="index").fillna(0).sort_index(),
+        pd.Series(in_stage, name="Avg hours in stage").div(3600).round(1),
+        pd.DataFrame.from_dict(cohorts, orient="index")
+    )
+
+
+@st.cache_data(max_entries=4)
+def load_snapshot_report(exported_at):
+    """
+    Daily new leads per user type and booking rates, read column-wise from
+    the Parquet snapshots; keyed on the export time, not the live database.
+    """
+    today = datetime.now(timezone.utc).date()
+    daily = analytics.get_snapshot_daily_leads(today - timedelta(days=TREND_DAYS))
+    rates = analytics.get_snapshot_booking_rates()
+
+    return (
+        pd.DataFrame.from_dict(daily or {}, orient="index").fillna(0).sort_index(),
+        pd.Series(rates or {}, name="Booking rate")
+    )
+
+
+@st.cache_data(max_entries=64)
+def load_leads_page(version, page_size, page):
+    rows = get_leads_page(page_size, page * page_size)
+    return leads_frame(rows)
 
-# ---- LEADS ----
-cursor.execute("SELECT * FROM leads")
-leads = cursor.fetchall()
-lead_columns = [desc[0] for desc in cursor.description]
-leads_df = pd.DataFrame(leads, columns=lead_columns)
 
-# ---- BOOKINGS ----
-cursor.execute("""
-SELECT b.id, l.name, b.booking_date,
-       b.booking_time, b.mode, b.status
-FROM bookings b
-JOIN leads l ON b.lead_id = l.id
-""")
+@st.cache_data(max_entries=64)
+def load_bookings_page(version, page_size, page):
+    rows = get_bookings_page(page_size, page * page_size)
+    return pd.DataFrame([row.as_dict() for row in rows])
 
-bookings = cursor.fetchall()
-booking_columns = [desc[0] for desc in cursor.description]
-bookings_df = pd.DataFrame(bookings, columns=booking_columns)
 
-conn.close()
+def leads_frame(rows):
+    """
+    DataFrame of one page of leads with Priority and Qualification %.
+    """
+    leads_df = pd.DataFrame([row.as_dict() for row in rows])
+
+    if leads_df.empty:
+        return leads_df
+
+    leads_df["Priority"] = pd.cut(
+        leads_df["lead_score"].fillna(0),
+        bins=[float("-inf"), WARM_SCORE, HOT_LEAD_SCORE, float("inf")],
+        labels=["🔵 Cold", "🟡 Warm", "🔥 Hot"],
+        right=False
+    )
+
+    filled = leads_df[QUALIFICATION_FIELDS].replace(["", "null"], None).notna()
+    leads_df["Qualification %"] = (filled.mean(axis=1) * 100).round(0)
+
+    return leads_df
+
+
+def page_selector(key, total):
+    """
+    Page size and page number widgets; returns (page_size, page).
+    """
+    col1, col2 = st.columns(2)
+
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_size")
+    pages = max(1, -(-total // page_size))
+    page = col2.number_input(
+        f"Page (of {pages})",
+        min_value=1,
+        max_value=pages,
+        value=1,
+        key=f"{key}_page"
+    )
+
+    return page_size, page - 1
+
 
 # ===============================
 # METRICS
@@ -47,34 +157,77 @@ conn.close()
 
 st.subheader("📌 Key Metrics")
 
+pipeline_stats = load_pipeline_stats(version)
+totals = pipeline_stats.get("ALL", {"leads": 0, "hot": 0, "bookings": 0})
+
 col1, col2, col3, col4 = st.columns(4)
 
-col1.metric("Total Leads", len(leads_df))
-col2.metric("Total Bookings", len(bookings_df))
+col1.metric("Total Leads", totals["leads"])
+col2.metric("Total Bookings", totals["bookings"])
+col3.metric("Qualified Leads", pipeline_stats.get("Qualified", {"leads": 0})["leads"])
+col4.metric("Hot Leads", totals["hot"])
 
-qualified_count = 0
-if not leads_df.empty and "pipeline_stage" in leads_df.columns:
-    qualified_count = len(
-        leads_df[leads_df["pipeline_stage"] == "Qualified"]
-    )
+# ===============================
+# PIPELINE BREAKDOWN
+# ===============================
+
+st.subheader("📈 Pipeline Breakdown")
 
-col3.metric("Qualified Leads", qualified_count)
+pipeline_counts = {
+    stage: counts["leads"]
+    for stage, counts in pipeline_stats.items()
+    if stage != "ALL" and counts["leads"]
+}
 
-hot_count = 0
-if not leads_df.empty and "lead_score" in leads_df.columns:
-    hot_count = len(leads_df[leads_df["lead_score"] >= 90])
+if pipeline_counts:
+    st.bar_chart(pipeline_counts)
+
+# ===============================
+# FUNNEL TRENDS
+# ===============================
+
+st.subheader(f"📉 Funnel Trends (last {TREND_DAYS} days)")
 
-col4.metric("Hot Leads", hot_count)
+# Fold in events since the last refresh (a write) before the cached read;
+# new events always come with a new change version
+if st.session_state.get("rollups_version") != version:
+    analytics.refresh_rollups()
+    st.session_state.rollups_version = version
+
+arrivals_df, in_stage, cohorts_df = load_funnel_trends(version)
+
+if not arrivals_df.empty:
+    stage_cols = [stage for stage in analytics.STAGE_ORDER if stage in arrivals_df.columns]
+    stage_cols += [col for col in arrivals_df.columns if col not in stage_cols]
+    st.line_chart(arrivals_df[stage_cols])
+
+if not in_stage.empty:
+    st.dataframe(in_stage)
+
+if not cohorts_df.empty:
+    st.caption("Cohort funnel: share of each day's new leads that reached each stage")
+    st.dataframe(cohorts_df)
 
 # ===============================
-# PIPELINE BREAKDOWN
+# REPORTING SNAPSHOT
 # ===============================
 
-st.subheader("📈 Pipeline Breakdown")
+st.subheader("🗄️ Reporting Snapshot")
 
-if not leads_df.empty and "pipeline_stage" in leads_df.columns:
-    pipeline_counts = Counter(leads_df["pipeline_stage"])
-    st.bar_chart(pipeline_counts)
+snapshot = read_snapshot_manifest()
+
+if snapshot is None:
+    st.info("No Parquet snapshot yet. Run: python app/snapshots.py")
+else:
+    st.caption(f"From the Parquet snapshot exported at {snapshot['exported_at']} UTC")
+
+    daily_df, booking_rates = load_snapshot_report(snapshot["exported_at"])
+
+    if not daily_df.empty:
+        st.bar_chart(daily_df)
+
+    if not booking_rates.empty:
+        st.dataframe(booking_rates)
 
 # ===============================
 # PRIORITY SEGMENTATION
@@ -82,20 +235,11 @@ if not leads_df.empty and "pipeline_stage" in leads_df.columns:
 
 st.subheader("🔥 AI Lead Priority Segmentation")
 
-if not leads_df.empty and "lead_score" in leads_df.columns:
-
-    def categorize(score):
-        if score >= 90:
-            return "🔥 Hot"
-        elif score >= 60:
-            return "🟡 Warm"
-        else:
-            return "🔵 Cold"
+priority_counts = load_priority_counts(version)
 
-    leads_df["Priority"] = leads_df["lead_score"].apply(categorize)
-
-    priority_counts = Counter(leads_df["Priority"])
-    st.bar_chart(priority_counts)
+if priority_counts:
+    labels = {"Hot": "🔥 Hot", "Warm": "🟡 Warm", "Cold": "🔵 Cold"}
+    st.bar_chart({labels[name]: count for name, count in priority_counts.items()})
 
 # ===============================
 # QUALIFICATION COMPLETENESS
@@ -103,38 +247,17 @@ if not leads_df.empty and "lead_score" in leads_df.columns:
 
 st.subheader("🧠 Qualification Completeness")
 
-if not leads_df.empty:
-
-    def qualification_score(row):
-        fields = [
-            row.get("grade"),
-            row.get("interest")
-        ]
+if totals["leads"]:
+    fill_rates = load_fill_rates(version)
 
-        filled = sum([1 for f in fields if f not in [None, "", "null"]])
-        return round((filled / len(fields)) * 100, 0)
-
-    leads_df["Qualification %"] = leads_df.apply(
-        qualification_score,
-        axis=1
+    cols = st.columns(len(fill_rates) + 1)
+    cols[0].metric(
+        "Average Qualification %",
+        f"{sum(fill_rates.values()) / len(fill_rates):.0f}%"
     )
 
-    display_cols = [
-        col for col in [
-            "name",
-            "pipeline_stage",
-            "lead_score",
-            "Qualification %",
-            "Priority"
-        ] if col in leads_df.columns
-    ]
-
-    st.dataframe(
-        leads_df[display_cols].sort_values(
-            by="lead_score",
-            ascending=False
-        )
-    )
+    for col, (field, rate) in zip(cols[1:], fill_rates.items()):
+        col.metric(f"{field.title()} known", f"{rate:.0f}%")
 
 # ===============================
 # TOP LEADS
@@ -142,12 +265,9 @@ if not leads_df.empty:
 
 st.subheader("🏆 Top 5 High-Value Leads")
 
-if not leads_df.empty and "lead_score" in leads_df.columns:
-    top_leads = leads_df.sort_values(
-        by="lead_score",
-        ascending=False
-    ).head(5)
+top_leads = load_leads_page(version, 5, 0)
 
+if not top_leads.empty:
     st.dataframe(top_leads)
 
 # ===============================
@@ -155,11 +275,60 @@ if not leads_df.empty and "lead_score" in leads_df.columns:
 # ===============================
 
 st.subheader("📋 Full CRM View")
-st.dataframe(leads_df)
+
+total_leads = totals["leads"]
+
+if total_leads:
+    page_size, page = page_selector("leads", total_leads)
+    leads_df = load_leads_page(version, page_size, page)
+
+    display_cols = ["name", "pipeline_stage", "lead_score", "Qualification %", "Priority"]
+    display_cols += [col for col in leads_df.columns if col not in display_cols]
+
+    st.dataframe(leads_df[display_cols])
 
 # ===============================
 # BOOKINGS
 # ===============================
 
 st.subheader("📅 All Bookings")
-st.dataframe(bookings_df)
+
+total_bookings = totals["bookings"]
+
+if total_bookings:
+    page_size, page = page_selector("bookings", total_bookings)
+    st.dataframe(load_bookings_page(version, page_size, page))
+
+# ===============================
+# SLOT CAPACITY
+# ===============================
+
+st.subheader("⚙️ Demo Slot Capacity")
+
+# The selectboxes sit outside the form so picking a slot reruns the page
+# and the input starts from that slot's current capacity
+col1, col2, col3 = st.columns(3)
+
+slot_time = col1.selectbox("Time Slot", DEMO_SLOT_TIMES)
+mode = col2.selectbox("Mode", DEMO_MODES)
+
+with st.form("slot_capacity_form"):
+    # Keyed on the slot, or Streamlit keeps the first slot's value
+    capacity = st.number_input(
+        "Bookings per date",
+        min_value=0,
+        value=get_slot_capacity(slot_time, mode),
+        step=1,
+        key=f"slot_capacity_{slot_time}_{mode}"
+    )
+
+    if st.form_submit_button("Save Capacity"):
+        set_slot_capacity(slot_time, mode, int(capacity))
+        st.success(f"{slot_time} ({mode}) now takes {int(capacity)} booking(s) per date.")
+
+# After the form, so a saved change shows up in this run
+st.dataframe(pd.DataFrame(
+    [[get_slot_capacity(slot_time, mode) for mode in DEMO_MODES] for slot_time in DEMO_SLOT_TIMES],
+    index=DEMO_SLOT_TIMES,
+    columns=DEMO_MODES
+))
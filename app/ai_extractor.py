@@ -1,19 +1,8 @@
-from google import genai
-from dotenv import load_dotenv
-import os
 import json
 import re
 
-import streamlit as st
-load_dotenv()
-
-api_key = os.getenv("GEMINI_API_KEY")
-
-# If running on Streamlit Cloud
-if not api_key:
-    api_key = st.secrets.get("GEMINI_API_KEY")
-
-client = genai.Client(api_key=api_key)
+import llm_client
+from signal_rules import extract_signals_locally, needs_llm
 
 # ===============================
 # SAFE JSON PARSER
@@ -74,9 +63,8 @@ def normalize_signals(data):
 # MAIN EXTRACTION FUNCTION
 # ===============================
 
-def extract_lead_signals(text):
-
-    prompt = f"""
+def build_extraction_prompt(text):
+    return f"""
 You are an AI sales qualification extractor.
 
 Extract structured lead qualification data from the message.
@@ -105,20 +93,71 @@ Message:
 {text}
 """
 
+
+def parse_extraction(raw_output):
+    parsed = safe_json_extract(raw_output.strip())
+
+    if not parsed:
+        return None
+
+    return normalize_signals(parsed)
+
+
+def merge_signals(llm_signals, local_signals):
+    """
+    LLM values win; local values fill the fields the LLM left empty.
+    """
+    if not llm_signals:
+        return local_signals
+
+    return {
+        field: llm_signals.get(field) or local_signals.get(field)
+        for field in local_signals
+    }
+
+
+def local_signals_or_none(local):
+    """
+    Local result when it can stand in for the LLM; None for
+    messages with nothing to record.
+    """
+    if not any(local["signals"].values()):
+        return None
+
+    return local["signals"]
+
+
+def extract_lead_signals(text):
+
+    # Rule-based pass first; Gemini only when it is unsure
+    local = extract_signals_locally(text)
+
+    if not needs_llm(local):
+        return local_signals_or_none(local)
+
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
+        raw_output = llm_client.generate(build_extraction_prompt(text))
+        return merge_signals(parse_extraction(raw_output), local["signals"])
 
-        raw_output = response.text.strip()
+    except Exception:
+        return local_signals_or_none(local)
 
-        parsed = safe_json_extract(raw_output)
 
-        if not parsed:
-            return None
+async def extract_lead_signals_async(text, fallback=True):
+    """
+    With fallback=False a failed Gemini call raises instead of returning the
+    rule-based signals, so a caller that can retry (crm_queue) does.
+    """
+    local = extract_signals_locally(text)
+
+    if not needs_llm(local):
+        return local_signals_or_none(local)
 
-        return normalize_signals(parsed)
+    try:
+        raw_output = await llm_client.generate_async(build_extraction_prompt(text))
+        return merge_signals(parse_extraction(raw_output), local["signals"])
 
     except Exception:
-        return None
+        if not fallback:
+            raise
+        return local_signals_or_none(local)
@@ -1,11 +1,305 @@
-from app.database import get_all_leads
+import argparse
+import sys
+from datetime import date, datetime, timedelta, timezone
 
-def get_pipeline_counts():
-    leads = get_all_leads()
-    stages = {}
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 
-    for lead in leads:
-        stage = lead[8]
-        stages[stage] = stages.get(stage, 0) + 1
+from database import (
+    ROLLUP_GRAINS,
+    check_pipeline_stats,
+    get_cohort_rollups,
+    get_event_rollups,
+    get_pipeline_stats,
+    initialize_db,
+    refresh_event_rollups
+)
+from snapshots import read_snapshot
 
-    return stages
+# Funnel order used for cohort funnels and charts
+STAGE_ORDER = ["New", "Warm", "Qualified", "Hot", "Booked"]
+
+# Ranges up to this long are read from hourly rollups, longer ones daily
+HOURLY_MAX_RANGE = timedelta(days=7)
+
+
+def get_pipeline_counts(day="ALL", user_type="ALL"):
+    """
+    {stage: lead count}, read from the trigger-maintained pipeline_stats.
+    """
+    return {
+        stage: counts["leads"]
+        for stage, counts in get_pipeline_stats(day, user_type).items()
+        if stage != "ALL" and counts["leads"]
+    }
+
+
+# ===============================
+# FUNNEL ANALYTICS
+# ===============================
+
+# Everything below reads the lead_events rollups (database.py), not the raw
+# event log, so a query over months touches one row per bucket and stage
+# pair. Call refresh_rollups() first to include the latest events; it only
+# processes events added since the previous refresh.
+#
+# start/end are datetimes or dates; naive values are taken as UTC, which is
+# also what rollup buckets are aligned to. Ranges are [start, end).
+
+def refresh_rollups():
+    return refresh_event_rollups()
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+
+    if isinstance(value, date):
+        return _epoch(datetime(value.year, value.month, value.day))
+
+    return int(value)
+
+
+def _to_datetime(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def _pick_grain(start, end, grain):
+    if grain is not None:
+        return grain
+
+    return "hour" if end - start <= HOURLY_MAX_RANGE.total_seconds() else "day"
+
+
+def _rollups(start, end, grain=None):
+    start, end = _epoch(start), _epoch(end)
+    grain = _pick_grain(start, end, grain)
+
+    # Widen to whole buckets of the chosen grain
+    size = ROLLUP_GRAINS[grain]
+    return get_event_rollups(grain, start // size * size, -(-end // size) * size)
+
+
+def get_stage_transitions(start, end):
+    """
+    {(from_stage, to_stage): count} of stage changes in the range.
+    """
+    transitions = {}
+
+    for _, from_stage, to_stage, events, _, _, _ in _rollups(start, end):
+        if from_stage and from_stage != to_stage:
+            key = (from_stage, to_stage)
+            transitions[key] = transitions.get(key, 0) + events
+
+    return transitions
+
+
+def get_conversion_rates(start, end):
+    """
+    {from_stage: {to_stage: share}}: where leads leaving each stage in the
+    range went, as fractions of that stage's exits.
+    """
+    rates = {}
+
+    for (from_stage, to_stage), count in get_stage_transitions(start, end).items():
+        rates.setdefault(from_stage, {})[to_stage] = count
+
+    for targets in rates.values():
+        exits = sum(targets.values())
+        for to_stage in targets:
+            targets[to_stage] = round(targets[to_stage] / exits, 4)
+
+    return rates
+
+
+def get_time_in_stage(start, end):
+    """
+    {stage: average seconds spent in it} over leads that left the stage in
+    the range. Leads still in a stage are not counted.
+    """
+    totals = {}
+
+    for _, from_stage, _, _, _, seconds, exits in _rollups(start, end):
+        if exits:
+            total, count = totals.get(from_stage, (0.0, 0))
+            totals[from_stage] = (total + seconds, count + exits)
+
+    return {
+        stage: total / count
+        for stage, (total, count) in totals.items()
+    }
+
+
+def get_stage_arrivals(start, end, grain=None):
+    """
+    {bucket start: {stage: leads entering it}} for trend charts; new leads
+    count as arrivals in their first stage. Buckets without arrivals are
+    omitted.
+    """
+    series = {}
+    start_epoch, end_epoch = _epoch(start), _epoch(end)
+    grain = _pick_grain(start_epoch, end_epoch, grain)
+
+    for bucket, from_stage, to_stage, events, _, _, _ in _rollups(start, end, grain):
+        if from_stage != to_stage:
+            arrivals = series.setdefault(_to_datetime(bucket), {})
+            arrivals[to_stage] = arrivals.get(to_stage, 0) + events
+
+    return series
+
+
+def get_cohort_funnel(start, end, stages=STAGE_ORDER):
+    """
+    {cohort date: {"leads": cohort size, stage: share that ever reached it}}
+    for leads created in the range, grouped by UTC creation day.
+    """
+    cohorts = {}
+
+    for cohort_day, stage, leads in get_cohort_rollups(_epoch(start), _epoch(end)):
+        cohorts.setdefault(cohort_day, {})[stage] = leads
+
+    funnel = {}
+
+    for cohort_day, reached in sorted(cohorts.items()):
+        size = reached.get("ALL", 0)
+        row = {"leads": size}
+
+        for stage in stages:
+            row[stage] = round(reached.get(stage, 0) / size, 4) if size else 0.0
+
+        funnel[_to_datetime(cohort_day).date()] = row
+
+    return funnel
+
+
+# ===============================
+# SNAPSHOT REPORTS
+# ===============================
+
+# Column-wise reports over the Parquet snapshots (snapshots.py), so heavy
+# reporting reads only the columns and day partitions it needs and never
+# touches the live database. They are as fresh as the last export and
+# return None until a first export exists.
+
+def _counts(table, keys, column="id"):
+    grouped = table.group_by(keys).aggregate([(column, "count")])
+    return grouped.to_pylist()
+
+
+def get_snapshot_stage_counts(user_type=None):
+    """
+    {stage: leads} from the leads snapshot, optionally for one user_type.
+    """
+    filter = ds.field("user_type") == user_type if user_type else None
+    leads = read_snapshot("leads", ["id", "pipeline_stage"], filter)
+
+    if leads is None:
+        return None
+
+    return {
+        row["pipeline_stage"] or "unknown": row["id_count"]
+        for row in _counts(leads, ["pipeline_stage"])
+    }
+
+
+def get_snapshot_daily_leads(start=None, end=None):
+    """
+    {day: {user_type: new leads}} for days in [start, end) (dates), read
+    from the matching leads partitions only.
+    """
+    filter = ds.field("day") != "unknown"
+
+    if start is not None:
+        filter &= ds.field("day") >= start.isoformat()
+    if end is not None:
+        filter &= ds.field("day") < end.isoformat()
+
+    leads = read_snapshot("leads", ["id", "user_type", "day"], filter)
+
+    if leads is None:
+        return None
+
+    daily = {}
+
+    for row in _counts(leads, ["day", "user_type"]):
+        day = date.fromisoformat(row["day"])
+        daily.setdefault(day, {})[row["user_type"] or "unknown"] = row["id_count"]
+
+    return dict(sorted(daily.items()))
+
+
+def get_snapshot_booking_rates():
+    """
+    {user_type: share of leads with at least one booking}.
+    """
+    leads = read_snapshot("leads", ["id", "user_type"])
+    bookings = read_snapshot("bookings", ["lead_id"])
+
+    if leads is None:
+        return None
+
+    booked_ids = pc.unique(bookings["lead_id"]) if bookings is not None else pa.array([], pa.int64())
+    booked = pc.is_in(leads["id"], value_set=booked_ids).cast(pa.int64())
+
+    grouped = leads.append_column("booked", booked).group_by("user_type").aggregate(
+        [("booked", "sum"), ("id", "count")]
+    )
+
+    return {
+        row["user_type"] or "unknown": round(row["booked_sum"] / row["id_count"], 4)
+        for row in grouped.to_pylist()
+    }
+
+
+# ===============================
+# CONSISTENCY CHECK
+# ===============================
+
+def run_stats_check(rebuild=False):
+    """
+    Recomputes pipeline_stats from leads and bookings and reports drift.
+    Returns True if the stored counts were correct.
+    """
+    mismatches = check_pipeline_stats(rebuild=rebuild)
+
+    for (day, stage, user_type), expected, actual in mismatches:
+        print(
+            f"{day} / {stage} / {user_type}: "
+            f"expected (leads, hot, bookings) {expected}, found {actual}"
+        )
+
+    if mismatches:
+        print(f"{len(mismatches)} pipeline_stats row(s) differed; table rebuilt.")
+    else:
+        print("pipeline_stats is consistent" + (" (rebuilt)." if rebuild else "."))
+
+    return not mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CRM analytics maintenance.")
+    parser.add_argument(
+        "--check-stats", action="store_true",
+        help="verify pipeline_stats against leads and bookings, rebuilding it on drift"
+    )
+    parser.add_argument("--rebuild", action="store_true", help="always rebuild pipeline_stats")
+    parser.add_argument(
+        "--refresh-rollups", action="store_true",
+        help="fold new lead events into the hourly/daily rollups (e.g. from cron)"
+    )
+    args = parser.parse_args()
+
+    initialize_db()
+
+    if args.refresh_rollups:
+        print(f"{refresh_rollups()} lead event(s) rolled up.")
+
+    if args.check_stats or args.rebuild:
+        sys.exit(0 if run_stats_check(rebuild=args.rebuild) else 1)
+
+    if not args.refresh_rollups:
+        for stage, count in get_pipeline_counts().items():
+            print(f"{stage}: {count}")
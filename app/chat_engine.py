@@ -1,39 +1,52 @@
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from dotenv import load_dotenv
+import hashlib
+import json
+import logging
 import os
-import streamlit as st
-from google import genai
+import time
 from prompts import (
     BASE_SYSTEM_PROMPT,
     PARENT_INSTRUCTION,
-    SCHOOL_INSTRUCTION
+    SCHOOL_INSTRUCTION,
+    RESPONSE_INSTRUCTIONS
 )
-
-from database import (
-    get_bookings_by_lead,
-    update_lead_signals,
-    get_lead_by_email
+from prompt_builder import assemble_prompt, format_stats
+
+import crm_cache
+import crm_queue
+from response_cache import SemanticResponseCache
+from query_cache import QueryEmbeddingCache
+from config import (
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    PROMPT_TOKEN_BUDGET,
+    HISTORY_MESSAGE_TOKENS
 )
+import llm_client
+from resources import (
+    PROJECT_ROOT,
+    get_embedding_model,
+    get_vector_store,
+    get_index_manifest,
+    get_lexical_index
+)
+from index_factory import prepare_vectors
 
-from lead_manager import apply_ai_signals
-from ai_extractor import extract_lead_signals
-
-# Load local .env (for local development)
-import streamlit as st
-load_dotenv()
-
-api_key = os.getenv("GEMINI_API_KEY")
-
-# If running on Streamlit Cloud
-if not api_key:
-    api_key = st.secrets.get("GEMINI_API_KEY")
-
-client = genai.Client(api_key=api_key)
+response_cache = SemanticResponseCache(
+    path=os.path.join(PROJECT_ROOT, RESPONSE_CACHE_PATH),
+    threshold=RESPONSE_CACHE_THRESHOLD,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES
+)
 
+query_embeddings = QueryEmbeddingCache(max_entries=QUERY_EMBEDDING_CACHE_SIZE)
 
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+logger = logging.getLogger(__name__)
 
 
 # ===============================
@@ -41,9 +54,10 @@ embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
 # ===============================
 
 def load_vector_store():
-    index = faiss.read_index("vector_store/faiss_index/index.faiss")
-    chunks = np.load("vector_store/faiss_index/chunks.npy", allow_pickle=True)
-    return index, chunks
+    """
+    Process-wide (index, chunks); cheap to call on every rerun.
+    """
+    return get_vector_store()
 
 
 # ===============================
@@ -66,27 +80,168 @@ def classify_user_type(message):
 # RETRIEVAL (RAG)
 # ===============================
 
-def retrieve_chunks(query, index, chunks, k=3):
-    query_vector = embedding_model.encode([query])
-    distances, indices = index.search(np.array(query_vector), k)
-    return [chunks[i] for i in indices[0]]
+def embed_queries(queries):
+    """
+    (len(queries), dimension) embeddings; repeated queries come from the
+    cache and the rest are encoded in one batch.
+    """
+    return query_embeddings.get_many(queries, get_embedding_model().encode)
 
 
-# ===============================
-# MEMORY FORMATTER
-# ===============================
+def embed_query(query):
+    return embed_queries([query])
+
+
+def _overlaps(a, b):
+    return (
+        a.get("source") is not None
+        and a.get("source") == b.get("source")
+        and a["start"] <= b["end"] and b["start"] <= a["end"]
+    )
+
+
+def _merge(a, b):
+    """
+    One record covering two overlapping spans of the same source file.
+    Chunk texts are exact slices of the file, so offsets line up.
+    """
+    first, second = (a, b) if a["start"] <= b["start"] else (b, a)
+
+    if second["end"] > first["end"]:
+        text = first["text"] + second["text"][first["end"] - second["start"]:]
+    else:
+        text = first["text"]
+
+    return {
+        **a,
+        "text": text,
+        "start": first["start"],
+        "end": max(first["end"], second["end"])
+    }
+
+
+def fuse_rankings(rankings, rrf_k=RRF_K):
+    """
+    Reciprocal-rank fusion: each ranking adds 1 / (rrf_k + rank) to an id.
+    Only ranks matter, so BM25 and cosine scores need no calibration.
+    """
+    scores = {}
+
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _candidate_ids(query, dense, n, mode):
+    """
+    Chunk ids, best first. Hybrid mode fuses the dense and BM25 rankings;
+    stores without a lexical index fall back to dense only.
+    """
+    lexical_index = get_lexical_index()
+    if mode != "hybrid" or lexical_index is None:
+        return dense
+
+    scores, lexical = lexical_index.search(query, n)
+    return fuse_rankings([dense, lexical.tolist()])
+
 
-def format_chat_history(chat_history, max_turns=5):
-    recent_history = chat_history[-max_turns * 2:]
-    formatted = ""
+def _collect_records(candidates, chunks, k):
+    records = []
 
-    for role, message in recent_history:
-        if role == "user":
-            formatted += f"User: {message}\n"
+    for chunk_id in candidates:
+        record = chunks.get_record(chunk_id)
+
+        for i, kept in enumerate(records):
+            if _overlaps(kept, record):
+                records[i] = _merge(kept, record)
+                break
         else:
-            formatted += f"Assistant: {message}\n"
+            if len(records) < k:
+                records.append(record)
+
+    return records
+
+
+def retrieve_chunk_records_many(queries, index, chunks, k=3, query_vectors=None,
+                                mode=RETRIEVAL_MODE):
+    """
+    retrieve_chunk_records for a batch of queries: one encode call for the
+    uncached queries and one index.search for all of them.
+    """
+    if not queries:
+        return []
+
+    if query_vectors is None:
+        query_vectors = embed_queries(queries)
+
+    # Over-fetch so merged hits can be replaced by the next best ones
+    n = max(k * 2, HYBRID_CANDIDATES) if mode == "hybrid" else k * 2
+
+    # Cosine indexes expect normalized queries; legacy L2 ones do not
+    query_vectors = prepare_vectors(query_vectors, get_index_manifest())
+    distances, indices = index.search(query_vectors, n)
+
+    results = []
+
+    for query, row in zip(queries, indices):
+        # FAISS pads with -1 when the index holds fewer than n vectors
+        dense = [int(i) for i in row if i >= 0]
+        candidates = _candidate_ids(query, dense, n, mode)[:k * 2]
+        results.append(_collect_records(candidates, chunks, k))
+
+    return results
+
+
+def retrieve_chunk_records(query, index, chunks, k=3, query_vector=None, mode=RETRIEVAL_MODE):
+    """
+    Top k chunk records ({"id", "text", "source", "section", "start", "end"};
+    legacy stores only have id and text), best first. Hits that overlap an
+    earlier hit from the same file are merged into it, so the prompt never
+    carries the shared sentences twice.
 
-    return formatted
+    Pass query_vector (from embed_query) to reuse an embedding that was
+    already computed, e.g. for the response cache.
+    """
+    return retrieve_chunk_records_many(
+        [query], index, chunks, k=k, query_vectors=query_vector, mode=mode
+    )[0]
+
+
+def format_chunk(record):
+    """
+    Chunk text headed by its citation, when the store has one.
+    """
+    citation = " > ".join(part for part in (record.get("source"), record.get("section")) if part)
+
+    if not citation:
+        return record["text"]
+
+    return f"[{citation}]\n{record['text']}"
+
+
+def retrieve_chunks(query, index, chunks, k=3, query_vector=None, mode=RETRIEVAL_MODE):
+    """
+    Context strings for the prompt, each with its source citation.
+    """
+    records = retrieve_chunk_records(
+        query, index, chunks, k=k, query_vector=query_vector, mode=mode
+    )
+    return [format_chunk(record) for record in records]
+
+
+def retrieve_chunks_many(queries, index, chunks, k=3, query_vectors=None, mode=RETRIEVAL_MODE):
+    """
+    retrieve_chunks for many queries at once (offline evaluation, FAQ
+    pre-answering, load tests). Returns one list of context strings per query.
+    """
+    return [
+        [format_chunk(record) for record in records]
+        for records in retrieve_chunk_records_many(
+            queries, index, chunks, k=k, query_vectors=query_vectors, mode=mode
+        )
+    ]
 
 
 # ===============================
@@ -94,47 +249,41 @@ def format_chat_history(chat_history, max_turns=5):
 # ===============================
 
 def build_crm_context(crm_data):
-
+    """
+    Rendered once per lead version; crm_cache drops it when the lead or its
+    bookings change.
+    """
     if not crm_data:
         return ""
 
-    # Updated schema indexes:
-    # 0 id
-    # 1 name
-    # 2 email
-    # 3 phone
-    # 4 user_type
-    # 5 grade
-    # 6 interest
-    # 7 urgency
-    # 8 program_interest
-    # 9 budget_signal
-    # 10 extracted_intent
-    # 11 lead_score
-    # 12 pipeline_stage
-    # 13 created_at
-
-    lead_id = crm_data[0]
-    bookings = get_bookings_by_lead(lead_id)
+    return crm_cache.cached(
+        crm_data.id, "crm_context", lambda: _render_crm_context(crm_data), row=crm_data
+    )
+
+
+def _render_crm_context(crm_data):
+
+    lead_id = crm_data.id
+    bookings = crm_cache.get_bookings(lead_id)
 
     booking_info = ""
     if bookings:
         booking_info = "Existing Bookings:\n"
         for b in bookings:
-            booking_info += f"- {b[0]} at {b[1]} ({b[2]}) - {b[3]}\n"
+            booking_info += f"- {b.booking_date} at {b.booking_time} ({b.mode}) - {b.status}\n"
 
     return f"""
 Known CRM Information:
-Name: {crm_data[1]}
-Email: {crm_data[2]}
-User Type: {crm_data[4]}
-Grade: {crm_data[5]}
-Program Interest: {crm_data[8]}
-Urgency: {crm_data[7]}
-Budget Signal: {crm_data[9]}
-Intent: {crm_data[10]}
-Lead Score: {crm_data[11]}
-Pipeline Stage: {crm_data[12]}
+Name: {crm_data.name}
+Email: {crm_data.email}
+User Type: {crm_data.user_type}
+Grade: {crm_data.grade}
+Program Interest: {crm_data.program_interest}
+Urgency: {crm_data.urgency}
+Budget Signal: {crm_data.budget_signal}
+Intent: {crm_data.extracted_intent}
+Lead Score: {crm_data.lead_score}
+Pipeline Stage: {crm_data.pipeline_stage}
 
 {booking_info}
 
@@ -151,8 +300,15 @@ def build_sales_guidance(crm_data):
     if not crm_data:
         return ""
 
-    lead_score = crm_data[11]
-    stage = crm_data[12]
+    return crm_cache.cached(
+        crm_data.id, "sales_guidance", lambda: _render_sales_guidance(crm_data), row=crm_data
+    )
+
+
+def _render_sales_guidance(crm_data):
+
+    lead_score = crm_data.lead_score
+    stage = crm_data.pipeline_stage
 
     guidance = ""
 
@@ -175,67 +331,214 @@ def build_sales_guidance(crm_data):
 # RESPONSE GENERATOR
 # ===============================
 
-def generate_response(query, context_chunks, chat_history, user_type=None, crm_data=None):
+def build_prompt(query, context_chunks, chat_history, user_type=None, crm_data=None,
+                 budget=PROMPT_TOKEN_BUDGET, summary=""):
+    """
+    Prompt for this turn, fitted to the token budget (see prompt_builder).
+    Logs the token count of each section at debug level.
+    """
+    role_instruction = ""
+    if user_type == "Parent":
+        role_instruction = PARENT_INSTRUCTION
+    elif user_type == "School":
+        role_instruction = SCHOOL_INSTRUCTION
+
+    prompt, stats = assemble_prompt(
+        query,
+        context_chunks,
+        chat_history,
+        budget,
+        system=BASE_SYSTEM_PROMPT,
+        role_instruction=role_instruction,
+        crm_context=build_crm_context(crm_data),
+        sales_guidance=build_sales_guidance(crm_data),
+        instructions=RESPONSE_INSTRUCTIONS,
+        summary=summary,
+        message_tokens=HISTORY_MESSAGE_TOKENS
+    )
+
+    logger.debug(format_stats(stats))
+    return prompt
+
+
+# ===============================
+# RESPONSE CACHE
+# ===============================
+
+def _cacheable(query_vector, crm_data):
+    """
+    Personalized (CRM) turns are never served from or stored in the cache.
+    """
+    return query_vector is not None and not crm_data
+
+
+def _context_key(chat_history, summary):
+    """
+    Hash of the conversation the prompt carries besides the question: with
+    history the same words can ask something else ("what about grade 3?"),
+    so follow-ups only match entries stored after the same conversation.
+    Cached replies are returned verbatim, so sessions that keep asking the
+    same FAQ questions share their follow-up entries too. "" when there is
+    no conversation yet.
+    """
+    if not (chat_history or summary):
+        return ""
+
+    # Case and spacing of the user's words rarely change the answer
+    history = [
+        (role, " ".join(message.lower().split()) if role == "user" else message)
+        for role, message in chat_history
+    ]
+    data = json.dumps([summary, history], ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
 
-    context = "\n\n".join(context_chunks)
-    conversation_memory = format_chat_history(chat_history)
+def cached_response(query_vector, user_type, crm_data, chat_history, summary):
+    """
+    Cached answer for a similar question in the same conversation, or None.
+    """
+    if not _cacheable(query_vector, crm_data):
+        return None
 
-    # ===============================
-    # STRUCTURED AI SIGNAL EXTRACTION
-    # ===============================
+    answer = response_cache.lookup(
+        query_vector, user_type, _context_key(chat_history, summary)
+    )
 
+    if answer is not None:
+        stats = response_cache.stats()
+        logger.debug(
+            "Response cache hit (hit rate %.0f%%, saved %.1fs so far)",
+            stats["hit_rate"] * 100,
+            stats["latency_saved"]
+        )
+
+    return answer
+
+
+def cache_response(query_vector, user_type, crm_data, chat_history, summary,
+                   query, answer, generation_time):
+    if not _cacheable(query_vector, crm_data) or not answer:
+        return
+
+    response_cache.store(
+        query_vector, user_type, query, answer, generation_time,
+        _context_key(chat_history, summary)
+    )
+
+
+async def generate_response_async(query, context_chunks, chat_history, user_type=None,
+                                  crm_data=None, query_vector=None, summary=""):
+
+    cached = cached_response(query_vector, user_type, crm_data, chat_history, summary)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+
+    # Signal extraction and its CRM write go through the background CRM
+    # queue, so the reply never waits on them. This turn's prompt uses the
+    # CRM data as loaded; the next turn sees the updated signals.
     if crm_data:
-        signals = extract_lead_signals(query)
+        crm_queue.enqueue(crm_data.id, "extract", message=query)
+
+    final_prompt = build_prompt(
+        query,
+        context_chunks,
+        chat_history,
+        user_type=user_type,
+        crm_data=crm_data,
+        summary=summary
+    )
 
-        if signals:
-            lead_id = crm_data[0]
+    answer = await llm_client.generate_async(final_prompt)
 
-            # Update CRM fields
-            update_lead_signals(lead_id, signals)
+    cache_response(
+        query_vector, user_type, crm_data, chat_history, summary,
+        query, answer, time.perf_counter() - start
+    )
 
-            # Apply intelligent scoring
-            apply_ai_signals(lead_id, signals)
+    return answer
+
+
+def generate_response(query, context_chunks, chat_history, user_type=None,
+                      crm_data=None, query_vector=None, summary=""):
+    """
+    Blocking variant: returns the full reply text.
+    """
+    return llm_client.run(
+        generate_response_async(
+            query,
+            context_chunks,
+            chat_history,
+            user_type=user_type,
+            crm_data=crm_data,
+            query_vector=query_vector,
+            summary=summary
+        )
+    )
 
-            # Refresh CRM data after update
-            crm_data = get_lead_by_email(crm_data[2])
 
-    crm_context = build_crm_context(crm_data)
-    sales_guidance = build_sales_guidance(crm_data)
+# ===============================
+# STREAMING RESPONSES
+# ===============================
 
-    role_instruction = ""
-    if user_type == "Parent":
-        role_instruction = PARENT_INSTRUCTION
-    elif user_type == "School":
-        role_instruction = SCHOOL_INSTRUCTION
+class ResponseStream:
+    """
+    Iterates over the reply as Gemini streams it. Once exhausted, text holds
+    the full reply; ttft (time to first token) and total_time are seconds
+    measured from when the stream was created.
+    """
 
-    final_prompt = f"""
-{BASE_SYSTEM_PROMPT}
+    def __init__(self, pieces, on_complete=None):
+        self._pieces = pieces
+        self._on_complete = on_complete
+        self._start = time.perf_counter()
+        self.text = ""
+        self.ttft = None
+        self.total_time = None
 
-{role_instruction}
+    def __iter__(self):
+        parts = []
 
-{crm_context}
+        for piece in self._pieces:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self._start
 
-{sales_guidance}
+            parts.append(piece)
+            yield piece
 
-Conversation so far:
-{conversation_memory}
+        self.text = "".join(parts)
+        self.total_time = time.perf_counter() - self._start
 
-Relevant Knowledge:
-{context}
+        if self._on_complete:
+            self._on_complete(self)
 
-Current User Question:
-{query}
 
-Instructions:
-- Personalize using known CRM information.
-- If signals are missing (grade, urgency, interest), ask smart follow-up questions.
-- Suggest next best action.
-- Keep tone professional, persuasive, and friendly.
-"""
+def generate_response_stream(query, context_chunks, chat_history, user_type=None,
+                             crm_data=None, query_vector=None, summary=""):
+    """
+    Streaming variant of generate_response for st.write_stream.
+    """
+    cached = cached_response(query_vector, user_type, crm_data, chat_history, summary)
+    if cached is not None:
+        return ResponseStream(iter([cached]))
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=final_prompt
+    if crm_data:
+        crm_queue.enqueue(crm_data.id, "extract", message=query)
+
+    final_prompt = build_prompt(
+        query,
+        context_chunks,
+        chat_history,
+        user_type=user_type,
+        crm_data=crm_data,
+        summary=summary
     )
 
-    return response.text
+    def on_complete(stream):
+        cache_response(
+            query_vector, user_type, crm_data, chat_history, summary,
+            query, stream.text, stream.total_time
+        )
+
+    return ResponseStream(llm_client.generate_stream(final_prompt), on_complete)
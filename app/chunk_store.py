@@ -0,0 +1,152 @@
+import json
+import mmap
+import os
+
+import numpy as np
+
+# ===============================
+# MEMORY-MAPPED CHUNK STORE
+# ===============================
+
+# Chunk texts live in one contiguous UTF-8 blob plus an int64 offsets array
+# (chunk i is blob[offsets[i]:offsets[i + 1]]). Both are memory-mapped, so
+# processes serving the same index share the pages through the OS cache and
+# only the chunks actually returned by a search are ever decoded.
+#
+# Each chunk also has an int64 id (the id stored in the FAISS IndexIDMap).
+# Chunks are appended in arrival order; a sorted copy of the ids plus their
+# blob positions lets get() binary-search by id.
+#
+# Optional per-chunk metadata (source file, section title, character offsets)
+# is kept the same way: a blob of JSON objects plus its own offsets array.
+# Stores written before metadata existed simply return {} for every chunk.
+
+BLOB_FILE = "chunks.bin"
+OFFSETS_FILE = "chunk_offsets.npy"
+IDS_FILE = "chunk_ids.npy"
+POSITIONS_FILE = "chunk_positions.npy"
+META_FILE = "chunk_meta.bin"
+META_OFFSETS_FILE = "chunk_meta_offsets.npy"
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return b""
+
+
+class ChunkStoreWriter:
+    """
+    Streams chunks to disk; only the ids and offsets stay in memory.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._blob = open(os.path.join(directory, BLOB_FILE), "wb")
+        self._meta = open(os.path.join(directory, META_FILE), "wb")
+        self._offsets = [0]
+        self._meta_offsets = [0]
+        self._ids = []
+
+    def add(self, chunk_id, text, meta=None):
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._ids.append(chunk_id)
+
+        data = json.dumps(meta or {}, ensure_ascii=False).encode("utf-8")
+        self._meta.write(data)
+        self._meta_offsets.append(self._meta_offsets[-1] + len(data))
+
+    def close(self):
+        self._blob.close()
+        self._meta.close()
+
+        ids = np.array(self._ids, dtype=np.int64)
+        positions = np.argsort(ids, kind="stable")
+
+        np.save(os.path.join(self.directory, OFFSETS_FILE), np.array(self._offsets, dtype=np.int64))
+        np.save(os.path.join(self.directory, META_OFFSETS_FILE), np.array(self._meta_offsets, dtype=np.int64))
+        np.save(os.path.join(self.directory, IDS_FILE), ids[positions])
+        np.save(os.path.join(self.directory, POSITIONS_FILE), positions.astype(np.int64))
+
+
+def write_chunk_store(directory, chunks, ids=None, metas=None):
+    """
+    Writes chunks (a list of strings). ids defaults to their positions.
+    """
+    writer = ChunkStoreWriter(directory)
+
+    for i, chunk in enumerate(chunks):
+        writer.add(
+            i if ids is None else ids[i],
+            chunk,
+            None if metas is None else metas[i]
+        )
+
+    writer.close()
+
+
+class ChunkStore:
+
+    def __init__(self, directory):
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode="r")
+        self._positions = np.load(os.path.join(directory, POSITIONS_FILE), mmap_mode="r")
+
+        self._blob = _map(os.path.join(directory, BLOB_FILE))
+
+        try:
+            self._meta_offsets = np.load(os.path.join(directory, META_OFFSETS_FILE), mmap_mode="r")
+            self._meta = _map(os.path.join(directory, META_FILE))
+        except OSError:
+            self._meta_offsets = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return self._blob[start:end].decode("utf-8")
+
+    def meta(self, i):
+        """
+        Metadata dict of the chunk at position i; {} for legacy stores.
+        """
+        if self._meta_offsets is None:
+            return {}
+
+        start, end = self._meta_offsets[i], self._meta_offsets[i + 1]
+        return json.loads(self._meta[start:end].decode("utf-8"))
+
+    def position(self, chunk_id):
+        """
+        Blob position of the chunk with this id (as returned by an IndexIDMap
+        search). self.ids is sorted, so this is a binary search.
+        """
+        i = int(np.searchsorted(self.ids, chunk_id))
+
+        if i >= len(self) or self.ids[i] != chunk_id:
+            raise KeyError(chunk_id)
+
+        return int(self._positions[i])
+
+    def get(self, chunk_id):
+        return self[self.position(chunk_id)]
+
+    def get_record(self, chunk_id):
+        """
+        {"id", "text", **metadata} for the chunk with this id.
+        """
+        i = self.position(chunk_id)
+        return {"id": int(chunk_id), "text": self[i], **self.meta(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
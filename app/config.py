@@ -1,3 +1,43 @@
 MODEL_NAME = "gemini-2.5-flash"
 VECTOR_K = 3
 LEAD_QUALIFIED_THRESHOLD = 60
+
+# Semantic response cache (CRM-less answers reused for near-identical
+# questions); the path is relative to the project root
+RESPONSE_CACHE_PATH = "data/cache/response_cache"
+RESPONSE_CACHE_THRESHOLD = 0.9
+RESPONSE_CACHE_TTL_SECONDS = 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 500
+
+# Retrieval: "dense" (FAISS only) or "hybrid" (FAISS + BM25, fused by rank).
+# The index committed in the repo has no BM25 side; switch to "hybrid" once
+# it has been rebuilt with vector_store/build_index.py
+RETRIEVAL_MODE = "dense"
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+
+# Query embeddings reused for repeated messages (LRU, per process)
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Prompt assembly: total input budget (estimated tokens), turns of history
+# kept verbatim before they are summarized, and the cap on any single
+# history message
+PROMPT_TOKEN_BUDGET = 3000
+HISTORY_MAX_TURNS = 5
+HISTORY_MESSAGE_TOKENS = 150
+
+# Conversation memory: turns kept verbatim, turns folded into the rolling
+# summary per update, summary size cap, hard cap on stored messages
+SUMMARY_EVERY_TURNS = 3
+SUMMARY_MAX_TOKENS = 250
+MAX_STORED_MESSAGES = 40
+
+# Parquet snapshots of leads, bookings and lead events for reporting
+# (snapshots.py), relative to the project root
+SNAPSHOT_DIR = "data/snapshots"
+
+# Demo booking: offered time slots and modes, and how many bookings a slot
+# takes per mode unless slot_capacity says otherwise
+DEMO_SLOT_TIMES = ["10:00 AM", "2:00 PM", "4:00 PM"]
+DEMO_MODES = ["Online", "Offline"]
+DEFAULT_SLOT_CAPACITY = 1
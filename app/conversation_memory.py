@@ -0,0 +1,111 @@
+import logging
+import threading
+
+import llm_client
+from prompts import SUMMARY_PROMPT
+from prompt_builder import truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# ===============================
+# CONVERSATION MEMORY
+# ===============================
+
+# Per-session chat history with a rolling summary. The most recent
+# window_turns turns are kept verbatim; once summarize_every more turns have
+# fallen out of that window they are folded into the summary by a background
+# Gemini call and dropped. Facts from early in a long session (child's grade,
+# preferred timings) survive in the summary, while the prompt only ever
+# carries the window plus a summary capped at summary_tokens.
+#
+# The update runs on the llm_client loop, so a turn never waits for it;
+# until it lands the pending messages simply stay in the stored history.
+# messages is everything not yet in the summary and all of it goes to the
+# prompt builder, so a turn that has left the window stays in the prompt
+# (budget permitting) until the summary covers it.
+
+
+class ConversationMemory:
+
+    def __init__(self, window_turns=5, summarize_every=3, summary_tokens=250,
+                 max_messages=40):
+        self.window_turns = window_turns
+        self.summarize_every = summarize_every
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+
+        self._lock = threading.Lock()
+        self._messages = []
+        self._summary = ""
+        self._updating = False
+
+        self.summary_updates = 0
+        self.summary_failures = 0
+        self.summarized_messages = 0
+        self.discarded_messages = 0
+
+    @property
+    def messages(self):
+        with self._lock:
+            return list(self._messages)
+
+    @property
+    def summary(self):
+        with self._lock:
+            return self._summary
+
+    def add(self, role, message):
+        with self._lock:
+            self._messages.append((role, message))
+
+            # Hard cap for when summaries keep failing: lose the oldest
+            # turns rather than grow without bound
+            overflow = len(self._messages) - self.max_messages
+            if overflow > 0 and not self._updating:
+                del self._messages[:overflow]
+                self.discarded_messages += overflow
+
+            self._maybe_summarize()
+
+    def _maybe_summarize(self):
+        outside = len(self._messages) - self.window_turns * 2
+
+        if self._updating or outside < self.summarize_every * 2:
+            return
+
+        self._updating = True
+        llm_client.spawn(self._update_summary(self._summary, self._messages[:outside]))
+
+    async def _update_summary(self, summary, messages):
+        transcript = "".join(
+            f"{'User' if role == 'user' else 'Assistant'}: {message}\n"
+            for role, message in messages
+        )
+
+        try:
+            new_summary = await llm_client.generate_async(
+                SUMMARY_PROMPT.format(
+                    summary=summary or "(none yet)",
+                    transcript=transcript,
+                    words=self.summary_tokens * 3 // 4
+                )
+            )
+
+        except Exception:
+            logger.exception("Conversation summary failed")
+            with self._lock:
+                self.summary_failures += 1
+                self._updating = False
+            return
+
+        with self._lock:
+            # Only this updater removes from the front, so the first
+            # len(messages) entries are still the ones just summarized
+            self._summary = truncate_to_tokens(new_summary.strip(), self.summary_tokens)
+            del self._messages[:len(messages)]
+            self.summarized_messages += len(messages)
+            self.summary_updates += 1
+            self._updating = False
+
+            # More turns may have left the window meanwhile
+            self._maybe_summarize()
@@ -0,0 +1,145 @@
+import threading
+import time
+
+from database import get_bookings_by_lead, get_lead_by_email, on_lead_changed
+
+# ===============================
+# CRM CACHE
+# ===============================
+
+# Per-lead cache of the lead row, its bookings and anything rendered from
+# them (CRM context, sales guidance). Every database write that touches a
+# lead calls back into invalidate(), so an unchanged lead costs no queries
+# per chat turn. Entries also expire after ttl_seconds, which bounds how
+# long a write from another process (admin tools, a second server) can go
+# unnoticed.
+
+CRM_CACHE_TTL_SECONDS = 300
+
+_lock = threading.Lock()
+_entries = {}
+_email_ids = {}
+
+# Bumped by every invalidation; a row fetched while it changed is not kept
+_generation = 0
+
+# Per-lead invalidation counts, for rows handed in by writers (prime)
+_lead_generations = {}
+
+stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _fresh_entry(lead_id):
+    entry = _entries.get(lead_id)
+
+    if entry is None:
+        return None
+
+    if time.monotonic() - entry["loaded_at"] > CRM_CACHE_TTL_SECONDS:
+        del _entries[lead_id]
+        return None
+
+    return entry
+
+
+def _put_lead(row):
+    _entries[row.id] = {"lead": row, "loaded_at": time.monotonic()}
+    _email_ids[row.email] = row.id
+
+
+def get_lead(email):
+    """
+    Cached get_lead_by_email. Unknown emails are not cached, so a lead
+    saved later is found on the next call.
+    """
+    with _lock:
+        lead_id = _email_ids.get(email)
+        entry = _fresh_entry(lead_id) if lead_id is not None else None
+
+        if entry is not None:
+            stats["hits"] += 1
+            return entry["lead"]
+
+        stats["misses"] += 1
+        generation = _generation
+
+    row = get_lead_by_email(email)
+
+    if row is not None:
+        with _lock:
+            if generation == _generation:
+                _put_lead(row)
+
+    return row
+
+
+def generation(lead_id):
+    with _lock:
+        return _lead_generations.get(lead_id, 0)
+
+
+def prime(row, generation):
+    """
+    Stores a lead row the caller already has (e.g. from UPDATE ... RETURNING).
+    generation is generation(row.id) read before that write: the write's
+    own invalidation is expected, any other one means a later write may
+    have made row stale, so it is not kept.
+    """
+    if row is None:
+        return
+
+    with _lock:
+        if _lead_generations.get(row.id, 0) == generation + 1:
+            _put_lead(row)
+
+
+def get_bookings(lead_id):
+    return cached(lead_id, "bookings", lambda: get_bookings_by_lead(lead_id))
+
+
+def cached(lead_id, key, compute, row=None):
+    """
+    compute() memoized on the lead's entry until the lead changes. Without
+    a cached lead, or when row (the lead row compute() renders) is not the
+    cached one, the value is computed but not kept.
+    """
+    with _lock:
+        entry = _fresh_entry(lead_id)
+
+        if entry is not None and row is not None and entry["lead"] != row:
+            entry = None
+
+        if entry is not None and key in entry:
+            stats["hits"] += 1
+            return entry[key]
+
+        stats["misses"] += 1
+
+    value = compute()
+
+    with _lock:
+        # Only keep it if the entry was not invalidated meanwhile
+        if _entries.get(lead_id) is entry and entry is not None:
+            entry[key] = value
+
+    return value
+
+
+def invalidate(lead_id):
+    global _generation
+
+    with _lock:
+        _generation += 1
+        _lead_generations[lead_id] = _lead_generations.get(lead_id, 0) + 1
+
+        if _entries.pop(lead_id, None) is not None:
+            stats["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _email_ids.clear()
+
+
+on_lead_changed(invalidate)
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+import crm_cache
+import llm_client
+from ai_extractor import extract_lead_signals_async
+from database import (
+    add_outbox_jobs,
+    apply_lead_updates,
+    claim_outbox_jobs,
+    count_pending_outbox_jobs,
+    replace_outbox_job,
+    retry_outbox_jobs
+)
+from lead_manager import calculate_signal_score
+
+# ===============================
+# CRM WRITE QUEUE
+# ===============================
+
+# CRM bookkeeping runs on one background worker thread, never on the chat
+# request path. enqueue() only puts the job on an in-memory queue; the
+# worker then
+#
+#   1. persists queued jobs to the crm_outbox table (durable from here on;
+#      jobs left over from a crash are picked up on the next start) and
+#      claims a batch of due ones, so no other process runs them too,
+#   2. runs the signal extractions of the batch concurrently on the
+#      llm_client loop and stores their results back into the outbox,
+#   3. coalesces all due jobs per lead into one update (signals merged,
+#      score deltas summed, stage set or recomputed once) and applies the whole
+#      batch plus the outbox deletes in a single transaction.
+#
+# Failed jobs are retried with exponential backoff and kept as 'failed'
+# after MAX_ATTEMPTS.
+#
+# Job kinds and payloads:
+#   extract  {"message": ...}   extract signals from a chat message
+#   signals  {"signals": {...}} apply already extracted signals
+#   score    {"increment": n}   add to the lead score
+#   stage    {"stage": ...}     set the pipeline stage explicitly
+
+BATCH_SIZE = 200
+
+# Collects bursts (several writes for one turn) into one batch
+BATCH_WINDOW_SECONDS = 0.05
+
+POLL_SECONDS = 5.0
+
+# Claims older than this are taken to belong to a dead worker
+CLAIM_TIMEOUT_SECONDS = 600
+RETRY_BASE_DELAY_SECONDS = 2.0
+MAX_ATTEMPTS = 5
+
+_inbox = queue.Queue()
+_wake = threading.Event()
+_idle = threading.Condition()
+_busy = False
+_thread = None
+_start_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+stats = {"enqueued": 0, "applied": 0, "batches": 0, "retried": 0}
+
+
+def start():
+    """
+    Starts the worker thread once per process.
+    """
+    global _thread
+
+    with _start_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="crm-writer", daemon=True)
+            _thread.start()
+
+
+def enqueue(lead_id, kind, **payload):
+    """
+    Queues a CRM write and returns immediately.
+    """
+    global _busy
+
+    start()
+
+    with _idle:
+        _busy = True
+        _inbox.put((lead_id, kind, payload))
+        stats["enqueued"] += 1
+
+    _wake.set()
+
+
+def drain(timeout=None):
+    """
+    Waits until every queued job has been applied or scheduled for retry,
+    e.g. before a benchmark exits. Returns False on timeout.
+    """
+    _wake.set()
+
+    with _idle:
+        return _idle.wait_for(lambda: not _busy, timeout)
+
+
+# ===============================
+# WORKER
+# ===============================
+
+def _run():
+    global _busy
+
+    while True:
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+        time.sleep(BATCH_WINDOW_SECONDS)
+
+        try:
+            while _process_batch():
+                pass
+
+        except Exception:
+            # Jobs stay in the outbox; the next wake-up tries again
+            logger.exception("CRM writer error")
+
+        with _idle:
+            if _inbox.empty():
+                _busy = False
+                _idle.notify_all()
+
+
+def _persist_inbox():
+    jobs = []
+
+    while True:
+        try:
+            jobs.append(_inbox.get_nowait())
+        except queue.Empty:
+            break
+
+    if jobs:
+        add_outbox_jobs(jobs)
+
+
+def _process_batch():
+    """
+    Handles one batch of due jobs. Returns True if there may be more.
+    """
+    _persist_inbox()
+
+    claim, jobs = claim_outbox_jobs(BATCH_SIZE, CLAIM_TIMEOUT_SECONDS)
+    if not jobs:
+        return False
+
+    batch_size = len(jobs)
+    payloads = {job.id: json.loads(job.payload) for job in jobs}
+    jobs = _run_extractions(jobs, payloads, claim)
+
+    updates = coalesce(jobs, payloads)
+    done = [job.id for job in jobs]
+
+    # Read before the write, so rows it returns are only cached if no
+    # other write to the lead was seen meanwhile
+    generations = {lead_id: crm_cache.generation(lead_id) for lead_id, *_ in updates}
+
+    try:
+        rows = apply_lead_updates(updates, _ids_by_lead(jobs), claim)
+
+    except Exception:
+        # One bad lead must not hold back the rest: apply lead by lead
+        logger.exception("CRM batch failed, retrying per lead")
+        rows = _apply_per_lead(jobs, payloads, claim)
+
+    for row in rows:
+        crm_cache.prime(row, generations[row.id])
+
+    stats["batches"] += 1
+    stats["applied"] += len(done)
+    return batch_size == BATCH_SIZE
+
+
+def _ids_by_lead(jobs):
+    ids = {}
+
+    for job in jobs:
+        ids.setdefault(job.lead_id, []).append(job.id)
+
+    return ids
+
+
+def _run_extractions(jobs, payloads, claim):
+    """
+    Turns extract jobs into signals jobs. Jobs whose extraction failed are
+    scheduled for retry and left out of the batch.
+    """
+    extract = [job for job in jobs if job.kind == "extract"]
+    if not extract:
+        return jobs
+
+    # Gemini failures are retried; the last attempt settles for the
+    # rule-based signals rather than losing the message
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                extract_lead_signals_async(
+                    payloads[job.id]["message"],
+                    fallback=job.attempts + 1 >= MAX_ATTEMPTS
+                )
+                for job in extract
+            ),
+            return_exceptions=True
+        )
+
+    results = llm_client.run(run_all())
+    failed = set()
+
+    for job, result in zip(extract, results):
+        if isinstance(result, Exception):
+            failed.add(job.id)
+            retry_outbox_jobs([job.id], claim, repr(result), RETRY_BASE_DELAY_SECONDS, MAX_ATTEMPTS)
+            stats["retried"] += 1
+            continue
+
+        # Recorded so a crash before the apply does not pay for the LLM again
+        payloads[job.id] = {"signals": result or {}}
+        replace_outbox_job(job.id, claim, "signals", payloads[job.id])
+        job.kind = "signals"
+
+    return [job for job in jobs if job.id not in failed]
+
+
+def coalesce(jobs, payloads):
+    """
+    One (lead_id, signals, score_delta, stage, restage) update per lead,
+    equivalent to applying its jobs one after another: later non-null
+    signals win and score deltas add up. An explicit stage stands unless
+    a signals or score job follows it; then, as a sequential apply would,
+    the stage is recomputed from the final score (restage), except that
+    'Booked' is kept.
+    """
+    updates = {}
+
+    for job in sorted(jobs, key=lambda job: job.id):
+        payload = payloads[job.id]
+        signals, delta, stage, restage = updates.get(job.lead_id, ({}, 0, None, False))
+
+        if job.kind == "stage":
+            stage, restage = payload["stage"], False
+
+        else:
+            if job.kind == "signals":
+                new = payload["signals"]
+                signals = {**signals, **{key: value for key, value in new.items() if value is not None}}
+                delta += calculate_signal_score(new)
+
+            elif job.kind == "score":
+                delta += payload["increment"]
+
+            # The explicit stage replaced whatever the lead had, so the
+            # recompute must not fall back to a stored 'Booked'
+            if stage is not None and stage != "Booked":
+                stage, restage = None, True
+
+        updates[job.lead_id] = (signals, delta, stage, restage)
+
+    return [
+        (lead_id, signals, delta, stage, restage)
+        for lead_id, (signals, delta, stage, restage) in updates.items()
+    ]
+
+
+def _apply_per_lead(jobs, payloads, claim):
+    rows = []
+    by_lead = {}
+
+    for job in jobs:
+        by_lead.setdefault(job.lead_id, []).append(job)
+
+    for lead_id, lead_jobs in by_lead.items():
+        ids = [job.id for job in lead_jobs]
+
+        try:
+            rows.extend(apply_lead_updates(
+                coalesce(lead_jobs, payloads), {lead_id: ids}, claim
+            ))
+
+        except Exception as e:
+            retry_outbox_jobs(ids, claim, repr(e), RETRY_BASE_DELAY_SECONDS, MAX_ATTEMPTS)
+            stats["retried"] += len(ids)
+
+    return rows
+
+
+def pending():
+    """
+    Jobs queued in memory plus those waiting in the outbox.
+    """
+    return _inbox.qsize() + count_pending_outbox_jobs()
@@ -1,7 +1,19 @@
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from datetime import datetime
 import os
+import json
+import logging
+import queue
+import time
+import uuid
+import weakref
+
+from config import DEFAULT_SLOT_CAPACITY
+from models import Booking, Lead, OutboxJob, row_factory
+from pipeline_stages import determine_pipeline_stage
 
 # Force DB to root directory explicitly
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -9,23 +21,166 @@ DB_PATH = os.path.join(PROJECT_ROOT, "wizklub.db")
 
 print("Database path:", DB_PATH)
 
+logger = logging.getLogger(__name__)
+
 
 
 # ===============================
 # CONNECTION
 # ===============================
 
+# Connection tuning. A thread borrows one connection for as long as it
+# runs and hands it back to a process-wide pool when it ends. Streamlit
+# starts a new script thread on every rerun, so without the pool each
+# interaction would pay again for opening the file, the pragmas and a cold
+# statement cache; with it they are paid once per pooled connection.
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384
+MMAP_SIZE_BYTES = 128 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 128
+
+# Idle connections kept for the next thread; extras are closed
+POOL_SIZE = 8
+
+_local = threading.local()
+_idle = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+class _Lease:
+    """
+    Held in the borrowing thread's local storage only, so it is released
+    (and the connection handed back) when that thread ends.
+    """
+    __slots__ = ("conn", "__weakref__")
+
+
+def _open_connection():
+    # Pooled connections move between threads, but only ever serve one
+    # thread at a time
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+
+    # WAL lets readers proceed while a writer commits, which is what
+    # removes "database is locked" between concurrent chat sessions.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    # Score -> stage mapping used by the lead update statements
+    conn.create_function("pipeline_stage_for", 1, determine_pipeline_stage, deterministic=True)
+
+    return conn
+
+
+def _give_back(path, conn):
+    if conn.in_transaction:
+        conn.rollback()
+
+    try:
+        _idle.put_nowait((path, conn))
+    except queue.Full:
+        conn.close()
+
+
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    """
+    Returns the calling thread's connection, taken from the pool (or opened)
+    on first use and given back when the thread ends. Callers must not close
+    it.
+    """
+    lease = getattr(_local, "lease", None)
+
+    if lease is None:
+        conn = None
+
+        while conn is None:
+            try:
+                path, conn = _idle.get_nowait()
+            except queue.Empty:
+                path, conn = DB_PATH, _open_connection()
+
+            # DB_PATH was repointed (benchmarks, tests) since it was pooled
+            if path != DB_PATH:
+                conn.close()
+                conn = None
+
+        lease = _Lease()
+        lease.conn = conn
+        weakref.finalize(lease, _give_back, path, conn)
+        _local.lease = lease
+
+    return lease.conn
+
+
+def close_connection():
+    """
+    Gives this thread's connection back to the pool now rather than when the
+    thread ends, e.g. in a worker that stays alive but is done with the DB.
+    """
+    _local.lease = None
+
+
+LEAD_ROWS = row_factory(Lead)
+BOOKING_ROWS = row_factory(Booking)
+OUTBOX_ROWS = row_factory(OutboxJob)
+
+
+def query(sql, params=(), rows=None):
+    """
+    Executes a read on this thread's connection; rows is a row factory
+    (LEAD_ROWS / BOOKING_ROWS) or None for plain tuples.
+    """
+    cursor = get_connection().cursor()
+    cursor.row_factory = rows
+    return cursor.execute(sql, params)
+
+
+@contextmanager
+def transaction():
+    """
+    Yields a cursor on the pooled connection and commits on success,
+    rolling back if the block raises.
+    """
+    conn = get_connection()
+    with conn:
+        yield conn.cursor()
 
 
 # ===============================
-# INITIALIZE DATABASE
+# CHANGE NOTIFICATION
 # ===============================
 
-def initialize_db():
-    conn = get_connection()
-    cursor = conn.cursor()
+# Callbacks run with a lead id after every committed write that changes the
+# lead or its bookings, so in-process caches (crm_cache) can drop stale
+# entries. Writes made by another process are not seen here.
+_lead_listeners = []
+
+
+def on_lead_changed(callback):
+    _lead_listeners.append(callback)
+
+
+def _lead_changed(lead_id):
+    for callback in _lead_listeners:
+        callback(lead_id)
+
+
+# ===============================
+# SCHEMA MIGRATIONS
+# ===============================
+
+# Each migration moves the schema from version N-1 to N and is recorded in
+# PRAGMA user_version. Migrations only ever add objects, so existing rows are
+# never rewritten. Append new migrations; never edit an applied one.
+
+def _migration_001_base_tables(cursor):
 
     # Leads Table (Upgraded Schema)
     cursor.execute("""
@@ -61,8 +216,319 @@ def initialize_db():
     )
     """)
 
-    conn.commit()
-    conn.close()
+
+def _migration_002_lookup_indexes(cursor):
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_bookings_lead_id
+    ON bookings (lead_id)
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_bookings_created_at
+    ON bookings (created_at)
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_leads_created_at
+    ON leads (created_at)
+    """)
+
+    # A slot can only be booked once. Databases that already hold double
+    # bookings get a plain index instead, so the migration never has to
+    # delete their rows.
+    cursor.execute("""
+    SELECT 1 FROM bookings
+    GROUP BY booking_date, booking_time
+    HAVING COUNT(*) > 1
+    LIMIT 1
+    """)
+
+    unique = "" if cursor.fetchone() else "UNIQUE"
+
+    if not unique:
+        logger.warning("Duplicate slot bookings found; idx_bookings_slot is not unique.")
+
+    cursor.execute(f"""
+    CREATE {unique} INDEX IF NOT EXISTS idx_bookings_slot
+    ON bookings (booking_date, booking_time)
+    """)
+
+
+def _migration_003_crm_outbox(cursor):
+
+    # Durable queue of CRM writes made off the chat path (crm_queue.py).
+    # payload is JSON; failed jobs stay with their last error for inspection.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS crm_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lead_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    )
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_crm_outbox_due
+    ON crm_outbox (status, available_at)
+    """)
+
+
+def _migration_004_change_counter(cursor):
+
+    # Single-row counter bumped by every write to leads or bookings, from
+    # any process. The admin dashboard keys its caches on it.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS change_counter (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """)
+
+    cursor.execute("INSERT OR IGNORE INTO change_counter (id, version) VALUES (1, 0)")
+
+    for table in ("leads", "bookings"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE change_counter SET version = version + 1 WHERE id = 1;
+            END
+            """)
+
+    # Dashboard pagination and top-lead lists order by score
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_leads_score
+    ON leads (lead_score DESC, id)
+    """)
+
+
+def _migration_005_pipeline_stats(cursor):
+
+    # Funnel counters kept current by triggers (see PIPELINE STATS below)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pipeline_stats (
+        day TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        user_type TEXT NOT NULL,
+        leads INTEGER NOT NULL DEFAULT 0,
+        hot INTEGER NOT NULL DEFAULT 0,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, stage, user_type)
+    ) WITHOUT ROWID
+    """)
+
+    for statement in _pipeline_stats_triggers():
+        cursor.execute(statement)
+
+    _fill_pipeline_stats(cursor, "pipeline_stats")
+
+
+def _migration_006_lead_events(cursor):
+
+    # Append-only history of lead stage and score changes (see LEAD EVENTS)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS lead_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lead_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        from_stage TEXT,
+        to_stage TEXT,
+        old_score INTEGER,
+        new_score INTEGER,
+        ts REAL NOT NULL,
+        seconds_in_stage REAL,
+        first_reach INTEGER NOT NULL DEFAULT 0,
+        cohort_day INTEGER
+    )
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_lead_events_lead
+    ON lead_events (lead_id, id)
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS lead_event_rollups (
+        grain TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        from_stage TEXT NOT NULL,
+        to_stage TEXT NOT NULL,
+        events INTEGER NOT NULL DEFAULT 0,
+        score_change INTEGER NOT NULL DEFAULT 0,
+        stage_seconds REAL NOT NULL DEFAULT 0,
+        stage_exits INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (grain, bucket, from_stage, to_stage)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cohort_rollups (
+        cohort_day INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        leads INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (cohort_day, stage)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        name TEXT PRIMARY KEY,
+        event_id INTEGER NOT NULL
+    )
+    """)
+
+    for statement in _lead_event_triggers():
+        cursor.execute(statement)
+
+    # Existing leads start their history with a 'created' event in their
+    # current stage; earlier transitions were never recorded.
+    cursor.execute(f"""
+    INSERT INTO lead_events (
+        lead_id, kind, to_stage, new_score, ts, first_reach, cohort_day
+    )
+    SELECT id, 'created', pipeline_stage, lead_score,
+           COALESCE(CAST(strftime('%s', created_at, 'utc') AS REAL), {_NOW}),
+           1, {_cohort_day("leads")}
+    FROM leads
+    ORDER BY id
+    """)
+
+
+def _migration_007_snapshot_dirty(cursor):
+
+    # Day partitions of leads/bookings changed since the last Parquet
+    # export (see SNAPSHOT EXPORT); seq changes on every write
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS snapshot_dirty (
+        name TEXT NOT NULL,
+        day TEXT NOT NULL,
+        seq INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (name, day)
+    ) WITHOUT ROWID
+    """)
+
+    for statement in _snapshot_dirty_triggers():
+        cursor.execute(statement)
+
+    # Everything that exists now still has to be exported once
+    for table in SNAPSHOT_TABLES:
+        cursor.execute(f"""
+        INSERT OR IGNORE INTO snapshot_dirty (name, day)
+        SELECT DISTINCT '{table}', {_partition_day(table)} FROM {table}
+        """)
+
+
+def _migration_008_slot_capacity(cursor):
+
+    # Bookings a (time slot, mode) takes per date; missing rows fall back to
+    # DEFAULT_SLOT_CAPACITY
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS slot_capacity (
+        slot_time TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        capacity INTEGER NOT NULL CHECK (capacity >= 0),
+        PRIMARY KEY (slot_time, mode)
+    )
+    """)
+
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(bookings)")]
+    if "seat" not in columns:
+        cursor.execute("ALTER TABLE bookings ADD COLUMN seat INTEGER")
+
+    # Existing bookings take seats 1..n in booking order, so every booking
+    # holds a seat (past double bookings simply hold seats beyond capacity)
+    cursor.execute("""
+    UPDATE bookings SET seat = numbered.seat
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY booking_date, booking_time, mode ORDER BY id
+        ) AS seat
+        FROM bookings
+    ) AS numbered
+    WHERE numbered.id = bookings.id AND bookings.seat IS NULL
+    """)
+
+    # One booking per seat replaces one booking per slot; the seat number
+    # is what keeps concurrent bookings within capacity
+    cursor.execute("DROP INDEX IF EXISTS idx_bookings_slot")
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_seat
+    ON bookings (booking_date, booking_time, mode, seat)
+    """)
+
+
+def _migration_009_outbox_claims(cursor):
+
+    # A worker claims due jobs (status 'running' under a claim token) before
+    # running them, so two processes never apply the same job. Claims older
+    # than the worker's timeout belong to a dead worker and are taken over.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(crm_outbox)")}
+
+    if "claim" not in columns:
+        cursor.execute("ALTER TABLE crm_outbox ADD COLUMN claim TEXT")
+
+    if "claimed_at" not in columns:
+        cursor.execute("ALTER TABLE crm_outbox ADD COLUMN claimed_at REAL")
+
+
+MIGRATIONS = [
+    _migration_001_base_tables,
+    _migration_002_lookup_indexes,
+    _migration_003_crm_outbox,
+    _migration_004_change_counter,
+    _migration_005_pipeline_stats,
+    _migration_006_lead_events,
+    _migration_007_snapshot_dirty,
+    _migration_008_slot_capacity,
+    _migration_009_outbox_claims,
+]
+
+
+def get_schema_version():
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate():
+    """
+    Applies pending migrations, each in its own transaction. Safe to call on
+    every startup and from several processes at once.
+    """
+    conn = get_connection()
+
+    for version, migration in enumerate(MIGRATIONS, start=1):
+
+        if get_schema_version() >= version:
+            continue
+
+        # IMMEDIATE takes the write lock up front, so a second process
+        # waits here and then sees the bumped version.
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            if get_schema_version() < version:
+                migration(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version}")
+
+            conn.commit()
+
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ===============================
+# INITIALIZE DATABASE
+# ===============================
+
+def initialize_db():
+    migrate()
 
 
 # ===============================
@@ -76,82 +542,65 @@ def save_lead(name, email, phone, user_type,
               program_interest=None,
               budget_signal=None,
               extracted_intent=None,
-              lead_score=0):
-
-    conn = get_connection()
-    cursor = conn.cursor()
+              lead_score=0,
+              pipeline_stage="New"):
 
     try:
-        cursor.execute("""
-        INSERT INTO leads (
-            name, email, phone, user_type,
-            grade, interest,
-            urgency, program_interest,
-            budget_signal, extracted_intent,
-            lead_score, pipeline_stage, created_at
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            name,
-            email,
-            phone,
-            user_type,
-            grade,
-            interest,
-            urgency,
-            program_interest,
-            budget_signal,
-            extracted_intent,
-            lead_score,
-            "New",
-            datetime.now()
-        ))
-
-        conn.commit()
+        with transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO leads (
+                name, email, phone, user_type,
+                grade, interest,
+                urgency, program_interest,
+                budget_signal, extracted_intent,
+                lead_score, pipeline_stage, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                name,
+                email,
+                phone,
+                user_type,
+                grade,
+                interest,
+                urgency,
+                program_interest,
+                budget_signal,
+                extracted_intent,
+                lead_score,
+                pipeline_stage,
+                datetime.now()
+            ))
 
     except sqlite3.IntegrityError:
         # Email already exists
         pass
 
-    conn.close()
-
 
 def get_lead_by_email(email):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM leads WHERE email = ?", (email,))
-    lead = cursor.fetchone()
-
-    conn.close()
-    return lead
+    cursor = query("SELECT * FROM leads WHERE email = ?", (email,), LEAD_ROWS)
+    return cursor.fetchone()
 
 
 def update_pipeline_stage(lead_id, stage):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    UPDATE leads SET pipeline_stage = ?
-    WHERE id = ?
-    """, (stage, lead_id))
+    with transaction() as cursor:
+        cursor.execute("""
+        UPDATE leads SET pipeline_stage = ?
+        WHERE id = ?
+        """, (stage, lead_id))
 
-    conn.commit()
-    conn.close()
+    _lead_changed(lead_id)
 
 
 def increase_lead_score(lead_id, increment):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    UPDATE leads
-    SET lead_score = lead_score + ?
-    WHERE id = ?
-    """, (increment, lead_id))
+    with transaction() as cursor:
+        cursor.execute("""
+        UPDATE leads
+        SET lead_score = lead_score + ?
+        WHERE id = ?
+        """, (increment, lead_id))
 
-    conn.commit()
-    conn.close()
+    _lead_changed(lead_id)
 
 
 # ===============================
@@ -162,89 +611,333 @@ def update_lead_signals(lead_id, signals):
     """
     Updates structured AI extracted signals.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as cursor:
+        cursor.execute("""
+        UPDATE leads
+        SET grade = COALESCE(?, grade),
+            program_interest = COALESCE(?, program_interest),
+            urgency = COALESCE(?, urgency),
+            budget_signal = COALESCE(?, budget_signal),
+            extracted_intent = COALESCE(?, extracted_intent)
+        WHERE id = ?
+        """, (
+            signals.get("grade"),
+            signals.get("program_interest"),
+            signals.get("urgency"),
+            signals.get("budget_signal"),
+            signals.get("intent"),
+            lead_id
+        ))
+
+    _lead_changed(lead_id)
 
+
+def _apply_lead_update(cursor, lead_id, signals, score_delta, stage=None, restage=False):
+    """
+    Merges signals, adds score_delta and sets the stage in one UPDATE ...
+    RETURNING. An explicit stage wins; restage recomputes the stage with
+    pipeline_stage_for() whatever it was; otherwise 'Booked' is kept and
+    any other stage is recomputed.
+    """
+    cursor.row_factory = LEAD_ROWS
     cursor.execute("""
     UPDATE leads
     SET grade = COALESCE(?, grade),
         program_interest = COALESCE(?, program_interest),
         urgency = COALESCE(?, urgency),
         budget_signal = COALESCE(?, budget_signal),
-        extracted_intent = COALESCE(?, extracted_intent)
+        extracted_intent = COALESCE(?, extracted_intent),
+        lead_score = lead_score + ?,
+        pipeline_stage = CASE
+            WHEN ? IS NOT NULL THEN ?
+            WHEN pipeline_stage = 'Booked' AND NOT ? THEN pipeline_stage
+            ELSE pipeline_stage_for(lead_score + ?)
+        END
     WHERE id = ?
+    RETURNING *
     """, (
         signals.get("grade"),
         signals.get("program_interest"),
         signals.get("urgency"),
         signals.get("budget_signal"),
         signals.get("intent"),
+        score_delta,
+        stage,
+        stage,
+        restage,
+        score_delta,
         lead_id
     ))
 
-    conn.commit()
-    conn.close()
+    return cursor.fetchone()
+
+
+def apply_lead_signals(lead_id, signals, score_delta):
+    """
+    Merges signals, adds score_delta and recomputes the pipeline stage in a
+    single UPDATE ... RETURNING. A lead that already booked a demo keeps
+    its 'Booked' stage. Returns the refreshed Lead, or None if the lead
+    does not exist.
+    """
+    with transaction() as cursor:
+        row = _apply_lead_update(cursor, lead_id, signals, score_delta)
+
+    _lead_changed(lead_id)
+    return row
+
+
+# ===============================
+# CRM OUTBOX
+# ===============================
+
+def add_outbox_jobs(jobs):
+    """
+    jobs: (lead_id, kind, payload dict) tuples, stored in one transaction.
+    """
+    now = time.time()
+
+    with transaction() as cursor:
+        cursor.executemany("""
+        INSERT INTO crm_outbox (lead_id, kind, payload, available_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """, [
+            (lead_id, kind, json.dumps(payload), now, now)
+            for lead_id, kind, payload in jobs
+        ])
+
+
+def claim_outbox_jobs(limit, stale_after):
+    """
+    Claims up to limit due jobs in one statement and returns (claim, jobs),
+    jobs in id order. Jobs claimed more than stale_after seconds ago are due
+    again. Only the holder of claim may update or delete its jobs.
+    """
+    claim = uuid.uuid4().hex
+    now = time.time()
+
+    with transaction() as cursor:
+        cursor.row_factory = OUTBOX_ROWS
+        cursor.execute("""
+        UPDATE crm_outbox
+        SET status = 'running', claim = ?, claimed_at = ?
+        WHERE id IN (
+            SELECT id FROM crm_outbox
+            WHERE (status = 'pending' AND available_at <= ?)
+               OR (status = 'running' AND claimed_at <= ?)
+            ORDER BY id
+            LIMIT ?
+        )
+        RETURNING *
+        """, (claim, now, now, now - stale_after, limit))
+
+        jobs = sorted(cursor.fetchall(), key=lambda job: job.id)
+
+    return claim, jobs
+
+
+def count_pending_outbox_jobs():
+    cursor = query("SELECT COUNT(*) FROM crm_outbox WHERE status IN ('pending', 'running')")
+    return cursor.fetchone()[0]
+
+
+def replace_outbox_job(job_id, claim, kind, payload):
+    with transaction() as cursor:
+        cursor.execute("""
+        UPDATE crm_outbox SET kind = ?, payload = ?
+        WHERE id = ? AND claim = ?
+        """, (kind, json.dumps(payload), job_id, claim))
+
+
+def retry_outbox_jobs(job_ids, claim, error, base_delay, max_attempts):
+    """
+    Releases claimed jobs, backed off exponentially (base_delay * 2^attempts
+    seconds); after max_attempts they are marked 'failed' and no longer
+    picked up.
+    """
+    with transaction() as cursor:
+        cursor.executemany("""
+        UPDATE crm_outbox
+        SET attempts = attempts + 1,
+            last_error = ?,
+            available_at = ? + ? * (1 << attempts),
+            status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+            claim = NULL
+        WHERE id = ? AND claim = ?
+        """, [
+            (error, time.time(), base_delay, max_attempts, job_id, claim)
+            for job_id in job_ids
+        ])
+
+
+def apply_lead_updates(updates, job_ids, claim):
+    """
+    Applies (lead_id, signals, score_delta, stage, restage) updates and
+    deletes the outbox jobs they came from (job_ids: {lead_id: [job id]}),
+    all in one transaction. A lead whose jobs are no longer all under claim
+    (a slow worker whose claim was taken over) is skipped; the new holder
+    applies them. Returns the refreshed Lead rows.
+    """
+    rows = []
+    applied = []
+
+    with transaction() as cursor:
+        # Explicit, so the per-lead savepoints nest inside one transaction
+        cursor.execute("BEGIN IMMEDIATE")
+
+        for lead_id, signals, score_delta, stage, restage in updates:
+            ids = job_ids[lead_id]
+            cursor.execute("SAVEPOINT lead_update")
+
+            deleted = 0
+            for job_id in ids:
+                cursor.execute(
+                    "DELETE FROM crm_outbox WHERE id = ? AND claim = ?",
+                    (job_id, claim)
+                )
+                deleted += cursor.rowcount
+
+            if deleted != len(ids):
+                cursor.execute("ROLLBACK TO lead_update")
+                cursor.execute("RELEASE lead_update")
+                continue
+
+            row = _apply_lead_update(cursor, lead_id, signals, score_delta, stage, restage)
+            cursor.execute("RELEASE lead_update")
+
+            applied.append(lead_id)
+            if row is not None:
+                rows.append(row)
+
+    for lead_id in applied:
+        _lead_changed(lead_id)
+
+    return rows
 
 
 # ===============================
 # BOOKING OPERATIONS
 # ===============================
 
-def is_slot_available(booking_date, booking_time):
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_slot_capacity(slot_time, mode):
+    cursor = query("""
+    SELECT capacity FROM slot_capacity
+    WHERE slot_time = ? AND mode = ?
+    """, (slot_time, mode))
 
-    cursor.execute("""
+    row = cursor.fetchone()
+    return row[0] if row else DEFAULT_SLOT_CAPACITY
+
+
+def set_slot_capacity(slot_time, mode, capacity):
+    """
+    Bookings taken per date for a time slot and mode. Lowering it never
+    cancels bookings; the slot just stays full until seats free up.
+    """
+    with transaction() as cursor:
+        cursor.execute("""
+        INSERT INTO slot_capacity (slot_time, mode, capacity)
+        VALUES (?, ?, ?)
+        ON CONFLICT (slot_time, mode) DO UPDATE SET capacity = excluded.capacity
+        """, (slot_time, mode, capacity))
+
+
+def get_slot_capacities():
+    return query("SELECT slot_time, mode, capacity FROM slot_capacity ORDER BY 1, 2").fetchall()
+
+
+def get_seats_left(booking_date, booking_time, mode):
+    cursor = query("""
     SELECT COUNT(*) FROM bookings
-    WHERE booking_date = ? AND booking_time = ?
-    """, (booking_date, booking_time))
+    WHERE booking_date = ? AND booking_time = ? AND mode = ?
+      AND seat IS NOT NULL
+    """, (booking_date, booking_time, mode))
 
-    count = cursor.fetchone()[0]
-    conn.close()
+    taken = cursor.fetchone()[0]
+    return max(0, get_slot_capacity(booking_time, mode) - taken)
 
-    return count == 0
 
+def is_slot_available(booking_date, booking_time, mode):
+    """
+    Advisory only (e.g. for greying out full slots); book_slot() decides.
+    """
+    return get_seats_left(booking_date, booking_time, mode) > 0
 
-def save_booking(lead_id, booking_date, booking_time, mode):
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-    INSERT INTO bookings (
-        lead_id,
-        booking_date,
-        booking_time,
-        mode,
-        status,
-        created_at
-    )
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        lead_id,
-        booking_date,
-        booking_time,
-        mode,
-        "Scheduled",
-        datetime.now()
-    ))
+def book_slot(lead_id, booking_date, booking_time, mode):
+    """
+    Books the lowest free seat of the slot in one IMMEDIATE transaction:
+    the capacity check and the insert cannot interleave with another
+    booking, and idx_bookings_seat rejects a second booking of any seat.
+    Returns the new Booking, or None if the slot is full.
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.row_factory = BOOKING_ROWS
+            cursor.execute("""
+            WITH taken AS (
+                SELECT seat FROM bookings
+                WHERE booking_date = :date AND booking_time = :time AND mode = :mode
+                  AND seat IS NOT NULL
+            ),
+            free AS (
+                SELECT MIN(candidate) AS seat
+                FROM (SELECT 1 AS candidate UNION SELECT seat + 1 FROM taken)
+                WHERE candidate NOT IN (SELECT seat FROM taken)
+                  AND candidate <= COALESCE(
+                      (SELECT capacity FROM slot_capacity
+                       WHERE slot_time = :time AND mode = :mode),
+                      :default_capacity
+                  )
+            )
+            INSERT INTO bookings (
+                lead_id,
+                booking_date,
+                booking_time,
+                mode,
+                status,
+                seat,
+                created_at
+            )
+            SELECT :lead_id, :date, :time, :mode, 'Scheduled', seat, :now
+            FROM free
+            WHERE seat IS NOT NULL
+            RETURNING *
+            """, {
+                "lead_id": lead_id,
+                "date": booking_date,
+                "time": booking_time,
+                "mode": mode,
+                "default_capacity": DEFAULT_SLOT_CAPACITY,
+                "now": datetime.now()
+            })
 
-    conn.commit()
-    conn.close()
+            booking = cursor.fetchone()
 
+    except sqlite3.IntegrityError:
+        return None
 
-def get_bookings_by_lead(lead_id):
-    conn = get_connection()
-    cursor = conn.cursor()
+    if booking is not None:
+        _lead_changed(lead_id)
 
-    cursor.execute("""
+    return booking
+
+
+def save_booking(lead_id, booking_date, booking_time, mode):
+    """
+    Returns False if the slot is full (see book_slot).
+    """
+    return book_slot(lead_id, booking_date, booking_time, mode) is not None
+
+
+def get_bookings_by_lead(lead_id):
+    cursor = query("""
     SELECT booking_date, booking_time, mode, status
     FROM bookings
     WHERE lead_id = ?
-    """, (lead_id,))
+    """, (lead_id,), BOOKING_ROWS)
 
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return cursor.fetchall()
 
 
 # ===============================
@@ -252,27 +945,614 @@ def get_bookings_by_lead(lead_id):
 # ===============================
 
 def get_all_leads():
-    conn = get_connection()
-    cursor = conn.cursor()
+    cursor = query("SELECT * FROM leads", rows=LEAD_ROWS)
+    return cursor.fetchall()
 
-    cursor.execute("SELECT * FROM leads")
-    leads = cursor.fetchall()
 
-    conn.close()
-    return leads
+def get_all_bookings():
+    cursor = query("""
+    SELECT b.id, l.name AS lead_name, b.booking_date,
+           b.booking_time, b.mode, b.status
+    FROM bookings b
+    JOIN leads l ON b.lead_id = l.id
+    """, rows=BOOKING_ROWS)
 
+    return cursor.fetchall()
 
-def get_all_bookings():
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-    SELECT b.id, l.name, b.booking_date,
+# ===============================
+# DASHBOARD QUERIES
+# ===============================
+
+# Aggregates are computed by SQLite and pages are fetched with LIMIT/OFFSET,
+# so the dashboard never pulls whole tables into Python.
+
+def get_change_version():
+    """
+    Counter bumped by triggers on every write to leads or bookings.
+    """
+    cursor = query("SELECT version FROM change_counter WHERE id = 1")
+    return cursor.fetchone()[0]
+
+
+def count_leads_by_priority(hot_score, warm_score):
+    cursor = query("""
+    SELECT CASE
+               WHEN lead_score >= ? THEN 'Hot'
+               WHEN lead_score >= ? THEN 'Warm'
+               ELSE 'Cold'
+           END AS priority,
+           COUNT(*)
+    FROM leads
+    GROUP BY priority
+    """, (hot_score, warm_score))
+
+    return dict(cursor.fetchall())
+
+
+def get_field_fill_rates(fields):
+    """
+    Percentage of leads with each field filled in ('' and 'null' count as
+    missing). fields must be leads column names.
+    """
+    unknown = [name for name in fields if name not in Lead.__slots__]
+    if unknown:
+        raise ValueError(f"Unknown lead field(s) {unknown}")
+
+    columns = ", ".join(
+        f"AVG({name} IS NOT NULL AND {name} NOT IN ('', 'null'))"
+        for name in fields
+    )
+
+    row = query(f"SELECT {columns} FROM leads").fetchone()
+
+    return {
+        name: round((rate or 0) * 100, 1)
+        for name, rate in zip(fields, row)
+    }
+
+
+def get_leads_page(limit, offset=0):
+    """
+    Leads by descending score (idx_leads_score).
+    """
+    cursor = query("""
+    SELECT * FROM leads
+    ORDER BY lead_score DESC, id
+    LIMIT ? OFFSET ?
+    """, (limit, offset), LEAD_ROWS)
+
+    return cursor.fetchall()
+
+
+def get_bookings_page(limit, offset=0):
+    """
+    Most recent bookings first.
+    """
+    cursor = query("""
+    SELECT b.id, l.name AS lead_name, b.booking_date,
            b.booking_time, b.mode, b.status
     FROM bookings b
-    JOIN leads l ON b.lead_id = l.id
-    """)
+    LEFT JOIN leads l ON b.lead_id = l.id
+    ORDER BY b.id DESC
+    LIMIT ? OFFSET ?
+    """, (limit, offset), BOOKING_ROWS)
+
+    return cursor.fetchall()
+
+
+# ===============================
+# PIPELINE STATS
+# ===============================
+
+# pipeline_stats holds lead and booking counts per (day, stage, user_type),
+# maintained by triggers in the same transaction as the write, so funnel
+# metrics are read from a handful of rows instead of scanning leads.
+#
+# Each count is also added to every rollup in which any of the three keys is
+# 'ALL': ('ALL', 'Qualified', 'ALL') is the number of qualified leads,
+# ('ALL', 'ALL', 'ALL') the grand totals. Leads are counted by the day they
+# were created and their current stage; hot counts leads scoring at least
+# HOT_LEAD_SCORE. Bookings are counted by the day they were made and the
+# lead's user_type, on stage 'ALL' rows only.
+#
+# HOT_LEAD_SCORE is compiled into the triggers; changing it needs a new
+# migration that recreates them.
+
+HOT_LEAD_SCORE = 90
+
+_STATS_UPSERT = """
+INSERT INTO {table} (day, stage, user_type, leads, hot, bookings)
+{select}
+ON CONFLICT (day, stage, user_type) DO UPDATE SET
+    leads = leads + excluded.leads,
+    hot = hot + excluded.hot,
+    bookings = bookings + excluded.bookings;
+"""
+
+
+def _lead_keys(lead):
+    return (
+        f"COALESCE(date({lead}.created_at), 'unknown')",
+        f"COALESCE({lead}.pipeline_stage, 'unknown')",
+        f"COALESCE({lead}.user_type, 'unknown')"
+    )
+
+
+def _rollups(day, stage, user_type):
+    """
+    The key itself plus every combination with some parts set to 'ALL'.
+    """
+    for d in (day, "'ALL'"):
+        for s in dict.fromkeys((stage, "'ALL'")):
+            for u in (user_type, "'ALL'"):
+                yield d, s, u
+
+
+def _lead_upserts(lead, sign, table="pipeline_stats"):
+    hot = f"({lead}.lead_score >= {HOT_LEAD_SCORE})"
+
+    return "".join(
+        _STATS_UPSERT.format(
+            table=table,
+            select=f"SELECT {d}, {s}, {u}, {sign}1, {sign}{hot}, 0 WHERE true"
+        )
+        for d, s, u in _rollups(*_lead_keys(lead))
+    )
+
+
+def _booking_upserts(booking, sign, table="pipeline_stats"):
+    day = f"COALESCE(date({booking}.created_at), 'unknown')"
+    user_type = f"""COALESCE(
+        (SELECT user_type FROM leads WHERE id = {booking}.lead_id), 'unknown'
+    )"""
+
+    return "".join(
+        _STATS_UPSERT.format(
+            table=table,
+            select=f"SELECT {d}, {s}, {u}, 0, 0, {sign}1 WHERE true"
+        )
+        for d, s, u in _rollups(day, "'ALL'", user_type)
+    )
+
+
+def _move_bookings(lead_id, old_user_type, new_user_type):
+    """
+    Moves a lead's booking counts from one user_type to another, e.g. when
+    the lead's user_type changes or the lead is deleted ('unknown').
+    """
+    return "".join(
+        _STATS_UPSERT.format(
+            table="pipeline_stats",
+            select=f"""
+            SELECT {day}, 'ALL', COALESCE({user_type}, 'unknown'), 0, 0, {sign}COUNT(*)
+            FROM bookings WHERE lead_id = {lead_id}
+            GROUP BY 1
+            """
+        )
+        for user_type, sign in ((old_user_type, "-"), (new_user_type, ""))
+        for day in ("COALESCE(date(created_at), 'unknown')", "'ALL'")
+    )
+
+
+def _pipeline_stats_triggers():
+    counted = f"""
+        OLD.pipeline_stage IS NOT NEW.pipeline_stage
+        OR OLD.user_type IS NOT NEW.user_type
+        OR OLD.created_at IS NOT NEW.created_at
+        OR (OLD.lead_score >= {HOT_LEAD_SCORE}) IS NOT (NEW.lead_score >= {HOT_LEAD_SCORE})
+    """
+
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_insert_stats
+        AFTER INSERT ON leads
+        BEGIN {_lead_upserts("NEW", "")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_delete_stats
+        AFTER DELETE ON leads
+        BEGIN
+            {_lead_upserts("OLD", "-")}
+            {_move_bookings("OLD.id", "OLD.user_type", "NULL")}
+        END
+        """,
+        # Most score updates leave every count unchanged and skip this
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_update_stats
+        AFTER UPDATE OF pipeline_stage, lead_score, user_type, created_at ON leads
+        WHEN {counted}
+        BEGIN {_lead_upserts("OLD", "-")} {_lead_upserts("NEW", "")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_user_type_stats
+        AFTER UPDATE OF user_type ON leads
+        WHEN OLD.user_type IS NOT NEW.user_type
+        BEGIN {_move_bookings("NEW.id", "OLD.user_type", "NEW.user_type")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_insert_stats
+        AFTER INSERT ON bookings
+        BEGIN {_booking_upserts("NEW", "")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_delete_stats
+        AFTER DELETE ON bookings
+        BEGIN {_booking_upserts("OLD", "-")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_update_stats
+        AFTER UPDATE OF lead_id, created_at ON bookings
+        BEGIN {_booking_upserts("OLD", "-")} {_booking_upserts("NEW", "")} END
+        """,
+    ]
+
+
+def _fill_pipeline_stats(cursor, table):
+    """
+    Recomputes every stats row from leads and bookings into table.
+    """
+    hot = f"SUM(l.lead_score >= {HOT_LEAD_SCORE})"
+
+    for d, s, u in _rollups(*_lead_keys("l")):
+        cursor.execute(_STATS_UPSERT.format(
+            table=table,
+            select=f"""
+            SELECT {d}, {s}, {u}, COUNT(*), {hot}, 0
+            FROM leads l WHERE true
+            GROUP BY 1, 2, 3
+            """
+        ))
+
+    booking_day = "COALESCE(date(b.created_at), 'unknown')"
+
+    for d, s, u in _rollups(booking_day, "'ALL'", "COALESCE(l.user_type, 'unknown')"):
+        cursor.execute(_STATS_UPSERT.format(
+            table=table,
+            select=f"""
+            SELECT {d}, {s}, {u}, 0, 0, COUNT(*)
+            FROM bookings b LEFT JOIN leads l ON l.id = b.lead_id WHERE true
+            GROUP BY 1, 2, 3
+            """
+        ))
+
+
+def check_pipeline_stats(rebuild=False):
+    """
+    Recomputes the stats from scratch and compares them with pipeline_stats.
+    Returns the differing rows as (key, expected, actual) with counts as
+    (leads, hot, bookings) tuples. With rebuild=True, or when anything
+    differs, the table is replaced by the recomputed rows.
+    """
+    with transaction() as cursor:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DROP TABLE IF EXISTS temp.pipeline_stats_expected")
+        cursor.execute("""
+        CREATE TEMP TABLE pipeline_stats_expected AS
+        SELECT * FROM pipeline_stats WHERE 0
+        """)
+        cursor.execute("""
+        CREATE UNIQUE INDEX temp.idx_pipeline_stats_expected
+        ON pipeline_stats_expected (day, stage, user_type)
+        """)
+
+        _fill_pipeline_stats(cursor, "pipeline_stats_expected")
+
+        counts = {}
+        for table, side in (("pipeline_stats_expected", 0), ("pipeline_stats", 1)):
+            cursor.execute(f"""
+            SELECT day, stage, user_type, leads, hot, bookings FROM {table}
+            WHERE leads != 0 OR hot != 0 OR bookings != 0
+            """)
+            for day, stage, user_type, *values in cursor.fetchall():
+                counts.setdefault((day, stage, user_type), [None, None])[side] = tuple(values)
+
+        mismatches = [
+            (key, expected, actual)
+            for key, (expected, actual) in sorted(counts.items())
+            if expected != actual
+        ]
+
+        if rebuild or mismatches:
+            cursor.execute("DELETE FROM pipeline_stats")
+            cursor.execute("""
+            INSERT INTO pipeline_stats
+            SELECT * FROM pipeline_stats_expected
+            WHERE leads != 0 OR hot != 0 OR bookings != 0
+            """)
+
+        cursor.execute("DROP TABLE temp.pipeline_stats_expected")
+
+    return mismatches
+
+
+def get_pipeline_stats(day="ALL", user_type="ALL"):
+    """
+    {stage: {"leads", "hot", "bookings"}} for one day and user_type, either
+    of which may be 'ALL'. The 'ALL' stage holds the totals.
+    """
+    cursor = query("""
+    SELECT stage, leads, hot, bookings
+    FROM pipeline_stats
+    WHERE day = ? AND user_type = ?
+      AND (leads != 0 OR hot != 0 OR bookings != 0)
+    """, (day, user_type))
+
+    return {
+        stage: {"leads": leads, "hot": hot, "bookings": bookings}
+        for stage, leads, hot, bookings in cursor.fetchall()
+    }
+
+
+# ===============================
+# LEAD EVENTS
+# ===============================
+
+# Triggers on leads append one lead_events row per insert ('created') and per
+# change of stage ('stage') or score only ('score'), whichever code path made
+# it. Each row carries what the rollups need, so they never look back:
+#
+#   seconds_in_stage  time since the lead entered from_stage ('stage' only)
+#   first_reach       1 the first time the lead enters to_stage
+#   cohort_day        UTC day the lead was created, as epoch seconds
+#
+# Timestamps are UTC epoch seconds. refresh_event_rollups() folds events past
+# a watermark into hourly/daily transition rollups and per-cohort stage
+# counts, so analytics reads a few rows per bucket instead of the raw log.
+
+_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+ROLLUP_GRAINS = {"hour": 3600, "day": 86400}
+
+
+def _cohort_day(lead):
+    return f"(CAST(strftime('%s', {lead}.created_at, 'utc') AS INTEGER) / 86400 * 86400)"
+
+
+def _lead_event_triggers():
+    stage_changed = "OLD.pipeline_stage IS NOT NEW.pipeline_stage"
+
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_insert_event
+        AFTER INSERT ON leads
+        BEGIN
+            INSERT INTO lead_events (
+                lead_id, kind, to_stage, new_score, ts, first_reach, cohort_day
+            )
+            VALUES (
+                NEW.id, 'created', NEW.pipeline_stage, NEW.lead_score, {_NOW},
+                1, {_cohort_day("NEW")}
+            );
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leads_update_event
+        AFTER UPDATE OF pipeline_stage, lead_score ON leads
+        WHEN {stage_changed} OR OLD.lead_score IS NOT NEW.lead_score
+        BEGIN
+            INSERT INTO lead_events (
+                lead_id, kind, from_stage, to_stage, old_score, new_score, ts,
+                seconds_in_stage, first_reach, cohort_day
+            )
+            VALUES (
+                NEW.id,
+                CASE WHEN {stage_changed} THEN 'stage' ELSE 'score' END,
+                OLD.pipeline_stage,
+                NEW.pipeline_stage,
+                OLD.lead_score,
+                NEW.lead_score,
+                {_NOW},
+                CASE WHEN {stage_changed} THEN {_NOW} - (
+                    SELECT ts FROM lead_events
+                    WHERE lead_id = NEW.id AND kind != 'score'
+                    ORDER BY id DESC LIMIT 1
+                ) END,
+                {stage_changed} AND NOT EXISTS (
+                    SELECT 1 FROM lead_events
+                    WHERE lead_id = NEW.id AND to_stage IS NEW.pipeline_stage
+                ),
+                {_cohort_day("NEW")}
+            );
+        END
+        """,
+    ]
+
+
+def refresh_event_rollups():
+    """
+    Adds lead_events past the watermark to the rollups and moves the
+    watermark, all in one transaction. Returns the number of events added.
+    """
+    with transaction() as cursor:
+        # One refresher at a time; writers wait, so no event below the new
+        # watermark can commit after it was read
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute("""
+        SELECT COALESCE(
+            (SELECT event_id FROM rollup_watermarks WHERE name = 'lead_events'), 0
+        ), COALESCE((SELECT MAX(id) FROM lead_events), 0)
+        """)
+        start, end = cursor.fetchone()
+
+        if end <= start:
+            return 0
+
+        for grain, seconds in ROLLUP_GRAINS.items():
+            cursor.execute("""
+            INSERT INTO lead_event_rollups (
+                grain, bucket, from_stage, to_stage,
+                events, score_change, stage_seconds, stage_exits
+            )
+            SELECT ?, CAST(ts / ? AS INTEGER) * ?,
+                   COALESCE(from_stage, ''), COALESCE(to_stage, 'unknown'),
+                   COUNT(*),
+                   COALESCE(SUM(new_score - old_score), 0),
+                   COALESCE(SUM(seconds_in_stage), 0),
+                   COUNT(seconds_in_stage)
+            FROM lead_events
+            WHERE id > ? AND id <= ?
+            GROUP BY 2, 3, 4
+            ON CONFLICT (grain, bucket, from_stage, to_stage) DO UPDATE SET
+                events = events + excluded.events,
+                score_change = score_change + excluded.score_change,
+                stage_seconds = stage_seconds + excluded.stage_seconds,
+                stage_exits = stage_exits + excluded.stage_exits
+            """, (grain, seconds, seconds, start, end))
+
+        # First arrivals per stage, and cohort sizes under stage 'ALL'
+        for stage, condition in (
+            ("COALESCE(to_stage, 'unknown')", "first_reach"),
+            ("'ALL'", "kind = 'created'")
+        ):
+            cursor.execute(f"""
+            INSERT INTO cohort_rollups (cohort_day, stage, leads)
+            SELECT cohort_day, {stage}, COUNT(*)
+            FROM lead_events
+            WHERE id > ? AND id <= ? AND cohort_day IS NOT NULL AND {condition}
+            GROUP BY 1, 2
+            ON CONFLICT (cohort_day, stage) DO UPDATE SET
+                leads = leads + excluded.leads
+            """, (start, end))
+
+        cursor.execute("""
+        INSERT INTO rollup_watermarks (name, event_id) VALUES ('lead_events', ?)
+        ON CONFLICT (name) DO UPDATE SET event_id = excluded.event_id
+        """, (end,))
+
+    return end - start
+
+
+def get_event_rollups(grain, start, end):
+    """
+    (bucket, from_stage, to_stage, events, score_change, stage_seconds,
+    stage_exits) rows for buckets in [start, end), epoch seconds.
+    from_stage is '' for 'created' events.
+    """
+    cursor = query("""
+    SELECT bucket, from_stage, to_stage,
+           events, score_change, stage_seconds, stage_exits
+    FROM lead_event_rollups
+    WHERE grain = ? AND bucket >= ? AND bucket < ?
+    ORDER BY bucket
+    """, (grain, start, end))
+
+    return cursor.fetchall()
+
+
+def get_cohort_rollups(start, end):
+    """
+    (cohort_day, stage, leads) for cohorts created in [start, end); stage
+    'ALL' is the cohort size.
+    """
+    cursor = query("""
+    SELECT cohort_day, stage, leads
+    FROM cohort_rollups
+    WHERE cohort_day >= ? AND cohort_day < ?
+    ORDER BY cohort_day
+    """, (start, end))
+
+    return cursor.fetchall()
+
+
+# ===============================
+# SNAPSHOT EXPORT
+# ===============================
+
+# Source queries for the Parquet snapshots (snapshots.py). leads and bookings
+# change in place, so they are exported as whole day partitions (by
+# created_at); triggers mark a partition dirty on every write and the export
+# rewrites only those. lead_events is append-only and exported past an id
+# watermark.
+
+SNAPSHOT_TABLES = ("leads", "bookings")
+
+
+def _partition_day(row):
+    return f"COALESCE(date({row}.created_at), 'unknown')"
+
+
+def _snapshot_dirty_triggers():
+    def mark(table, row):
+        return f"""
+        INSERT INTO snapshot_dirty (name, day)
+        VALUES ('{table}', {_partition_day(row)})
+        ON CONFLICT (name, day) DO UPDATE SET seq = seq + 1;
+        """
+
+    statements = []
+
+    for table in SNAPSHOT_TABLES:
+        for event, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+            statements.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_snapshot
+            AFTER {event} ON {table}
+            BEGIN {"".join(mark(table, row) for row in rows)} END
+            """)
+
+    return statements
+
+
+def get_dirty_partitions(table):
+    """
+    (day, seq) of the table's partitions changed since their last export.
+    """
+    cursor = query("""
+    SELECT day, seq FROM snapshot_dirty
+    WHERE name = ?
+    ORDER BY day
+    """, (table,))
+
+    return cursor.fetchall()
+
+
+def get_partition_days(table):
+    if table not in SNAPSHOT_TABLES:
+        raise ValueError(f"Not a snapshot table: {table}")
+
+    cursor = query(f"SELECT DISTINCT {_partition_day(table)} FROM {table}")
+    return [day for day, in cursor.fetchall()]
+
+
+def clear_dirty_partitions(table, partitions):
+    """
+    Unmarks exported partitions, unless they changed again since (seq moved).
+    """
+    with transaction() as cursor:
+        cursor.executemany("""
+        DELETE FROM snapshot_dirty
+        WHERE name = ? AND day = ? AND seq = ?
+        """, [(table, day, seq) for day, seq in partitions])
+
+
+def get_partition_rows(table, day):
+    """
+    Cursor over all rows of one day partition; column names are in
+    cursor.description.
+    """
+    if table not in SNAPSHOT_TABLES:
+        raise ValueError(f"Not a snapshot table: {table}")
+
+    if day == "unknown":
+        return query(f"SELECT * FROM {table} WHERE date(created_at) IS NULL ORDER BY id")
+
+    # Range on the created_at index rather than date() on every row
+    next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    return query(f"""
+    SELECT * FROM {table}
+    WHERE created_at >= ? AND created_at < ?
+    ORDER BY id
+    """, (day, next_day))
+
+
+def get_lead_events_after(event_id, limit):
+    cursor = query("""
+    SELECT * FROM lead_events
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+    """, (event_id, limit))
 
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    return cursor
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+
+# ===============================
+# OFFLINE GEMINI STUB
+# ===============================
+
+# Mimics the parts of google.genai.Client the app uses, with a fixed
+# latency per call, so pipelines can be benchmarked without an API key.
+
+DEFAULT_LATENCY = 0.8
+
+EXTRACTION_REPLY = json.dumps({
+    "grade": None,
+    "program_interest": None,
+    "urgency": None,
+    "budget_signal": None,
+    "intent": None
+})
+
+ANSWER_REPLY = (
+    "WizKlub runs hands-on STEM programs in robotics, coding and applied "
+    "mathematics. Would you like to book a free demo class?"
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _reply_for(contents):
+    if "Return ONLY valid JSON" in str(contents):
+        return EXTRACTION_REPLY
+    return ANSWER_REPLY
+
+
+def _split_stream(text, chunk_words):
+    words = text.split(" ")
+
+    for start in range(0, len(words), chunk_words):
+        piece = " ".join(words[start:start + chunk_words])
+
+        if start + chunk_words < len(words):
+            piece += " "
+
+        yield piece
+
+
+class _Models:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, **kwargs):
+        self._client.calls += 1
+        time.sleep(self._client.latency)
+        return FakeResponse(_reply_for(contents))
+
+    def generate_content_stream(self, model, contents, **kwargs):
+        self._client.calls += 1
+        time.sleep(self._client.first_token_latency)
+
+        for piece in _split_stream(_reply_for(contents), self._client.chunk_words):
+            time.sleep(self._client.token_interval)
+            yield FakeResponse(piece)
+
+
+class _AsyncModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, **kwargs):
+        self._client.calls += 1
+        await asyncio.sleep(self._client.latency)
+        return FakeResponse(_reply_for(contents))
+
+
+class _Aio:
+    def __init__(self, client):
+        self.models = _AsyncModels(client)
+
+
+class FakeClient:
+    """
+    Drop-in stand-in for genai.Client. Non-streaming calls take latency
+    seconds; streams wait first_token_latency, then emit chunk_words words
+    every token_interval seconds.
+    """
+
+    def __init__(self, latency=DEFAULT_LATENCY, first_token_latency=None,
+                 token_interval=0.02, chunk_words=3):
+        self.latency = latency
+        self.first_token_latency = (
+            latency / 4 if first_token_latency is None else first_token_latency
+        )
+        self.token_interval = token_interval
+        self.chunk_words = chunk_words
+        self.calls = 0
+        self.models = _Models(self)
+        self.aio = _Aio(self)
+
+    @classmethod
+    def from_env(cls):
+        latency = float(os.getenv("WIZKLUB_FAKE_LLM_LATENCY", DEFAULT_LATENCY))
+        return cls(latency=latency)
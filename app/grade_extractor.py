@@ -1,11 +1,16 @@
-from google import genai
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+import llm_client
+from signal_rules import GRADE_CUE, extract_grade_locally
 
 def extract_grade(text):
+
+    grade = extract_grade_locally(text)
+    if grade:
+        return grade
+
+    # Nothing that even looks like a grade, so skip the LLM call
+    if not GRADE_CUE.search(text):
+        return "None"
+
     prompt = f"""
 Extract grade level from this sentence.
 Return only grade.
@@ -14,9 +19,4 @@ If none, return None.
 Sentence: {text}
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
-
-    return response.text.strip()
+    return llm_client.generate(prompt).strip()
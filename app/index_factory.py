@@ -0,0 +1,143 @@
+import json
+import os
+
+import faiss
+import numpy as np
+
+# ===============================
+# FAISS INDEX FACTORY
+# ===============================
+
+# Index types the vector store can be built with. Everything except the
+# legacy flat_l2 works on L2-normalized vectors with inner product, i.e.
+# cosine similarity, which is what MiniLM embeddings are trained for.
+#
+# The builder records the type and the parameters it actually used in
+# index_manifest.json; load_index() reads it back and applies the search-time
+# parameters (nprobe / efSearch), which are not stored in index.faiss.
+
+MANIFEST_FILE = "index_manifest.json"
+
+DEFAULT_PARAMS = {
+    "flat_l2": {},
+    "flat_ip": {},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16},
+    "hnsw": {"M": 32, "efConstruction": 80, "efSearch": 64},
+    "ivf_pq": {"nlist": 1024, "m": 48, "nbits": 8, "nprobe": 16},
+}
+
+INDEX_TYPES = tuple(DEFAULT_PARAMS)
+
+# FAISS wants ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# Legacy builds without a manifest were plain IndexFlatL2
+LEGACY_MANIFEST = {"index_type": "flat_l2", "params": {}, "normalize": False}
+
+
+def resolve_params(index_type, params=None, n_train=None):
+    """
+    Defaults merged with overrides, shrunk to what n_train vectors can
+    train (nlist, PQ bits).
+    """
+    if index_type not in DEFAULT_PARAMS:
+        raise ValueError(f"Unknown index type {index_type!r}; choose from {INDEX_TYPES}")
+
+    resolved = dict(DEFAULT_PARAMS[index_type])
+    resolved.update(params or {})
+
+    if n_train is not None and "nlist" in resolved:
+        resolved["nlist"] = max(1, min(resolved["nlist"], n_train // MIN_POINTS_PER_CENTROID))
+
+    if n_train is not None and "nbits" in resolved:
+        while resolved["nbits"] > 4 and 2 ** resolved["nbits"] * MIN_POINTS_PER_CENTROID > n_train:
+            resolved["nbits"] -= 1
+
+    return resolved
+
+
+def normalizes(index_type):
+    return index_type != "flat_l2"
+
+
+def needs_training(index_type):
+    return index_type in ("ivf_flat", "ivf_pq")
+
+
+def supports_remove(index_type):
+    # HNSW graphs cannot drop nodes; such builds are redone from the cache
+    return index_type != "hnsw"
+
+
+def create_index(index_type, dimension, params):
+    """
+    Empty IndexIDMap-wrapped index. IVF types still need train().
+    """
+    if index_type == "flat_l2":
+        base = faiss.IndexFlatL2(dimension)
+
+    elif index_type == "flat_ip":
+        base = faiss.IndexFlatIP(dimension)
+
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dimension)
+        base = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, params["M"], faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = params["efConstruction"]
+
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dimension)
+        base = faiss.IndexIVFPQ(
+            quantizer, dimension, params["nlist"],
+            params["m"], params["nbits"], faiss.METRIC_INNER_PRODUCT
+        )
+
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}; choose from {INDEX_TYPES}")
+
+    return faiss.IndexIDMap(base)
+
+
+def apply_search_params(index, manifest):
+    params = manifest.get("params", {})
+
+    if "nprobe" in params:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+
+    if "efSearch" in params:
+        inner = index.index if isinstance(index, faiss.IndexIDMap) else index
+        faiss.downcast_index(inner).hnsw.efSearch = params["efSearch"]
+
+
+def prepare_vectors(vectors, manifest):
+    """
+    float32 copy of vectors, normalized if the index expects it.
+    """
+    vectors = np.array(vectors, dtype=np.float32, copy=True).reshape(-1, np.shape(vectors)[-1])
+
+    if manifest.get("normalize"):
+        faiss.normalize_L2(vectors)
+
+    return vectors
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict(LEGACY_MANIFEST)
+
+
+def write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_index(path, manifest, mmap=False):
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(path, flags)
+    apply_search_params(index, manifest)
+    return index
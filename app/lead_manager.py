@@ -1,10 +1,9 @@
 from database import (
     save_lead as db_save_lead,
     get_lead_by_email,
-    update_pipeline_stage,
-    increase_lead_score,
-    update_lead_signals
+    apply_lead_signals
 )
+from pipeline_stages import determine_pipeline_stage
 
 # ===============================
 # BASE LEAD SCORING
@@ -57,21 +56,6 @@ def calculate_signal_score(signals):
     return score
 
 
-# ===============================
-# PIPELINE STAGE LOGIC
-# ===============================
-
-def determine_pipeline_stage(total_score):
-    if total_score >= 90:
-        return "Hot"
-    elif total_score >= 60:
-        return "Qualified"
-    elif total_score >= 30:
-        return "Warm"
-    else:
-        return "New"
-
-
 # ===============================
 # SAVE / UPDATE LEAD
 # ===============================
@@ -86,20 +70,11 @@ def save_lead(name, email, phone, user_type,
     base_score = calculate_base_score(user_type)
 
     if existing:
-        # Existing Lead
-        lead_id = existing[0]
-        current_score = existing[11]  # lead_score index after schema upgrade
-
-        increase_lead_score(lead_id, base_score)
-
-        new_total = current_score + base_score
-
-        new_stage = determine_pipeline_stage(new_total)
-        update_pipeline_stage(lead_id, new_stage)
+        # Existing Lead: score and stage in one statement
+        lead = apply_lead_signals(existing.id, {}, base_score)
+        return lead.lead_score
 
-        return new_total
-
-    # New Lead
+    # New Lead, inserted with its stage instead of a follow-up update
     db_save_lead(
         name=name,
         email=email,
@@ -107,14 +82,10 @@ def save_lead(name, email, phone, user_type,
         user_type=user_type,
         grade=grade,
         interest=interest,
-        lead_score=base_score
+        lead_score=base_score,
+        pipeline_stage=determine_pipeline_stage(base_score)
     )
 
-    lead = get_lead_by_email(email)
-
-    stage = determine_pipeline_stage(base_score)
-    update_pipeline_stage(lead[0], stage)
-
     return base_score
 
 
@@ -125,23 +96,16 @@ def save_lead(name, email, phone, user_type,
 def apply_ai_signals(lead_id, signals):
     """
     Apply structured AI extracted signals to CRM and scoring.
+    Returns the refreshed Lead, or None when there was nothing to apply.
     """
 
     if not signals:
-        return
-
-    # Update CRM fields
-    update_lead_signals(lead_id, signals)
+        return None
 
-    # Score based on signals
     signal_score = calculate_signal_score(signals)
 
-    if signal_score != 0:
-        increase_lead_score(lead_id, signal_score)
-
-        # Fetch updated lead to re-evaluate stage
-        from database import get_lead_by_email
-        # We don’t have email here, so better to re-fetch by id in future.
-        # For now, stage update handled next chat cycle.
-
-
+    return apply_lead_signals(
+        lead_id,
+        signals,
+        signal_score
+    )
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+# ===============================
+# BM25 LEXICAL INDEX
+# ===============================
+
+# Exact-term retrieval next to the dense FAISS index: program names, grade
+# numbers and words like "fee" that MiniLM similarity tends to blur.
+#
+# BM25 weights are precomputed at build time into a sparse CSC matrix
+# (chunks x terms), so scoring a query is a sum over the columns of its
+# terms, touching only chunks that contain at least one of them. Rows are
+# in chunk-store order; ids maps a row to its FAISS / chunk-store id.
+
+MATRIX_FILE = "lexical_bm25.npz"
+VOCAB_FILE = "lexical_vocab.json"
+IDS_FILE = "lexical_ids.npy"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Near-zero IDF in any corpus, but the longest posting lists
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in is it me my
+of on or our so that the their them there this to was we what when where
+which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """
+    Lowercased alphanumeric terms, stopwords removed, with a plural 's'
+    dropped so "fees" matches "fee" and "grades" matches "grade".
+    """
+    terms = []
+
+    for term in TOKEN_PATTERN.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+
+    return terms
+
+
+class LexicalIndexWriter:
+    """
+    Collects term counts per chunk; close() computes the BM25 weights.
+    Memory is one int per distinct (chunk, term) pair plus the vocabulary.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._vocab = {}
+        self._ids = []
+        self._rows = array("q")
+        self._cols = array("q")
+        self._counts = array("f")
+        self._lengths = array("f")
+
+    def add(self, chunk_id, text):
+        row = len(self._ids)
+        counts = {}
+
+        terms = tokenize(text)
+        for term in terms:
+            col = self._vocab.setdefault(term, len(self._vocab))
+            counts[col] = counts.get(col, 0) + 1
+
+        for col, count in counts.items():
+            self._rows.append(row)
+            self._cols.append(col)
+            self._counts.append(count)
+
+        self._ids.append(chunk_id)
+        self._lengths.append(len(terms))
+
+    def close(self):
+        n_docs = len(self._ids)
+        rows = np.frombuffer(self._rows, dtype=np.int64)
+        cols = np.frombuffer(self._cols, dtype=np.int64)
+        tf = np.frombuffer(self._counts, dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+
+        df = np.bincount(cols, minlength=len(self._vocab)).astype(np.float32)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        avg_length = lengths.mean() if n_docs else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_length, 1e-9))
+        weights = idf[cols] * tf * (BM25_K1 + 1) / (tf + norm[rows])
+
+        matrix = sparse.csc_matrix(
+            (weights.astype(np.float32), (rows, cols)),
+            shape=(n_docs, len(self._vocab))
+        )
+
+        sparse.save_npz(os.path.join(self.directory, MATRIX_FILE), matrix)
+        np.save(os.path.join(self.directory, IDS_FILE), np.array(self._ids, dtype=np.int64))
+
+        with open(os.path.join(self.directory, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._vocab, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class LexicalIndex:
+
+    def __init__(self, directory):
+        matrix = sparse.load_npz(os.path.join(directory, MATRIX_FILE)).tocsc()
+
+        # Raw CSC arrays: a term's postings are data[indptr[t]:indptr[t + 1]]
+        self._indptr = matrix.indptr
+        self._rows = matrix.indices
+        self._weights = matrix.data
+        self.ids = np.load(os.path.join(directory, IDS_FILE))
+
+        with open(os.path.join(directory, VOCAB_FILE), encoding="utf-8") as f:
+            self._vocab = json.load(f)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k):
+        """
+        (scores, ids) of the top k chunks by BM25, best first. Chunks that
+        share no term with the query are never returned.
+        """
+        cols = [self._vocab[term] for term in tokenize(query) if term in self._vocab]
+
+        if not cols:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        # Postings of every query term (repeated terms count again),
+        # summed per chunk
+        postings = np.concatenate([
+            np.arange(self._indptr[col], self._indptr[col + 1]) for col in cols
+        ])
+        scores = np.bincount(
+            self._rows[postings], weights=self._weights[postings], minlength=len(self)
+        )
+
+        k = min(k, np.count_nonzero(scores))
+        if k == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+
+        return scores[top].astype(np.float32), self.ids[top]
+
+
+def load_lexical_index(directory):
+    """
+    LexicalIndex, or None for vector stores built before it existed.
+    """
+    try:
+        return LexicalIndex(directory)
+    except (OSError, ValueError):
+        return None
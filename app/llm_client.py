@@ -0,0 +1,143 @@
+from google import genai
+from dotenv import load_dotenv
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+import streamlit as st
+from config import MODEL_NAME
+
+load_dotenv()
+
+# ===============================
+# SHARED CLIENT
+# ===============================
+
+# One client per process, shared by chat_engine, ai_extractor and
+# grade_extractor so they reuse the same HTTP connection pool.
+_client = None
+_client_lock = threading.Lock()
+
+
+def _resolve_api_key():
+    api_key = os.getenv("GEMINI_API_KEY")
+
+    # If running on Streamlit Cloud
+    if not api_key:
+        api_key = st.secrets.get("GEMINI_API_KEY")
+
+    return api_key
+
+
+def get_client():
+    """
+    Returns the process-wide Gemini client. Set WIZKLUB_FAKE_LLM=1 to use
+    the offline stub from fake_llm instead.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if os.getenv("WIZKLUB_FAKE_LLM"):
+                    from fake_llm import FakeClient
+                    _client = FakeClient.from_env()
+                else:
+                    _client = genai.Client(api_key=_resolve_api_key())
+
+    return _client
+
+
+def set_client(client):
+    """
+    Replaces the shared client (benchmarks swap in a FakeClient).
+    """
+    global _client
+    _client = client
+
+
+# ===============================
+# GENERATION
+# ===============================
+
+def generate(prompt, model=MODEL_NAME):
+    response = get_client().models.generate_content(
+        model=model,
+        contents=prompt
+    )
+    return response.text
+
+
+def generate_stream(prompt, model=MODEL_NAME):
+    """
+    Yields the reply text piece by piece as Gemini produces it.
+    """
+    stream = get_client().models.generate_content_stream(
+        model=model,
+        contents=prompt
+    )
+
+    for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+async def generate_async(prompt, model=MODEL_NAME):
+    response = await get_client().aio.models.generate_content(
+        model=model,
+        contents=prompt
+    )
+    return response.text
+
+
+# ===============================
+# BACKGROUND EVENT LOOP
+# ===============================
+
+# The async client keeps its connections bound to the loop that created
+# them, so all coroutines run on one long-lived loop in a daemon thread
+# rather than a fresh asyncio.run() per Streamlit rerun.
+_loop = None
+_loop_lock = threading.Lock()
+_pending = set()
+
+
+def _get_loop():
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="llm-event-loop",
+                daemon=True
+            ).start()
+
+    return _loop
+
+
+def run(coro, timeout=None):
+    """
+    Runs a coroutine on the shared loop and blocks for its result.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    return future.result(timeout)
+
+
+def spawn(coro):
+    """
+    Schedules a coroutine on the shared loop without waiting for it.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+
+def drain(timeout=None):
+    """
+    Waits for spawned background work, e.g. before a benchmark exits.
+    """
+    concurrent.futures.wait(list(_pending), timeout=timeout)
@@ -1,26 +1,44 @@
+import logging
+
 import streamlit as st
 from database import (
     initialize_db,
-    get_lead_by_email,
-    save_booking,
-    is_slot_available,
-    update_pipeline_stage,
-    increase_lead_score
+    book_slot
 )
 from lead_manager import save_lead
+import crm_cache
+from crm_cache import get_lead
+import crm_queue
+from conversation_memory import ConversationMemory
+from config import (
+    DEMO_MODES,
+    DEMO_SLOT_TIMES,
+    HISTORY_MAX_TURNS,
+    SUMMARY_EVERY_TURNS,
+    SUMMARY_MAX_TOKENS,
+    MAX_STORED_MESSAGES
+)
+from resources import warmup
 from chat_engine import (
     load_vector_store,
+    embed_query,
     retrieve_chunks,
-    generate_response,
+    generate_response_stream,
     classify_user_type
 )
 
+logger = logging.getLogger(__name__)
+
 # ===============================
 # INITIALIZE DATABASE
 # ===============================
 
 initialize_db()
 
+# CRM bookkeeping runs off the request path; also picks up jobs left in
+# the outbox by a previous run
+crm_queue.start()
+
 # ===============================
 # PAGE CONFIG
 # ===============================
@@ -34,6 +52,8 @@ st.caption("STEM Programs | School Partnerships | Demo Booking")
 # LOAD VECTOR STORE
 # ===============================
 
+# Model and index load once per process; later reruns reuse them
+warmup()
 index, chunks = load_vector_store()
 
 # ===============================
@@ -41,18 +61,40 @@ index, chunks = load_vector_store()
 # ===============================
 
 defaults = {
-    "chat_history": [],
     "user_type": None,
     "lead_captured": False,
     "last_user_input": "",
     "user_email": None,
-    "crm_data": None
+    "crm_data": None,
+    "last_response_timing": None
 }
 
 for key, value in defaults.items():
     if key not in st.session_state:
         st.session_state[key] = value
 
+# Recent turns verbatim plus a rolling summary of older ones
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(
+        window_turns=HISTORY_MAX_TURNS,
+        summarize_every=SUMMARY_EVERY_TURNS,
+        summary_tokens=SUMMARY_MAX_TOKENS,
+        max_messages=MAX_STORED_MESSAGES
+    )
+
+# ===============================
+# DISPLAY CHAT HISTORY
+# ===============================
+
+memory = st.session_state.memory
+
+if memory.summary:
+    st.caption("Earlier messages have been summarized.")
+
+for role, message in memory.messages:
+    with st.chat_message(role):
+        st.write(message)
+
 # ===============================
 # CHAT INPUT
 # ===============================
@@ -63,36 +105,53 @@ if user_input:
 
     st.session_state.last_user_input = user_input
 
+    with st.chat_message("user"):
+        st.write(user_input)
+
     detected_type = classify_user_type(user_input)
     if detected_type:
         st.session_state.user_type = detected_type
 
-    # Refresh CRM data
+    # Refresh CRM data (served from crm_cache until the lead changes)
     if st.session_state.user_email:
-        st.session_state.crm_data = get_lead_by_email(
+        st.session_state.crm_data = get_lead(
             st.session_state.user_email
         )
 
-    context_chunks = retrieve_chunks(user_input, index, chunks)
+    # One embedding serves both retrieval and the response cache
+    query_vector = embed_query(user_input)
+    context_chunks = retrieve_chunks(
+        user_input, index, chunks, query_vector=query_vector
+    )
 
-    response = generate_response(
+    response_stream = generate_response_stream(
         query=user_input,
         context_chunks=context_chunks,
-        chat_history=st.session_state.chat_history,
+        chat_history=memory.messages,
+        summary=memory.summary,
         user_type=st.session_state.user_type,
-        crm_data=st.session_state.crm_data
+        crm_data=st.session_state.crm_data,
+        query_vector=query_vector
     )
 
-    st.session_state.chat_history.append(("user", user_input))
-    st.session_state.chat_history.append(("assistant", response))
+    # Render tokens as they arrive instead of waiting for the full reply
+    with st.chat_message("assistant"):
+        st.write_stream(response_stream)
 
-# ===============================
-# DISPLAY CHAT HISTORY
-# ===============================
+    memory.add("user", user_input)
+    memory.add("assistant", response_stream.text)
 
-for role, message in st.session_state.chat_history:
-    with st.chat_message(role):
-        st.write(message)
+    st.session_state.last_response_timing = {
+        "ttft": response_stream.ttft,
+        "total_time": response_stream.total_time
+    }
+
+    if response_stream.ttft is not None:
+        logger.debug(
+            "Response timing: first token %.0f ms, total %.0f ms",
+            response_stream.ttft * 1000,
+            response_stream.total_time * 1000
+        )
 
 # ===============================
 # LEAD CAPTURE
@@ -124,7 +183,7 @@ if not st.session_state.lead_captured:
 
                 st.session_state.user_email = email
                 st.session_state.lead_captured = True
-                st.session_state.crm_data = get_lead_by_email(email)
+                st.session_state.crm_data = get_lead(email)
 
                 st.success("✅ Lead saved successfully!")
 
@@ -148,43 +207,48 @@ if st.session_state.user_email:
         booking_date = st.date_input("Select Date")
         booking_time = st.selectbox(
             "Select Time Slot",
-            ["10:00 AM", "2:00 PM", "4:00 PM"]
+            DEMO_SLOT_TIMES
         )
         mode = st.selectbox(
             "Mode",
-            ["Online", "Offline"]
+            DEMO_MODES
         )
 
         book_submit = st.form_submit_button("Confirm Booking")
 
         if book_submit:
 
-            lead = get_lead_by_email(st.session_state.user_email)
+            lead = get_lead(st.session_state.user_email)
 
             if lead:
 
-                if is_slot_available(str(booking_date), booking_time):
+                # Capacity check and insert are one transaction, so two
+                # parents submitting the last seat cannot both get it
+                booking = book_slot(
+                    lead_id=lead.id,
+                    booking_date=str(booking_date),
+                    booking_time=booking_time,
+                    mode=mode
+                )
 
-                    save_booking(
-                        lead_id=lead[0],
-                        booking_date=str(booking_date),
-                        booking_time=booking_time,
-                        mode=mode
-                    )
+                if booking is not None:
 
-                    update_pipeline_stage(lead[0], "Booked")
-                    increase_lead_score(lead[0], 30)
+                    crm_queue.enqueue(lead.id, "stage", stage="Booked")
+                    crm_queue.enqueue(lead.id, "score", increment=30)
 
-                    st.session_state.crm_data = get_lead_by_email(
-                        st.session_state.user_email
-                    )
+                    # Give the writer a moment so the refreshed CRM data
+                    # already shows the booking; on timeout the next turn
+                    # picks it up
+                    crm_queue.drain(timeout=2)
+                    crm_cache.invalidate(lead.id)
+                    st.session_state.crm_data = get_lead(st.session_state.user_email)
 
                     st.success(
                         f"✅ Demo booked for {booking_date} at {booking_time}."
                     )
 
                 else:
-                    st.error("⚠ This slot is already booked.")
+                    st.error("⚠ This slot is fully booked. Please pick another time.")
 
             else:
                 st.warning("Lead not found.")
@@ -0,0 +1,130 @@
+# ===============================
+# RECORD TYPES
+# ===============================
+
+# Rows from the leads, bookings and crm_outbox tables. __slots__ keeps them as small as
+# tuples, but fields are read by name, so adding or reordering a column can
+# no longer shift lead_score into pipeline_stage. database.py builds them
+# through row factories; a query may select any subset of the columns and
+# the rest stay None.
+
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    # Records are mutable (the CRM queue updates jobs in place), so they
+    # compare by value but are not hashable
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Lead(Record):
+    __slots__ = (
+        "id",
+        "name",
+        "email",
+        "phone",
+        "user_type",
+        "grade",
+        "interest",
+        "urgency",
+        "program_interest",
+        "budget_signal",
+        "extracted_intent",
+        "lead_score",
+        "pipeline_stage",
+        "created_at"
+    )
+
+
+class Booking(Record):
+    __slots__ = (
+        "id",
+        "lead_id",
+        "lead_name",
+        "booking_date",
+        "booking_time",
+        "mode",
+        "status",
+        "seat",
+        "created_at"
+    )
+
+
+class OutboxJob(Record):
+    __slots__ = (
+        "id",
+        "lead_id",
+        "kind",
+        "payload",
+        "status",
+        "attempts",
+        "available_at",
+        "last_error",
+        "claim",
+        "claimed_at",
+        "created_at"
+    )
+
+
+_builders = {}
+
+
+def row_factory(record_type):
+    """
+    sqlite3 row_factory producing record_type instances. The column to
+    slot mapping is worked out once per distinct query shape, not per row.
+    """
+    # (cursor.description, builder) of the last query shape seen
+    last = [(None, None)]
+
+    def factory(cursor, row):
+        description, build = last[0]
+
+        if description is not cursor.description:
+            description = cursor.description
+            build = _builder(record_type, tuple(column[0] for column in description))
+            last[0] = (description, build)
+
+        return build(row)
+
+    return factory
+
+
+def _builder(record_type, columns):
+    key = (record_type, columns)
+    build = _builders.get(key)
+
+    if build is None:
+        unknown = [name for name in columns if name not in record_type.__slots__]
+        if unknown:
+            raise ValueError(f"{record_type.__name__} has no field(s) {unknown}")
+
+        missing = tuple(name for name in record_type.__slots__ if name not in columns)
+
+        def build(row):
+            record = record_type.__new__(record_type)
+            for name, value in zip(columns, row):
+                setattr(record, name, value)
+            for name in missing:
+                setattr(record, name, None)
+            return record
+
+        _builders[key] = build
+
+    return build
@@ -0,0 +1,17 @@
+# ===============================
+# PIPELINE STAGE LOGIC
+# ===============================
+
+# Score -> stage mapping. Lives on its own so the database layer can
+# register it as the pipeline_stage_for() SQL function without importing
+# lead_manager, which imports the database layer.
+
+def determine_pipeline_stage(total_score):
+    if total_score >= 90:
+        return "Hot"
+    elif total_score >= 60:
+        return "Qualified"
+    elif total_score >= 30:
+        return "Warm"
+    else:
+        return "New"
@@ -0,0 +1,167 @@
+import re
+
+# ===============================
+# TOKEN-BUDGETED PROMPT BUILDER
+# ===============================
+
+# Assembles the Gemini prompt from named sections under a token budget.
+#
+# Fixed sections (system prompt, role instruction, CRM context, sales
+# guidance, the question, the closing instructions) are always included.
+# What is left of the budget is filled in priority order:
+#
+#   1. the best-ranked knowledge chunk
+#   2. the latest exchange (last user + assistant message)
+#   3. the rolling summary of earlier turns (conversation_memory)
+#   4. the remaining chunks, best first
+#   5. older messages, newest first
+#
+# so when a turn is over budget the oldest history goes first, then the
+# lowest-ranked chunks, then the summary. chat_history is every message not
+# yet folded into the summary and is not cut to a fixed number of turns,
+# since a message that has left the recent window may not have reached the
+# summary yet; only the budget drops messages. Every history message is
+# also capped on its own, which keeps one long assistant reply from
+# inflating every later turn.
+#
+# Tokens are estimated locally (~4 characters per Gemini token) rather than
+# with a countTokens round trip; the estimate only has to be stable.
+
+CHARS_PER_TOKEN = 4
+
+WORD_BOUNDARY = re.compile(r"\s+\S*$")
+
+PROMPT_TEMPLATE = """
+{system}
+
+{role}
+
+{crm}
+
+{guidance}
+
+Conversation so far:
+{summary}{history}
+
+Relevant Knowledge:
+{knowledge}
+
+Current User Question:
+{question}
+
+{instructions}
+"""
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    text cut at a word boundary to about max_tokens, marked with "...".
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    cut = text[:max(max_tokens * CHARS_PER_TOKEN - 3, 0)]
+    cut = WORD_BOUNDARY.sub("", cut) or cut
+    return cut + "..."
+
+
+def format_message(role, message, max_tokens):
+    speaker = "User" if role == "user" else "Assistant"
+    return f"{speaker}: {truncate_to_tokens(message, max_tokens)}\n"
+
+
+def assemble_prompt(query, context_chunks, chat_history, budget, system="",
+                    role_instruction="", crm_context="", sales_guidance="",
+                    instructions="", summary="", message_tokens=150):
+    """
+    Returns (prompt, stats). context_chunks must be best first; stats holds
+    the token count of each section plus what was kept and dropped.
+    """
+    fixed = {
+        "system": system,
+        "role": role_instruction,
+        "crm": crm_context,
+        "guidance": sales_guidance,
+        "question": query,
+        "instructions": instructions
+    }
+    stats = {name: estimate_tokens(text) for name, text in fixed.items()}
+
+    # Headings and blank lines of the template itself
+    empty = dict.fromkeys(fixed, "")
+    overhead = estimate_tokens(PROMPT_TEMPLATE.format(**empty, summary="", history="", knowledge=""))
+    remaining = budget - overhead - sum(stats.values())
+
+    messages = [
+        format_message(role, message, message_tokens)
+        for role, message in chat_history
+    ]
+
+    if summary:
+        summary = f"Summary of earlier conversation: {summary}\n\n"
+
+    # (kind, position, text) in fill priority
+    latest = len(messages) - 2
+    candidates = (
+        [("chunk", 0, chunk) for chunk in context_chunks[:1]]
+        + [("message", i, messages[i]) for i in range(len(messages) - 1, max(latest, 0) - 1, -1)]
+        + [("summary", 0, summary)] * bool(summary)
+        + [("chunk", i, chunk) for i, chunk in enumerate(context_chunks[1:], 1)]
+        + [("message", i, messages[i]) for i in range(latest - 1, -1, -1)]
+    )
+
+    kept = {"chunk": set(), "message": set(), "summary": set()}
+
+    for kind, position, text in candidates:
+        # Chunks are joined with a blank line
+        tokens = estimate_tokens(text) + (1 if kind == "chunk" else 0)
+
+        # History is only useful without gaps: once a message is dropped,
+        # every older one goes too
+        if kind == "message" and position + 1 < len(messages) and position + 1 not in kept["message"]:
+            continue
+
+        if tokens <= remaining:
+            kept[kind].add(position)
+            remaining -= tokens
+
+    chunks = [chunk for i, chunk in enumerate(context_chunks) if i in kept["chunk"]]
+    history = [message for i, message in enumerate(messages) if i in kept["message"]]
+
+    context = "\n\n".join(chunks)
+    conversation_memory = "".join(history)
+    summary = summary if kept["summary"] else ""
+
+    stats["knowledge"] = estimate_tokens(context)
+    stats["history"] = estimate_tokens(conversation_memory)
+    stats["summary"] = estimate_tokens(summary)
+    stats["chunks_kept"] = len(chunks)
+    stats["chunks_dropped"] = len(context_chunks) - len(chunks)
+    stats["messages_kept"] = len(history)
+    stats["messages_dropped"] = len(chat_history) - len(history)
+    stats["budget"] = budget
+
+    prompt = PROMPT_TEMPLATE.format(
+        **fixed,
+        summary=summary,
+        history=conversation_memory,
+        knowledge=context
+    )
+
+    stats["total"] = estimate_tokens(prompt)
+    return prompt, stats
+
+
+def format_stats(stats):
+    return (
+        f"Prompt tokens: system {stats['system'] + stats['role']}, "
+        f"crm {stats['crm'] + stats['guidance']}, "
+        f"summary {stats['summary']}, "
+        f"history {stats['history']} ({stats['messages_kept']} msgs, {stats['messages_dropped']} dropped), "
+        f"knowledge {stats['knowledge']} ({stats['chunks_kept']} chunks, {stats['chunks_dropped']} dropped), "
+        f"question {stats['question']}, total {stats['total']}/{stats['budget']}"
+    )
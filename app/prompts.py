@@ -13,3 +13,22 @@ SCHOOL_INSTRUCTION = """
 Focus on curriculum integration, partnerships, scalability, and impact.
 Encourage consultation booking.
 """
+
+RESPONSE_INSTRUCTIONS = """Instructions:
+- Personalize using known CRM information.
+- If signals are missing (grade, urgency, interest), ask smart follow-up questions.
+- Suggest next best action.
+- Keep tone professional, persuasive, and friendly."""
+
+SUMMARY_PROMPT = """
+You maintain the memory of a WizKlub sales conversation.
+
+Current summary:
+{summary}
+
+Newer messages:
+{transcript}
+Rewrite the summary to include the newer messages, in at most {words} words.
+Keep every fact about the family or school (names, child's grade, interests,
+budget, preferred timings, objections, bookings) and open questions.
+Drop greetings and small talk. Return only the summary text."""
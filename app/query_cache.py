@@ -0,0 +1,94 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ===============================
+# QUERY EMBEDDING CACHE
+# ===============================
+
+# Query embeddings keyed by normalized query text, so a repeated message
+# ("what are the fees?", "What are the fees") is encoded once per process.
+# Bounded LRU; the stored vectors are read-only so callers cannot corrupt
+# an entry by normalizing it in place.
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(text):
+    text = WHITESPACE.sub(" ", text.strip().lower())
+    return TRAILING_PUNCTUATION.sub("", text)
+
+
+class QueryEmbeddingCache:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, queries, encode):
+        """
+        (len(queries), dimension) float32 array. Misses are encoded together
+        in one encode() call.
+        """
+        keys = [normalize_query(query) for query in queries]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+
+        if missing:
+            vectors = np.asarray(encode(missing), dtype=np.float32)
+
+            for key, vector in zip(missing, vectors):
+                vector = vector.copy()
+                vector.flags.writeable = False
+                found[key] = vector
+
+            with self._lock:
+                for key in missing:
+                    self._entries[key] = found[key]
+                    self._entries.move_to_end(key)
+
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        return np.stack([found[key] for key in keys])
+
+    def get(self, query, encode):
+        return self.get_many([query], encode)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from chunk_store import ChunkStore
+from config import RETRIEVAL_MODE
+from index_factory import MANIFEST_FILE, load_index, read_manifest
+from lexical_index import load_lexical_index
+
+# ===============================
+# SHARED RESOURCES
+# ===============================
+
+# The embedding model and vector index are loaded once per process, on first
+# use, and shared by every Streamlit session. Imported modules survive
+# Streamlit reruns, so a rerun only pays for a dictionary lookup here.
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INDEX_DIR = os.path.join(PROJECT_ROOT, "vector_store", "faiss_index")
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Seconds spent loading each resource, for startup reporting
+LOAD_TIMINGS = {}
+
+_lock = threading.Lock()
+_embedding_model = None
+_vector_store = None
+_index_manifest = None
+_lexical_index = None
+
+logger = logging.getLogger(__name__)
+
+
+def _timed(name, loader):
+    start = time.perf_counter()
+    value = loader()
+    LOAD_TIMINGS[name] = time.perf_counter() - start
+    logger.info("Loaded %s in %.0f ms", name, LOAD_TIMINGS[name] * 1000)
+    return value
+
+
+def _load_vector_store():
+    global _index_manifest, _lexical_index
+
+    # The manifest says how the index was built and which search-time
+    # parameters (nprobe / efSearch) and query normalization it needs
+    manifest = read_manifest(INDEX_DIR)
+
+    # Memory-mapped where the index type allows it, so workers share pages
+    index = load_index(os.path.join(INDEX_DIR, "index.faiss"), manifest, mmap=True)
+    chunks = ChunkStore(INDEX_DIR)
+
+    # BM25 side of hybrid retrieval; None for stores built without it
+    _lexical_index = load_lexical_index(INDEX_DIR)
+
+    # Stores from before the manifest still load, but as plain L2 dense
+    # search; say so instead of silently serving the old behaviour
+    if not os.path.exists(os.path.join(INDEX_DIR, MANIFEST_FILE)):
+        logger.warning(
+            "%s has no %s; searching it as a legacy flat_l2 index. "
+            "Run python vector_store/build_index.py --full to rebuild it.",
+            INDEX_DIR, MANIFEST_FILE
+        )
+
+    if RETRIEVAL_MODE == "hybrid" and _lexical_index is None:
+        logger.warning(
+            "RETRIEVAL_MODE is hybrid but %s has no BM25 index; using dense "
+            "retrieval only. Run python vector_store/build_index.py --full to add it.",
+            INDEX_DIR
+        )
+
+    _index_manifest = manifest
+    return index, chunks
+
+
+def get_embedding_model():
+    global _embedding_model
+
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                _embedding_model = _timed(
+                    "embedding_model",
+                    lambda: SentenceTransformer(EMBEDDING_MODEL_NAME)
+                )
+
+    return _embedding_model
+
+
+def get_vector_store():
+    """
+    Returns (index, chunks), reading them from disk only the first time.
+    """
+    global _vector_store
+
+    if _vector_store is None:
+        with _lock:
+            if _vector_store is None:
+                _vector_store = _timed("vector_store", _load_vector_store)
+
+    return _vector_store
+
+
+def get_index_manifest():
+    get_vector_store()
+    return _index_manifest
+
+
+def get_lexical_index():
+    get_vector_store()
+    return _lexical_index
+
+
+def reload_vector_store():
+    """
+    Drops the loaded index so the next call re-reads it (after a rebuild).
+    """
+    global _vector_store, _index_manifest, _lexical_index
+
+    with _lock:
+        _vector_store = None
+        _index_manifest = None
+        _lexical_index = None
+
+
+def warmup():
+    """
+    Loads everything up front so the first chat turn is not the slow one.
+    Returns the load timings in seconds.
+    """
+    get_embedding_model()
+    get_vector_store()
+    return dict(LOAD_TIMINGS)
@@ -0,0 +1,207 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# ===============================
+# SEMANTIC RESPONSE CACHE
+# ===============================
+
+# Answers to CRM-less questions, keyed by the query embedding. A new query
+# whose cosine similarity to a cached one clears the threshold (and has the
+# same user_type and context) reuses that answer instead of calling Gemini.
+# context is an opaque key for everything besides the question that shapes
+# the answer (chat_engine hashes the conversation so far); "" for an
+# opening question.
+#
+# With a path, every store is written through (the cache is small next to
+# the Gemini call a store follows) and hit counts are flushed at exit.
+
+
+class SemanticResponseCache:
+
+    def __init__(self, path=None, threshold=0.9, ttl_seconds=24 * 3600,
+                 max_entries=500, save_every=1):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.save_every = save_every
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = []
+        self._unsaved = 0
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+        if path:
+            self._load()
+            atexit.register(self.flush)
+
+    # ---------- lookup / store ----------
+
+    def lookup(self, query_vector, user_type, context=""):
+        """
+        Returns the cached answer for a similar query, or None.
+        """
+        vector = _normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            best = self._best_match(vector, user_type, context, now)
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best]
+            entry["last_used"] = now
+            entry["hits"] += 1
+
+            self.hits += 1
+            self.latency_saved += entry["generation_time"]
+            self._dirty = True
+
+            return entry["answer"]
+
+    def store(self, query_vector, user_type, query, answer, generation_time,
+              context=""):
+        vector = _normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            self._evict(now)
+
+            entry = {
+                "query": query,
+                "user_type": user_type,
+                "context": context,
+                "answer": answer,
+                "generation_time": generation_time,
+                "created_at": now,
+                "last_used": now,
+                "hits": 0
+            }
+
+            if self._vectors is None:
+                self._vectors = vector[None, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+
+            self._entries.append(entry)
+            self._unsaved += 1
+
+            if self.path and self._unsaved >= self.save_every:
+                self._save()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved": self.latency_saved
+        }
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def flush(self):
+        """
+        Saves if anything changed since the last save.
+        """
+        with self._lock:
+            if self.path and (self._unsaved or self._dirty):
+                self._save()
+
+    # ---------- internals ----------
+
+    def _best_match(self, vector, user_type, context, now):
+        if not self._entries:
+            return None
+
+        similarities = self._vectors @ vector
+
+        for i in np.argsort(-similarities):
+            if similarities[i] < self.threshold:
+                return None
+
+            entry = self._entries[i]
+
+            if entry["user_type"] != user_type:
+                continue
+
+            # Entries saved before context keys were opening questions
+            if entry.get("context", "") != context:
+                continue
+
+            if now - entry["created_at"] > self.ttl_seconds:
+                continue
+
+            return int(i)
+
+        return None
+
+    def _evict(self, now):
+        keep = [
+            i for i, entry in enumerate(self._entries)
+            if now - entry["created_at"] <= self.ttl_seconds
+        ]
+
+        # Least recently used entries go first once the cache is full
+        if len(keep) >= self.max_entries:
+            keep.sort(key=lambda i: self._entries[i]["last_used"])
+            keep = sorted(keep[len(keep) - self.max_entries + 1:])
+
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep else None
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        vectors = self._vectors
+        if vectors is None:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+
+        with open(self.path + ".npy.tmp", "wb") as f:
+            np.save(f, vectors)
+
+        with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries, "stats": self.stats()}, f)
+
+        os.replace(self.path + ".npy.tmp", self.path + ".npy")
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+
+        self._unsaved = 0
+        self._dirty = False
+
+    def _load(self):
+        try:
+            vectors = np.load(self.path + ".npy")
+            with open(self.path + ".json", encoding="utf-8") as f:
+                data = json.load(f)
+
+        except (OSError, ValueError):
+            return
+
+        if len(data["entries"]) != len(vectors) or not len(vectors):
+            return
+
+        self._vectors = vectors.astype(np.float32)
+        self._entries = data["entries"]
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,187 @@
+import re
+
+# ===============================
+# LOCAL SIGNAL EXTRACTION
+# ===============================
+
+# A rule-based first pass over the same fields the LLM extractor returns.
+# It resolves the common cases (greetings, "my son is in Class 6", "what is
+# the fee") without a Gemini call and reports which fields it saw hints of
+# but could not pin down, so the caller knows when the LLM is still needed.
+
+SIGNAL_FIELDS = ("grade", "program_interest", "urgency", "budget_signal", "intent")
+
+# Below this the caller should ask the LLM
+CONFIDENCE_THRESHOLD = 0.6
+
+# Long messages that match nothing probably say something the rules miss
+LONG_MESSAGE_WORDS = 25
+
+_FLAGS = re.IGNORECASE
+
+GRADE_PATTERNS = [
+    re.compile(r"\b(grade|class|std|standard)\.?\s*(\d{1,2})(?:st|nd|rd|th)?\b", _FLAGS),
+    re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\s+(grade|class|std|standard)\b", _FLAGS),
+]
+
+# "class" alone is too common ("demo class") to count as a grade hint
+GRADE_CUE = re.compile(
+    r"\b(grade|std|standard|years? old|kindergarten|kg)\b"
+    r"|(?<!demo )(?<!trial )(?<!free )(?<!online )(?<!offline )\bclass\b",
+    _FLAGS
+)
+
+PROGRAM_KEYWORDS = [
+    ("Robotics", re.compile(r"\brobot(s|ics)?\b", _FLAGS)),
+    ("Coding", re.compile(r"\b(coding|code|programming|python|scratch)\b", _FLAGS)),
+    ("AI", re.compile(r"\b(ai|a\.i\.|artificial intelligence|machine learning)\b", _FLAGS)),
+    ("Math", re.compile(r"\b(math|maths|mathematics|arithmetic)\b", _FLAGS)),
+    ("Logical Reasoning", re.compile(r"\b(logical reasoning|logic|reasoning)\b", _FLAGS)),
+    ("STEM", re.compile(r"\b(stem labs?|stem)\b", _FLAGS)),
+]
+
+PROGRAM_CUE = re.compile(r"\b(program|programme|course|subject|curriculum)s?\b", _FLAGS)
+
+URGENCY_KEYWORDS = [
+    ("High", re.compile(
+        r"\b(urgent(ly)?|asap|immediately|right away|as soon as possible"
+        r"|this week|today|tomorrow)\b", _FLAGS)),
+    ("Medium", re.compile(
+        r"\b(soon|next week|next month|this month|within a month|in a few weeks)\b", _FLAGS)),
+    ("Low", re.compile(
+        r"\b(no rush|no hurry|just exploring|next year|someday|later this year"
+        r"|not urgent|not in a hurry)\b", _FLAGS)),
+]
+
+URGENCY_CUE = re.compile(r"\b(when|start|begin|hurry|rush|quick(ly)?)\b", _FLAGS)
+
+BUDGET_KEYWORDS = [
+    ("Sensitive", re.compile(
+        r"\b(expensive|afford|cheap(er)?|discount|too costly|costly|concession"
+        r"|scholarship|tight budget|low budget)\b", _FLAGS)),
+    ("Premium", re.compile(
+        r"\b(premium|money is not|cost is not|price is not|whatever it costs"
+        r"|best program|top quality)\b", _FLAGS)),
+    ("Neutral", re.compile(r"\b(fees?|price|pricing|cost|charges?|how much)\b", _FLAGS)),
+]
+
+BUDGET_CUE = re.compile(r"\b(budget|money|pay|payment|emi|installments?)\b", _FLAGS)
+
+INTENT_KEYWORDS = [
+    ("Partnership", re.compile(
+        r"\b(partner(ship)?|collaborat\w*|tie[- ]up|our school|my school"
+        r"|principal|set up a stem lab|for our students)\b", _FLAGS)),
+    ("Demo", re.compile(
+        r"\b(demo|trial class|free class|book a (class|session|slot))\b", _FLAGS)),
+    ("Enrollment", re.compile(
+        r"\b(enrol(l)?(ment)?|admission|sign (him|her|them|up)|register|join)\b", _FLAGS)),
+    ("Exploration", re.compile(
+        r"\b(what is|what are|tell me|information|details|how does|curious"
+        r"|looking for|explor(e|ing)|options|do you (offer|have|teach))\b", _FLAGS)),
+]
+
+INTENT_CUE = re.compile(r"\b(want|interested|plan(ning)?|thinking)\b", _FLAGS)
+
+SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|hii+|good (morning|afternoon|evening)|thanks?( you)?"
+    r"|thank you so much|ok(ay)?|cool|great|bye|goodbye|sure|yes|no)\W*$",
+    _FLAGS
+)
+
+NEGATION = re.compile(r"\b(not|no|don't|dont|never|without)\s+(\w+\s+)?$", _FLAGS)
+
+
+def _negated(text, match):
+    return bool(NEGATION.search(text[max(0, match.start() - 20):match.start()]))
+
+
+def extract_grade_locally(text):
+    """
+    Returns e.g. "Class 8" / "Grade 6", or None.
+    """
+    for pattern in GRADE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+
+        first, second = match.groups()
+        word, number = (first, second) if first.isalpha() else (second, first)
+        word = "Class" if word.lower() in ("class", "std", "standard") else "Grade"
+
+        if 1 <= int(number) <= 12:
+            return f"{word} {int(number)}"
+
+    return None
+
+
+def _match_one(text, keywords):
+    """
+    Returns (value, ambiguous) for single-valued fields.
+    """
+    found = []
+
+    for value, pattern in keywords:
+        match = pattern.search(text)
+        if match and not _negated(text, match):
+            found.append(value)
+
+    if not found:
+        return None, False
+
+    # The first matching rule wins but competing hits need a second opinion,
+    # except price questions that also carry a sentiment.
+    if len(found) > 1 and not (len(found) == 2 and "Neutral" in found):
+        return found[0], True
+
+    return found[0], False
+
+
+def extract_signals_locally(text):
+    """
+    Returns {"signals": {...}, "unresolved": [...], "confidence": float}.
+    signals has the same keys and value format as normalize_signals.
+    """
+    signals = dict.fromkeys(SIGNAL_FIELDS)
+    unresolved = []
+
+    if SMALL_TALK.match(text):
+        return {"signals": signals, "unresolved": unresolved, "confidence": 1.0}
+
+    signals["grade"] = extract_grade_locally(text)
+    if not signals["grade"] and GRADE_CUE.search(text):
+        unresolved.append("grade")
+
+    programs = [
+        value for value, pattern in PROGRAM_KEYWORDS
+        if pattern.search(text)
+    ]
+    if programs:
+        signals["program_interest"] = ", ".join(programs)
+    elif PROGRAM_CUE.search(text):
+        unresolved.append("program_interest")
+
+    for field, keywords, cue in (
+        ("urgency", URGENCY_KEYWORDS, URGENCY_CUE),
+        ("budget_signal", BUDGET_KEYWORDS, BUDGET_CUE),
+        ("intent", INTENT_KEYWORDS, INTENT_CUE),
+    ):
+        value, ambiguous = _match_one(text, keywords)
+        signals[field] = value
+
+        if ambiguous or (value is None and cue.search(text)):
+            unresolved.append(field)
+
+    found = sum(1 for value in signals.values() if value)
+
+    if unresolved:
+        confidence = 0.3
+    elif found == 0 and len(text.split()) > LONG_MESSAGE_WORDS:
+        confidence = 0.4
+    else:
+        confidence = 0.9
+
+    return {"signals": signals, "unresolved": unresolved, "confidence": confidence}
+
+
+def needs_llm(result):
+    return bool(result["unresolved"]) or result["confidence"] < CONFIDENCE_THRESHOLD
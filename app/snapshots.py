@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import SNAPSHOT_DIR
+from database import (
+    PROJECT_ROOT,
+    SNAPSHOT_TABLES,
+    clear_dirty_partitions,
+    get_dirty_partitions,
+    get_lead_events_after,
+    get_partition_days,
+    get_partition_rows,
+    initialize_db
+)
+
+# ===============================
+# PARQUET SNAPSHOTS
+# ===============================
+
+# Reporting reads columnar copies of the CRM tables instead of the live
+# SQLite file that serves the chat path. Layout under SNAPSHOT_DIR:
+#
+#   leads/day=YYYY-MM-DD/part.parquet        by created_at (local day)
+#   bookings/day=YYYY-MM-DD/part.parquet     by created_at (local day)
+#   lead_events/day=YYYY-MM-DD/part.parquet  by event time (UTC day)
+#   manifest.json                            event watermark, export time
+#
+# Each export only rewrites what changed: lead and booking partitions marked
+# dirty by triggers since their last export, and the event partitions that
+# received events past the watermark. Files are replaced atomically, so
+# readers see either the old or the new version of a partition.
+
+MANIFEST_FILE = "manifest.json"
+EVENTS_TABLE = "lead_events"
+EVENT_BATCH_SIZE = 100_000
+
+# Columns that are not strings in the snapshots
+COLUMN_TYPES = {
+    "id": pa.int64(),
+    "lead_id": pa.int64(),
+    "lead_score": pa.int64(),
+    "old_score": pa.int64(),
+    "new_score": pa.int64(),
+    "seat": pa.int64(),
+    "first_reach": pa.int64(),
+    "cohort_day": pa.int64(),
+    "seconds_in_stage": pa.float64(),
+    "created_at": pa.timestamp("us"),
+    "ts": pa.timestamp("us", tz="UTC")
+}
+
+
+def snapshot_dir():
+    return os.path.join(PROJECT_ROOT, SNAPSHOT_DIR)
+
+
+def read_snapshot_manifest(directory=None):
+    """
+    The manifest of the last completed export, or None if there is none.
+    """
+    path = os.path.join(directory or snapshot_dir(), MANIFEST_FILE)
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(path + ".tmp", path)
+
+
+def _column(name, values):
+    arrow_type = COLUMN_TYPES.get(name, pa.string())
+
+    if name == "created_at":
+        return pa.array(values, pa.string()).cast(arrow_type)
+
+    if name == "ts":
+        micros = [None if value is None else round(value * 1_000_000) for value in values]
+        return pa.array(micros, pa.int64()).cast(arrow_type)
+
+    return pa.array(values, arrow_type)
+
+
+def _to_arrow(columns, rows):
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pa.table({name: _column(name, list(col)) for name, col in zip(columns, values)})
+
+
+def _partition_path(directory, table, day):
+    return os.path.join(directory, table, f"day={day}")
+
+
+def _write_partition(directory, table, day, arrow_table):
+    """
+    Replaces one partition file; an empty table removes the partition.
+    """
+    path = _partition_path(directory, table, day)
+
+    if arrow_table.num_rows == 0:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, "part.parquet")
+
+    pq.write_table(arrow_table, target + ".tmp", compression="zstd")
+    os.replace(target + ".tmp", target)
+
+
+# ===============================
+# EXPORT
+# ===============================
+
+def _export_table(directory, table, full):
+    """
+    Rewrites the dirty day partitions of leads or bookings (all of them
+    when full). Returns the number of partitions written.
+    """
+    dirty = get_dirty_partitions(table)
+    days = {day for day, _ in dirty}
+
+    if full:
+        current = set(get_partition_days(table))
+        table_dir = os.path.join(directory, table)
+
+        # Partitions whose rows are all gone
+        if os.path.isdir(table_dir):
+            for name in os.listdir(table_dir):
+                if name.startswith("day=") and name[4:] not in current:
+                    days.add(name[4:])
+
+        days |= current
+
+    for day in sorted(days):
+        cursor = get_partition_rows(table, day)
+        columns = [column[0] for column in cursor.description]
+        _write_partition(directory, table, day, _to_arrow(columns, cursor.fetchall()))
+
+    # Partitions written again since are still dirty (their seq moved on)
+    clear_dirty_partitions(table, dirty)
+    return len(days)
+
+
+def _export_events(directory, watermark):
+    """
+    Appends events past the watermark to their day partitions. Rows above
+    the watermark already in a file (from an export that died before
+    saving its manifest) are dropped first. Returns the new watermark.
+    """
+    while True:
+        cursor = get_lead_events_after(watermark, EVENT_BATCH_SIZE)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+        if not rows:
+            return watermark
+
+        ts = columns.index("ts")
+        by_day = {}
+
+        for row in rows:
+            day = datetime.fromtimestamp(row[ts], timezone.utc).strftime("%Y-%m-%d")
+            by_day.setdefault(day, []).append(row)
+
+        for day, day_rows in by_day.items():
+            new = _to_arrow(columns, day_rows)
+            path = os.path.join(_partition_path(directory, EVENTS_TABLE, day), "part.parquet")
+
+            if os.path.exists(path):
+                old = pq.ParquetFile(path).read()
+                old = old.filter(pc.less_equal(old["id"], watermark))
+                new = pa.concat_tables([old, new], promote_options="default")
+
+            _write_partition(directory, EVENTS_TABLE, day, new)
+
+        watermark = rows[-1][columns.index("id")]
+
+
+def export_snapshots(directory=None, full=False):
+    """
+    Brings the Parquet snapshots up to date with the database. Without a
+    manifest (first run, or the directory was wiped) everything is exported.
+    """
+    start = time.perf_counter()
+    directory = directory or snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = read_snapshot_manifest(directory)
+    full = full or manifest is None
+    watermark = 0 if full else manifest["event_watermark"]
+
+    partitions = {table: _export_table(directory, table, full) for table in SNAPSHOT_TABLES}
+
+    if full:
+        shutil.rmtree(os.path.join(directory, EVENTS_TABLE), ignore_errors=True)
+
+    event_watermark = _export_events(directory, watermark)
+
+    manifest = {
+        "event_watermark": event_watermark,
+        "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+    _write_manifest(directory, manifest)
+
+    print(
+        f"Snapshot {'full' if full else 'incremental'} export: "
+        + ", ".join(f"{count} {table} partition(s)" for table, count in partitions.items())
+        + f", {event_watermark - watermark} event(s) in {time.perf_counter() - start:.2f}s."
+    )
+
+    return manifest
+
+
+# ===============================
+# READ
+# ===============================
+
+def snapshot_dataset(table, directory=None):
+    """
+    Arrow dataset over a snapshot table, with the partition key as a 'day'
+    string column. Filters on day only open the matching partitions.
+    """
+    path = os.path.join(directory or snapshot_dir(), table)
+
+    return ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+    )
+
+
+def read_snapshot(table, columns=None, filter=None, directory=None):
+    """
+    Reads only the given columns (and matching partitions) of a snapshot
+    table. Returns None if the table has not been exported yet.
+    """
+    if not os.path.isdir(os.path.join(directory or snapshot_dir(), table)):
+        return None
+
+    return snapshot_dataset(table, directory).to_table(columns=columns, filter=filter)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export CRM tables to Parquet snapshots.")
+    parser.add_argument("--full", action="store_true", help="rewrite every partition")
+    parser.add_argument("--dir", default=None, help=f"snapshot directory (default {SNAPSHOT_DIR})")
+    args = parser.parse_args()
+
+    initialize_db()
+    export_snapshots(directory=args.dir, full=args.full)
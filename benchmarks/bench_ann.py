@@ -0,0 +1,107 @@
+"""
+Recall@k against the exact flat baseline and single-query latency
+(p50/p99) for every index type in index_factory, on synthetic clustered
+embeddings normalized like MiniLM vectors.
+
+    python benchmarks/bench_ann.py --sizes 10000 100000 --k 3
+    python benchmarks/bench_ann.py --sizes 1000000 --types hnsw ivf_pq
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from index_factory import INDEX_TYPES, create_index, needs_training, normalizes, resolve_params
+
+DIMENSION = 384
+TRAIN_SAMPLE = 100_000
+
+
+def synthetic_embeddings(n, dimension=DIMENSION, clusters=200, seed=0):
+    """
+    Gaussian blobs on the unit sphere; real chunk embeddings are clustered
+    by topic, which is what makes IVF/HNSW work at all.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = np.empty((n, dimension), dtype=np.float32)
+
+    for start in range(0, n, 100_000):
+        stop = min(start + 100_000, n)
+        labels = rng.integers(0, clusters, stop - start)
+        noise = rng.standard_normal((stop - start, dimension)).astype(np.float32)
+        vectors[start:stop] = centers[labels] + 0.6 * noise
+
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build(index_type, vectors):
+    params = resolve_params(index_type, n_train=min(len(vectors), TRAIN_SAMPLE))
+    index = create_index(index_type, vectors.shape[1], params)
+
+    if needs_training(index_type):
+        index.train(vectors[:TRAIN_SAMPLE])
+
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    if "nprobe" in params:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    if "efSearch" in params:
+        faiss.downcast_index(index.index).hnsw.efSearch = params["efSearch"]
+
+    return index, params
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    hits = 0
+
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(truth[i]))
+
+    latencies = np.array(latencies) * 1000
+    return hits / (len(queries) * k), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--types", nargs="+", default=[t for t in INDEX_TYPES if normalizes(t)])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    # Single-query latency is what a chat turn sees
+    faiss.omp_set_num_threads(1)
+
+    for n in args.sizes:
+        vectors = synthetic_embeddings(n)
+        queries = synthetic_embeddings(args.queries, seed=1)
+
+        baseline = faiss.IndexFlatIP(DIMENSION)
+        baseline.add(vectors)
+        _, truth = baseline.search(queries, args.k)
+
+        print(f"\n{n} chunks, recall@{args.k} vs flat_ip")
+        print(f"{'index':<10} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}  params")
+
+        for index_type in args.types:
+            start = time.perf_counter()
+            index, params = build(index_type, vectors)
+            build_time = time.perf_counter() - start
+
+            recall, p50, p99 = measure(index, queries, truth, args.k)
+            print(f"{index_type:<10} {recall:>7.3f} {p50:>8.3f} {p99:>8.3f} {build_time:>8.1f}  {params}")
+
+
+if __name__ == "__main__":
+    main()
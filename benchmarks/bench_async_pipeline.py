@@ -0,0 +1,69 @@
+"""
+Compares the old sequential turn (extract signals, then answer) with the
+concurrent pipeline in chat_engine.generate_response, using the offline
+FakeClient so no API key or network is needed.
+
+    python benchmarks/bench_async_pipeline.py --latency 0.8 --turns 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import crm_queue
+import database
+import llm_client
+from fake_llm import FakeClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.initialize_db()
+    database.save_lead("Bench Parent", "bench@example.com", "0", "Parent")
+    crm_data = database.get_lead_by_email("bench@example.com")
+
+    client = FakeClient(latency=args.latency)
+    llm_client.set_client(client)
+
+    from ai_extractor import extract_lead_signals
+    from chat_engine import build_prompt, generate_response
+    from signal_rules import extract_signals_locally, needs_llm
+
+    # Must be a message the local rules cannot settle, or no extraction
+    # call happens and there is nothing to overlap
+    query = "My daughter is in Class 6 and loves building things, which course would suit her?"
+    if not needs_llm(extract_signals_locally(query)):
+        sys.exit("Benchmark query is resolved by signal_rules; pick one that needs the LLM.")
+    chunks = ["WizKlub offers STEM programs for students from Grade 1 to Grade 10."]
+
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        extract_lead_signals(query)
+        llm_client.generate(build_prompt(query, chunks, [], "Parent", crm_data))
+    sequential = (time.perf_counter() - start) / args.turns
+
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        generate_response(query, chunks, [], "Parent", crm_data)
+    concurrent = (time.perf_counter() - start) / args.turns
+
+    llm_client.drain()
+    crm_queue.drain()
+
+    print(f"LLM latency per call : {args.latency * 1000:.0f} ms")
+    print(f"sequential per turn  : {sequential * 1000:.0f} ms")
+    print(f"concurrent per turn  : {concurrent * 1000:.0f} ms")
+    print(f"speedup              : {sequential / concurrent:.2f}x")
+    print(f"LLM calls            : {client.calls}")
+
+
+if __name__ == "__main__":
+    main()
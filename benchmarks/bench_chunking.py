@@ -0,0 +1,128 @@
+"""
+Offline retrieval quality for chunking settings: the old fixed 500-character
+windows against the semantic chunker at several token budgets and overlaps.
+
+For every query in data/eval/retrieval_queries.jsonl, a hit means the
+expected answer passage appears verbatim in one of the top-k chunks (a
+passage cut in half by a chunk boundary is a miss). Also reports the
+prompt tokens the k chunks cost.
+
+    python benchmarks/bench_chunking.py --k 3
+    python benchmarks/bench_chunking.py --budgets 96 160 256 --overlaps 0 30
+"""
+import argparse
+import json
+import os
+import sys
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vector_store"))
+
+from chunker import chunk_text, count_tokens
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+RAW_DIR = os.path.join(ROOT, "data", "raw")
+QUERIES = os.path.join(ROOT, "data", "eval", "retrieval_queries.jsonl")
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def fixed_windows(text, chunk_size=500, overlap=50):
+    """
+    The chunking build_index used before the semantic chunker.
+    """
+    start = 0
+    while start < len(text):
+        yield text[start:start + chunk_size]
+        start += chunk_size - overlap
+
+
+def load_documents(raw_dir):
+    documents = []
+
+    for root, dirs, files in os.walk(raw_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith((".txt", ".md")):
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    documents.append((os.path.relpath(os.path.join(root, name), raw_dir), f.read()))
+
+    return documents
+
+
+def semantic_chunks(documents, max_tokens, overlap_tokens):
+    """
+    (embedded text, context text) pairs, embedded with the section title
+    as build_index does.
+    """
+    pairs = []
+
+    for source, text in documents:
+        for chunk in chunk_text(text, source, max_tokens, overlap_tokens):
+            prefix = f"{chunk['section']}: " if chunk["section"] else ""
+            pairs.append((prefix + chunk["text"], chunk["text"]))
+
+    return pairs
+
+
+def evaluate(model, pairs, queries, query_vectors, k):
+    vectors = np.asarray(model.encode([embedded for embedded, _ in pairs]), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    _, found = index.search(query_vectors, k)
+
+    hits = 0
+    tokens = 0
+
+    for query, row in zip(queries, found):
+        texts = [pairs[i][1] for i in row if i >= 0]
+        hits += any(query["answer"] in " ".join(text.split()) for text in texts)
+        tokens += sum(count_tokens(text) for text in texts)
+
+    return hits / len(queries), tokens / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--queries", default=QUERIES)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[64, 96, 160, 256])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 30])
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    documents = load_documents(args.raw_dir)
+    model = SentenceTransformer(MODEL_NAME)
+
+    query_vectors = np.asarray(model.encode([q["query"] for q in queries]), dtype=np.float32)
+    faiss.normalize_L2(query_vectors)
+
+    configs = [("fixed 500/50 chars", [
+        (text, text) for _, document in documents for text in fixed_windows(document)
+    ])]
+
+    for budget in args.budgets:
+        for overlap in args.overlaps:
+            if overlap < budget:
+                configs.append((
+                    f"semantic {budget}/{overlap} tok",
+                    semantic_chunks(documents, budget, overlap)
+                ))
+
+    print(f"{len(queries)} queries, {len(documents)} documents, k={args.k}")
+    print(f"{'chunking':<22} {'chunks':>7} {'hit@k':>7} {'ctx tokens':>11}")
+
+    for name, pairs in configs:
+        hit_rate, tokens = evaluate(model, pairs, queries, query_vectors, args.k)
+        print(f"{name:<22} {len(pairs):>7} {hit_rate:>7.0%} {tokens:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Prompt size over a long simulated conversation: stored messages, summary
+updates and estimated prompt tokens per turn with ConversationMemory.
+Uses the offline FakeClient for the summary calls. Exits non-zero if any
+earlier message is in neither the prompt nor the summary.
+
+    python benchmarks/bench_conversation_memory.py --turns 60
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import llm_client
+from fake_llm import FakeClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--reply-words", type=int, default=180)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    llm_client.set_client(FakeClient(latency=args.latency))
+
+    from chat_engine import build_prompt
+    from conversation_memory import ConversationMemory
+    from config import HISTORY_MESSAGE_TOKENS
+    from prompt_builder import estimate_tokens, format_message
+
+    memory = ConversationMemory()
+    chunks = ["WizKlub offers STEM programs for students from Grade 1 to Grade 10."]
+
+    lost_turns = 0
+
+    print(f"{'turn':>5} {'stored':>7} {'summaries':>10} {'prompt tokens':>14} {'lost':>5}")
+
+    for turn in range(1, args.turns + 1):
+        query = f"Question {turn}: my daughter is in grade 6, what about robotics?"
+        history = memory.messages
+        prompt = build_prompt(query, chunks, history, "Parent", None, summary=memory.summary)
+
+        # Every earlier message is either summarized or in this prompt
+        in_prompt = sum(
+            format_message(role, message, HISTORY_MESSAGE_TOKENS) in prompt
+            for role, message in history
+        )
+        lost = 2 * (turn - 1) - memory.summarized_messages - in_prompt
+        lost_turns += lost > 0
+
+        memory.add("user", query)
+        memory.add("assistant", " ".join(["detail"] * args.reply_words))
+
+        # Let the background summary land, as it would between real turns
+        llm_client.drain(timeout=5)
+
+        if turn % 10 == 0 or turn == 1:
+            print(
+                f"{turn:>5} {len(memory.messages):>7} {memory.summary_updates:>10} "
+                f"{estimate_tokens(prompt):>14} {lost:>5}"
+            )
+
+    print(f"{lost_turns} turn(s) with messages in neither the prompt nor the summary")
+    sys.exit(1 if lost_turns else 0)
+
+
+if __name__ == "__main__":
+    main()
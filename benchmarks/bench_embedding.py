@@ -0,0 +1,57 @@
+"""
+Embedding throughput of the index build pipeline (chunks/sec) for a range
+of worker process counts, on a synthetic corpus.
+
+    python benchmarks/bench_embedding.py --chunks 4000 --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vector_store"))
+
+from build_index import ENCODE_BATCH_SIZE, WINDOW_SIZE, Encoder, get_model, iter_windows
+
+WORDS = (
+    "WizKlub robotics coding mathematics logical reasoning demo class grade "
+    "school partnership curriculum STEM lab students parents program fee "
+    "weekend online offline teacher project hands-on learning"
+).split()
+
+
+def synthetic_chunks(count, words_per_chunk=80, seed=7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield " ".join(rng.choice(WORDS) for _ in range(words_per_chunk))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    get_model()  # keep model load out of the timings
+
+    print(f"{'workers':>8} {'chunks/s':>10} {'seconds':>9}")
+
+    for workers in args.workers:
+        encoder = Encoder(workers=workers, batch_size=args.batch_size)
+
+        # Start the pool before timing, as a long build amortizes it
+        encoder.encode(["warmup"] * workers)
+
+        start = time.perf_counter()
+        for window in iter_windows(synthetic_chunks(args.chunks), WINDOW_SIZE):
+            encoder.encode(window)
+        elapsed = time.perf_counter() - start
+
+        encoder.close()
+        print(f"{workers:>8} {args.chunks / elapsed:>10.0f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
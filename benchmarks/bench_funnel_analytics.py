@@ -0,0 +1,143 @@
+"""
+Funnel analytics over months of lead history: rollup refresh cost and query
+latency from the hourly/daily rollups versus aggregating the raw lead_events
+log. History is synthesised straight into lead_events in a temp database.
+
+    python benchmarks/bench_funnel_analytics.py --leads 50000 --days 180
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import database
+import analytics
+
+
+def synthesize_events(leads, days, seed=0):
+    """
+    Event rows shaped like the ones the lead triggers write, spread over
+    the last `days` days.
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    rows = []
+
+    for lead_id in range(1, leads + 1):
+        ts = now - rng.uniform(0, days * 86400)
+        cohort_day = int(ts) // 86400 * 86400
+        score = 0
+        entered = ts
+        rows.append((lead_id, "created", None, "New", None, 0, ts, None, 1, cohort_day))
+
+        stage = "New"
+        for next_stage in analytics.STAGE_ORDER[1:]:
+            if rng.random() < 0.4:
+                break
+
+            # A few score-only updates while in the stage
+            for _ in range(rng.randint(1, 4)):
+                ts += rng.uniform(60, 6 * 3600)
+                delta = rng.randint(5, 15)
+                rows.append((lead_id, "score", stage, stage, score, score + delta, ts, None, 0, cohort_day))
+                score += delta
+
+            ts += rng.uniform(60, 3 * 86400)
+            rows.append((lead_id, "stage", stage, next_stage, score, score, ts, ts - entered, 1, cohort_day))
+            stage, entered = next_stage, ts
+
+    rows.sort(key=lambda row: row[6])
+    return rows
+
+
+def raw_conversion(start, end):
+    cursor = database.query("""
+    SELECT from_stage, to_stage, COUNT(*), SUM(seconds_in_stage)
+    FROM lead_events
+    WHERE kind = 'stage' AND ts >= ? AND ts < ?
+    GROUP BY 1, 2
+    """, (start, end))
+
+    return cursor.fetchall()
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=50000)
+    parser.add_argument("--days", type=int, default=180)
+    args = parser.parse_args()
+
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.initialize_db()
+
+    rows = synthesize_events(args.leads, args.days)
+
+    with database.transaction() as cursor:
+        cursor.executemany("""
+        INSERT INTO lead_events (
+            lead_id, kind, from_stage, to_stage, old_score, new_score, ts,
+            seconds_in_stage, first_reach, cohort_day
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    print(f"{len(rows)} events for {args.leads} leads over {args.days} days")
+
+    start = time.perf_counter()
+    analytics.refresh_rollups()
+    print(f"initial rollup:      {time.perf_counter() - start:8.3f}s")
+
+    # A day's worth of new events is what a periodic refresh sees
+    extra = synthesize_events(args.leads // args.days, 1, seed=1)
+    with database.transaction() as cursor:
+        cursor.executemany("""
+        INSERT INTO lead_events (
+            lead_id, kind, from_stage, to_stage, old_score, new_score, ts,
+            seconds_in_stage, first_reach, cohort_day
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, extra)
+
+    start = time.perf_counter()
+    analytics.refresh_rollups()
+    print(f"incremental rollup:  {time.perf_counter() - start:8.3f}s ({len(extra)} events)")
+
+    end = datetime.now(timezone.utc)
+
+    for days in (1, 30, args.days):
+        begin = end - timedelta(days=days)
+
+        raw, _ = timed(lambda: raw_conversion(begin.timestamp(), end.timestamp()))
+        conversion, _ = timed(lambda: analytics.get_conversion_rates(begin, end))
+        in_stage, _ = timed(lambda: analytics.get_time_in_stage(begin, end))
+        cohorts, _ = timed(lambda: analytics.get_cohort_funnel(begin, end))
+
+        print(
+            f"{days:>4} days: raw scan {raw * 1000:7.2f} ms | rollups: conversion "
+            f"{conversion * 1000:6.2f} ms, time-in-stage {in_stage * 1000:6.2f} ms, "
+            f"cohorts {cohorts * 1000:6.2f} ms"
+        )
+
+    funnel = analytics.get_cohort_funnel(end - timedelta(days=3), end)
+    for day, row in funnel.items():
+        print(day, row)
+
+
+if __name__ == "__main__":
+    main()
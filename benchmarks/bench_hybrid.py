@@ -0,0 +1,131 @@
+"""
+BM25 query latency on synthetic corpora, and hit@k of dense, lexical and
+hybrid (reciprocal-rank fused) retrieval on data/eval/retrieval_queries.jsonl.
+
+    python benchmarks/bench_hybrid.py --sizes 10000 100000 --k 3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vector_store"))
+
+from chunker import chunk_text
+from lexical_index import LexicalIndex, LexicalIndexWriter
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+RAW_DIR = os.path.join(ROOT, "data", "raw")
+QUERIES = os.path.join(ROOT, "data", "eval", "retrieval_queries.jsonl")
+MODEL_NAME = "all-MiniLM-L6-v2"
+RRF_K = 60
+
+
+def synthetic_text(rng, vocabulary, words=120):
+    # Zipf-distributed terms, like natural language
+    ranks = np.minimum(rng.zipf(1.2, words), len(vocabulary)) - 1
+    return " ".join(vocabulary[r] for r in ranks)
+
+
+def measure_latency(sizes, queries=500):
+    rng = np.random.default_rng(0)
+    vocabulary = [f"term{i}" for i in range(50_000)]
+
+    print(f"{'chunks':>8} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            writer = LexicalIndexWriter(directory)
+            for i in range(n):
+                writer.add(i, synthetic_text(rng, vocabulary))
+            writer.close()
+            build_time = time.perf_counter() - start
+
+            index = LexicalIndex(directory)
+
+        latencies = []
+        for _ in range(queries):
+            query = synthetic_text(rng, vocabulary, words=6)
+            start = time.perf_counter()
+            index.search(query, 20)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        print(
+            f"{n:>8} {build_time:>8.1f} "
+            f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}"
+        )
+
+
+def fuse(rankings):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def measure_quality(k, candidates=20):
+    with open(QUERIES, encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    chunks = []
+    for root, dirs, files in os.walk(RAW_DIR):
+        for name in sorted(files):
+            if name.endswith((".txt", ".md")):
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    chunks.extend(chunk_text(f.read(), name))
+
+    texts = [f"{c['section']}: {c['text']}" if c["section"] else c["text"] for c in chunks]
+
+    model = SentenceTransformer(MODEL_NAME)
+    vectors = np.asarray(model.encode(texts), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    dense_index = faiss.IndexFlatIP(vectors.shape[1])
+    dense_index.add(vectors)
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = LexicalIndexWriter(directory)
+        for i, text in enumerate(texts):
+            writer.add(i, text)
+        writer.close()
+        lexical_index = LexicalIndex(directory)
+
+    query_vectors = np.asarray(model.encode([q["query"] for q in queries]), dtype=np.float32)
+    faiss.normalize_L2(query_vectors)
+    _, dense_found = dense_index.search(query_vectors, candidates)
+
+    hits = {"dense": 0, "lexical": 0, "hybrid": 0}
+
+    for query, row in zip(queries, dense_found):
+        dense = [int(i) for i in row if i >= 0]
+        lexical = lexical_index.search(query["query"], candidates)[1].tolist()
+
+        for mode, ranking in (("dense", dense), ("lexical", lexical), ("hybrid", fuse([dense, lexical]))):
+            found = [" ".join(chunks[i]["text"].split()) for i in ranking[:k]]
+            hits[mode] += any(query["answer"] in text for text in found)
+
+    print(f"\n{len(queries)} queries, {len(chunks)} chunks, hit@{k}")
+    for mode, count in hits.items():
+        print(f"{mode:<8} {count / len(queries):>6.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    measure_latency(args.sizes)
+    measure_quality(args.k)
+
+
+if __name__ == "__main__":
+    main()
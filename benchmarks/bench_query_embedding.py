@@ -0,0 +1,59 @@
+"""
+Query-side retrieval cost: one retrieve_chunks call per query (cold and
+with the query-embedding cache warm) against a single retrieve_chunks_many
+batch. Uses the real MiniLM model and the built vector store.
+
+    python benchmarks/bench_query_embedding.py --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import chat_engine
+
+QUERIES = os.path.join(os.path.dirname(__file__), "..", "data", "eval", "retrieval_queries.jsonl")
+
+
+def timed(label, n, action):
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed:>7.2f}s  {elapsed / n * 1000:>7.2f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(QUERIES, encoding="utf-8") as f:
+        base = [json.loads(line)["query"] for line in f if line.strip()]
+
+    # Distinct texts so the cold passes really encode every query
+    queries = [f"{base[i % len(base)]} ({i})" for i in range(args.queries)]
+
+    index, chunks = chat_engine.load_vector_store()
+    chat_engine.embed_query("warm up")
+
+    def one_by_one():
+        for query in queries:
+            chat_engine.retrieve_chunks(query, index, chunks, k=args.k)
+
+    chat_engine.query_embeddings.clear()
+    timed("per query, cold cache", len(queries), one_by_one)
+    timed("per query, warm cache", len(queries), one_by_one)
+
+    chat_engine.query_embeddings.clear()
+    timed("retrieve_chunks_many", len(queries),
+          lambda: chat_engine.retrieve_chunks_many(queries, index, chunks, k=args.k))
+
+    print(chat_engine.query_embeddings.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Replays a stream of typical parent questions through generate_response
+with the semantic response cache and reports hit rate and latency saved,
+then a few two-turn sessions to show follow-ups hitting after the same
+opening exchange.
+Uses the real MiniLM embeddings and the offline FakeClient.
+
+    python benchmarks/bench_response_cache.py --threshold 0.9
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import llm_client
+from fake_llm import FakeClient
+from response_cache import SemanticResponseCache
+
+QUERIES = [
+    "What is the fee?",
+    "what is the fee",
+    "How much does it cost?",
+    "What are the fees for the program?",
+    "Do you teach robotics?",
+    "do you teach robotics",
+    "Is robotics taught at WizKlub?",
+    "Can I book a free demo?",
+    "How do I book a free demo class?",
+    "can i book a free demo",
+    "Which grades do you cover?",
+    "What grades are the programs for?",
+    "Do you partner with schools?",
+    "Do you partner with schools?",
+]
+
+# (opening question, follow-up); the follow-ups of sessions that opened
+# the same way share one cache entry
+SESSIONS = [
+    ("What is the fee?", "Is there a sibling discount?"),
+    ("What is the fee?", "is there a sibling  discount?"),
+    ("Do you teach robotics?", "Is there a sibling discount?"),
+    ("Do you teach robotics?", "Which grades is it for?"),
+    ("Do you teach robotics?", "Which grades is it for?"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    llm_client.set_client(FakeClient(latency=args.latency))
+
+    import chat_engine
+    chat_engine.response_cache = SemanticResponseCache(threshold=args.threshold)
+
+    chunks = ["WizKlub offers STEM programs for students from Grade 1 to Grade 10."]
+
+    start = time.perf_counter()
+    for query in QUERIES:
+        query_vector = chat_engine.embed_query(query)
+        chat_engine.generate_response(
+            query, chunks, [], user_type="Parent", query_vector=query_vector
+        )
+
+    for opening, follow_up in SESSIONS:
+        history = []
+
+        for query in (opening, follow_up):
+            answer = chat_engine.generate_response(
+                query, chunks, history, user_type="Parent",
+                query_vector=chat_engine.embed_query(query)
+            )
+            history = history + [("user", query), ("assistant", answer)]
+
+    elapsed = time.perf_counter() - start
+    total = len(QUERIES) + 2 * len(SESSIONS)
+
+    stats = chat_engine.response_cache.stats()
+    print(f"queries        : {total}")
+    print(f"hit rate       : {stats['hit_rate']:.0%} ({stats['hits']} hits)")
+    print(f"latency saved  : {stats['latency_saved']:.2f} s")
+    print(f"wall time      : {elapsed:.2f} s "
+          f"(uncached would be ~{total * args.latency:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
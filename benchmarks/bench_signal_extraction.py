@@ -0,0 +1,91 @@
+"""
+Measures how many Gemini extraction calls the rule-based pass avoids and
+how well its answers agree with labelled LLM output.
+
+    python benchmarks/bench_signal_extraction.py
+    python benchmarks/bench_signal_extraction.py --verbose
+
+Each line of data/eval/signal_corpus.jsonl holds a message and the fields
+the LLM extractor is expected to return for it.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from signal_rules import SIGNAL_FIELDS, extract_signals_locally, needs_llm
+
+CORPUS_PATH = os.path.join(ROOT, "data", "eval", "signal_corpus.jsonl")
+
+
+def same_value(field, got, expected):
+    if not got or not expected:
+        return not got and not expected
+
+    if field == "grade":
+        return re.findall(r"\d+", got) == re.findall(r"\d+", expected)
+
+    if field == "program_interest":
+        split = lambda value: {p.strip().lower() for p in value.split(",")}
+        return split(got) == split(expected)
+
+    return got.lower() == expected.lower()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    skipped = 0
+    field_hits = dict.fromkeys(SIGNAL_FIELDS, 0)
+    skipped_exact = 0
+    elapsed = 0.0
+
+    for item in corpus:
+        start = time.perf_counter()
+        result = extract_signals_locally(item["text"])
+        elapsed += time.perf_counter() - start
+
+        agree = {
+            field: same_value(field, result["signals"][field], item["expected"][field])
+            for field in SIGNAL_FIELDS
+        }
+
+        for field, ok in agree.items():
+            field_hits[field] += ok
+
+        if not needs_llm(result):
+            skipped += 1
+            skipped_exact += all(agree.values())
+
+        if args.verbose and not all(agree.values()):
+            llm = "LLM" if needs_llm(result) else "local"
+            print(f"[{llm}] {item['text']!r}")
+            for field in SIGNAL_FIELDS:
+                if not agree[field]:
+                    print(f"    {field}: got {result['signals'][field]!r}, "
+                          f"expected {item['expected'][field]!r}")
+
+    total = len(corpus)
+    print(f"messages                    : {total}")
+    print(f"LLM calls avoided           : {skipped}/{total} ({skipped / total:.0%})")
+    if skipped:
+        print(f"exact agreement when local  : {skipped_exact}/{skipped} "
+              f"({skipped_exact / skipped:.0%})")
+    print(f"local pass time per message : {elapsed / total * 1e6:.1f} us")
+    print("field agreement (all messages):")
+    for field in SIGNAL_FIELDS:
+        print(f"    {field:<17} {field_hits[field] / total:.0%}")
+
+
+if __name__ == "__main__":
+    main()
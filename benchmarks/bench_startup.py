@@ -0,0 +1,52 @@
+"""
+Cold-start cost of the shared model/index and the per-rerun overhead
+main.py pays once they are loaded.
+
+    python benchmarks/bench_startup.py --reruns 100
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=100)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import chat_engine
+    import_time = time.perf_counter() - start
+
+    import resources
+
+    start = time.perf_counter()
+    timings = resources.warmup()
+    cold = time.perf_counter() - start
+
+    # What every Streamlit rerun of main.py now does
+    start = time.perf_counter()
+    for _ in range(args.reruns):
+        resources.warmup()
+        chat_engine.load_vector_store()
+    rerun = (time.perf_counter() - start) / args.reruns
+
+    # What every rerun used to do: read the index and chunks from disk
+    start = time.perf_counter()
+    for _ in range(args.reruns):
+        resources._load_vector_store()
+    disk = (time.perf_counter() - start) / args.reruns
+
+    print(f"import chat_engine        : {import_time * 1000:.1f} ms")
+    for name, seconds in timings.items():
+        print(f"cold load {name:<16}: {seconds * 1000:.1f} ms")
+    print(f"cold start total          : {cold * 1000:.1f} ms")
+    print(f"per-rerun overhead now    : {rerun * 1e6:.1f} us")
+    print(f"per-rerun reload (before) : {disk * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Time to first token for the streaming reply path versus the blocking
+generate_response, using the offline FakeClient.
+
+    python benchmarks/bench_streaming.py --latency 0.8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import llm_client
+from fake_llm import FakeClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--first-token", type=float, default=0.2)
+    args = parser.parse_args()
+
+    llm_client.set_client(
+        FakeClient(latency=args.latency, first_token_latency=args.first_token)
+    )
+
+    from chat_engine import generate_response, generate_response_stream
+
+    query = "What programs does WizKlub offer?"
+    chunks = ["WizKlub offers STEM programs for students from Grade 1 to Grade 10."]
+
+    start = time.perf_counter()
+    generate_response(query, chunks, [])
+    blocking = time.perf_counter() - start
+
+    stream = generate_response_stream(query, chunks, [])
+    for _ in stream:
+        pass
+
+    print(f"blocking reply visible after : {blocking * 1000:.0f} ms")
+    print(f"streaming first token after  : {stream.ttft * 1000:.0f} ms")
+    print(f"streaming complete after     : {stream.total_time * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Builds the vector store from scratch into an empty working directory, once
+per index type, with a deterministic stand-in for the embedding model, then
+searches each result through the app's loader. Exits non-zero if a build
+fails, leaves its staging directory behind, or cannot find a chunk by its
+own embedding.
+
+    python benchmarks/check_build_index.py
+"""
+import os
+import sys
+import tempfile
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vector_store"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import build_index
+from chunk_store import ChunkStore
+from index_factory import INDEX_TYPES, load_index, prepare_vectors, read_manifest
+
+DIMENSION = 384
+DOCUMENTS = 40
+PARAGRAPHS = 30
+
+
+class HashModel:
+    """
+    Same text, same unit vector; unrelated texts are near-orthogonal.
+    """
+
+    def encode(self, texts, batch_size=None, pool=None):
+        vectors = np.empty((len(texts), DIMENSION), dtype=np.float32)
+
+        for i, text in enumerate(texts):
+            rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+            vectors[i] = rng.standard_normal(DIMENSION)
+
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def write_corpus(raw_dir):
+    os.makedirs(raw_dir)
+
+    for doc in range(DOCUMENTS):
+        paragraphs = [
+            f"Program {doc}.{p}: students in grade {p % 10 + 1} build robot {doc * 100 + p} "
+            f"and learn coding, logic and maths through project {p}."
+            for p in range(PARAGRAPHS)
+        ]
+
+        with open(os.path.join(raw_dir, f"doc_{doc:03d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Document {doc}\n\n" + "\n\n".join(paragraphs) + "\n")
+
+
+def check(index_type):
+    build_index.build_vector_store(full=True, index_type=index_type)
+
+    if os.path.exists(build_index.INDEX_DIR + ".tmp"):
+        return "staging directory left behind"
+
+    manifest = read_manifest(build_index.INDEX_DIR)
+    if manifest.get("index_type") != index_type:
+        return f"manifest says {manifest.get('index_type')!r}"
+
+    index = load_index(build_index.INDEX_PATH, manifest)
+    chunks = ChunkStore(build_index.INDEX_DIR)
+
+    # Every 25th chunk, queried with its own embedding, must come back
+    ids = [int(cid) for cid in chunks.ids[::25]]
+    texts = [build_index.embedding_text(chunks.get_record(cid)) for cid in ids]
+
+    _, found = index.search(prepare_vectors(build_index.get_model().encode(texts), manifest), 5)
+    missed = sum(cid not in row for cid, row in zip(ids, found.tolist()))
+
+    return f"{missed}/{len(ids)} chunks not found" if missed else None
+
+
+def main():
+    build_index._model = HashModel()
+    os.chdir(tempfile.mkdtemp())
+    write_corpus(build_index.RAW_DIR)
+
+    failed = False
+
+    for index_type in INDEX_TYPES:
+        # From nothing each time: no index directory, no embedding cache
+        for directory in (build_index.INDEX_DIR, build_index.CACHE_DIR):
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+                os.rmdir(directory)
+
+        try:
+            problem = check(index_type)
+        except Exception as e:
+            problem = repr(e)
+
+        failed = failed or problem is not None
+        print(f"{index_type:>9}: {problem or 'OK'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Concurrency stress test for demo booking: many threads, each with its own
+SQLite connection, race to book the same slot with book_slot(). Exits
+non-zero if the slot ends up over capacity, a seat is taken twice, or the
+number of successful bookings differs from the capacity.
+
+    python benchmarks/stress_booking.py --threads 32 --attempts 20 --capacity 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import database
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=20, help="bookings tried per thread")
+    parser.add_argument("--capacity", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5, help="slots hammered one after another")
+    args = parser.parse_args()
+
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "stress.db")
+    database.initialize_db()
+
+    slot_time, mode = "10:00 AM", "Online"
+    database.set_slot_capacity(slot_time, mode, args.capacity)
+
+    for i in range(args.threads):
+        database.save_lead(f"Parent {i}", f"parent{i}@example.com", "0", "Parent")
+
+    lead_ids = [
+        database.get_lead_by_email(f"parent{i}@example.com").id
+        for i in range(args.threads)
+    ]
+
+    failed = False
+
+    for round_no in range(args.rounds):
+        booking_date = f"2026-01-{round_no + 1:02d}"
+        barrier = threading.Barrier(args.threads)
+        results = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(lead_id):
+            barrier.wait()
+            booked = 0
+
+            try:
+                for _ in range(args.attempts):
+                    if database.book_slot(lead_id, booking_date, slot_time, mode) is not None:
+                        booked += 1
+
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+            finally:
+                database.close_connection()
+
+            with lock:
+                results.append(booked)
+
+        threads = [threading.Thread(target=worker, args=(lead_id,)) for lead_id in lead_ids]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        seats = [
+            seat for seat, in database.query("""
+            SELECT seat FROM bookings
+            WHERE booking_date = ? AND booking_time = ? AND mode = ?
+            """, (booking_date, slot_time, mode)).fetchall()
+        ]
+
+        ok = (
+            not errors
+            and sum(results) == args.capacity
+            and sorted(seats) == list(range(1, args.capacity + 1))
+        )
+        failed = failed or not ok
+
+        print(
+            f"{booking_date}: {args.threads * args.attempts} attempts in {elapsed:.2f}s, "
+            f"{sum(results)} booked, seats {sorted(seats)}, {len(errors)} error(s) "
+            f"-> {'OK' if ok else 'OVERBOOKED / INCONSISTENT'}"
+        )
+
+        for error in errors[:5]:
+            print("   ", error)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,509 @@
 import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import hashlib
 import faiss
 import numpy as np
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 
+from chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_text
+
 load_dotenv()
 
-# Load local embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Storage formats shared with the app live in app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from chunk_store import ChunkStore, ChunkStoreWriter
+from lexical_index import LexicalIndexWriter
+from index_factory import (
+    INDEX_TYPES,
+    MANIFEST_FILE,
+    MIN_POINTS_PER_CENTROID,
+    create_index,
+    needs_training,
+    normalizes,
+    prepare_vectors,
+    read_manifest,
+    resolve_params,
+    supports_remove,
+    write_manifest
+)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+RAW_DIR = os.path.join("data", "raw")
+INDEX_DIR = os.path.join("vector_store", "faiss_index")
+INDEX_PATH = os.path.join(INDEX_DIR, "index.faiss")
+CACHE_DIR = os.path.join("vector_store", "embedding_cache")
+
+SOURCE_EXTENSIONS = (".txt", ".md")
+
+# Chunks handled per pipeline step; bounds memory for any corpus size
+WINDOW_SIZE = 2048
+ENCODE_BATCH_SIZE = 64
+
+# Exact cosine search; switch to ivf_flat / hnsw / ivf_pq for large corpora
+DEFAULT_INDEX_TYPE = "flat_ip"
+
+# Loaded only when something actually needs embedding
+_model = None
+
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+
+# ===============================
+# CONTENT HASHING
+# ===============================
+
+def chunk_id(text):
+    """
+    Stable positive int64 derived from the chunk text; used both as the
+    FAISS id and as the embedding cache key.
+    """
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def iter_source_files(raw_dir=RAW_DIR):
+    for root, dirs, files in os.walk(raw_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(SOURCE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def embedding_text(chunk):
+    """
+    What gets embedded: the section title gives short chunks their context.
+    """
+    if chunk["section"]:
+        return f"{chunk['section']}: {chunk['text']}"
+    return chunk["text"]
+
+
+def iter_chunks(raw_dir=RAW_DIR, max_tokens=DEFAULT_MAX_TOKENS,
+                overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Lazily yields (chunk_id, chunk) over every source file, one file in
+    memory at a time. Identical chunks are yielded once.
+    """
+    seen = set()
+
+    for path in iter_source_files(raw_dir):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        source = os.path.relpath(path, raw_dir)
+
+        for chunk in chunk_text(text, source, max_tokens, overlap_tokens):
+            cid = chunk_id(embedding_text(chunk))
+
+            if cid not in seen:
+                seen.add(cid)
+                yield cid, chunk
+
+
+def iter_windows(items, size=WINDOW_SIZE):
+    window = []
+
+    for item in items:
+        window.append(item)
+
+        if len(window) == size:
+            yield window
+            window = []
+
+    if window:
+        yield window
+
+
+# ===============================
+# EMBEDDING CACHE
+# ===============================
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by chunk id. Saved vectors are memory-mapped and new
+    ones are appended to a scratch file, so the cache never has to be held
+    in memory. The cache is discarded if it was built with another model.
+    """
+
+    def __init__(self, directory=CACHE_DIR, model_name=MODEL_NAME):
+        self.directory = directory
+        self.model_name = model_name
+
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors = None
+
+        self._new_ids = {}
+        self._new_path = os.path.join(directory, "pending.f32")
+        self._new_file = None
+        self.dimension = None
+
+        self._load()
+
+    def _paths(self):
+        return (
+            os.path.join(self.directory, "ids.npy"),
+            os.path.join(self.directory, "vectors.npy"),
+            os.path.join(self.directory, "model.json")
+        )
+
+    def _load(self):
+        ids_path, vectors_path, model_path = self._paths()
+
+        try:
+            with open(model_path, encoding="utf-8") as f:
+                if json.load(f)["model"] != self.model_name:
+                    return
+
+            ids = np.load(ids_path)
+            vectors = np.load(vectors_path, mmap_mode="r")
+
+        except (OSError, ValueError, KeyError):
+            return
+
+        if len(ids) and len(ids) == len(vectors):
+            self._ids = ids
+            self._vectors = vectors
+            self.dimension = vectors.shape[1]
+
+    def _saved_position(self, cid):
+        i = int(np.searchsorted(self._ids, cid))
+        if i < len(self._ids) and self._ids[i] == cid:
+            return i
+        return None
+
+    def __contains__(self, cid):
+        return cid in self._new_ids or self._saved_position(cid) is not None
+
+    def get(self, cids):
+        """
+        Stacked vectors for cids; every id must be in the cache.
+        """
+        if self._new_file:
+            self._new_file.flush()
+
+        new = None
+        rows = []
+
+        for cid in cids:
+            if cid in self._new_ids:
+                if new is None:
+                    new = np.memmap(self._new_path, dtype=np.float32, mode="r")
+                    new = new.reshape(-1, self.dimension)
+                rows.append(new[self._new_ids[cid]])
+            else:
+                rows.append(self._vectors[self._saved_position(cid)])
+
+        return np.array(rows, dtype=np.float32).reshape(len(cids), -1)
+
+    def put(self, cids, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        if self._new_file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._new_file = open(self._new_path, "wb")
+            self.dimension = vectors.shape[1]
+
+        for cid, vector in zip(cids, vectors):
+            self._new_ids[cid] = len(self._new_ids)
+            self._new_file.write(vector.tobytes())
+
+    def save(self, keep_ids):
+        """
+        Rewrites the cache with exactly keep_ids, streaming in windows.
+        """
+        ids_path, vectors_path, model_path = self._paths()
+        keep = np.array(sorted(cid for cid in keep_ids if cid in self), dtype=np.int64)
+
+        tmp_vectors = vectors_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(
+            tmp_vectors, mode="w+", dtype=np.float32,
+            shape=(len(keep), self.dimension or 0)
+        )
+
+        for start in range(0, len(keep), WINDOW_SIZE):
+            window = keep[start:start + WINDOW_SIZE].tolist()
+            out[start:start + len(window)] = self.get(window)
+
+        out.flush()
+        del out
+
+        self._vectors = None
+        os.replace(tmp_vectors, vectors_path)
+        np.save(ids_path, keep)
+
+        with open(model_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name}, f)
 
-def split_text(text, chunk_size=500, overlap=50):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+        if self._new_file:
+            self._new_file.close()
+            os.remove(self._new_path)
 
-def build_vector_store():
-    file_path = os.path.join("data", "raw", "wizklub_content.txt")
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read()
+# ===============================
+# EMBEDDING
+# ===============================
 
-    chunks = split_text(text)
+class Encoder:
+    """
+    Encodes in fixed-size batches, across several CPU worker processes when
+    workers > 1 (SentenceTransformer's multi-process pool).
+    """
 
-    embeddings = model.encode(chunks)
+    def __init__(self, workers=1, batch_size=ENCODE_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool = None
 
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.array(embeddings))
+    def encode(self, texts):
+        model = get_model()
 
-    os.makedirs("vector_store/faiss_index", exist_ok=True)
+        if self.workers > 1:
+            if self._pool is None:
+                self._pool = model.start_multi_process_pool(
+                    target_devices=["cpu"] * self.workers
+                )
+            return model.encode(texts, pool=self._pool, batch_size=self.batch_size)
 
-    faiss.write_index(index, "vector_store/faiss_index/index.faiss")
-    np.save("vector_store/faiss_index/chunks.npy", np.array(chunks))
+        return model.encode(texts, batch_size=self.batch_size)
+
+    def close(self):
+        if self._pool is not None:
+            get_model().stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+# ===============================
+# INDEX BUILD
+# ===============================
+
+def load_existing_index(index_type, index_params=None):
+    """
+    Returns (index, manifest, ids) from the previous build when it was made
+    with the same model, index type and parameters, so it can be updated in
+    place; otherwise (None, None, set()).
+    """
+    manifest = read_manifest(INDEX_DIR)
+
+    if manifest.get("model") != MODEL_NAME or manifest.get("index_type") != index_type:
+        return None, None, set()
+
+    # Only builds from this builder (which record their chunker) have ids
+    # to update in place; the legacy store shipped in the repo does not
+    if "chunker" not in manifest:
+        return None, None, set()
+
+    built_params = manifest.get("params", {})
+    if any(built_params.get(key) != value for key, value in (index_params or {}).items()):
+        return None, None, set()
+
+    try:
+        index = faiss.read_index(INDEX_PATH)
+        ids = set(ChunkStore(INDEX_DIR).ids.tolist())
+
+    except (OSError, ValueError, RuntimeError):
+        return None, None, set()
+
+    return index, manifest, ids
+
+
+def training_size(index_type, index_params=None):
+    """
+    Vectors to collect before an index of this type can be created.
+    """
+    if not needs_training(index_type):
+        return 1
+
+    params = resolve_params(index_type, index_params)
+    return params["nlist"] * MIN_POINTS_PER_CENTROID
+
+
+def new_index(cache, index_type, index_params, train_ids):
+    trained_on = len(train_ids) if needs_training(index_type) else None
+    params = resolve_params(index_type, index_params, n_train=trained_on)
+
+    manifest = {
+        "model": MODEL_NAME,
+        "dimension": cache.dimension,
+        "index_type": index_type,
+        "params": params,
+        "normalize": normalizes(index_type)
+    }
+
+    index = create_index(index_type, cache.dimension, params)
+
+    if trained_on:
+        print(f"  training {index_type} on {trained_on} vectors {params}")
+        index.train(prepare_vectors(cache.get(train_ids), manifest))
+
+    return index, manifest
+
+
+def add_to_index(index, manifest, cache, ids):
+    for window in iter_windows(ids):
+        vectors = prepare_vectors(cache.get(window), manifest)
+        index.add_with_ids(vectors, np.array(window, dtype=np.int64))
+
+
+def build_vector_store(full=False, workers=1, batch_size=ENCODE_BATCH_SIZE,
+                       window_size=WINDOW_SIZE, index_type=DEFAULT_INDEX_TYPE,
+                       index_params=None, max_tokens=DEFAULT_MAX_TOKENS,
+                       overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    start = time.perf_counter()
+
+    cache = EmbeddingCache()
+    encoder = Encoder(workers=workers, batch_size=batch_size)
+
+    index, manifest, existing_ids = (
+        (None, None, set()) if full
+        else load_existing_index(index_type, index_params)
+    )
+
+    # New indexes that need training hold ids back until there is enough
+    # data to train on; the vectors themselves stay in the cache.
+    pending = []
+    train_size = training_size(index_type, index_params)
+
+    # Staged next to the live files and swapped in at the end
+    staging_dir = INDEX_DIR + ".tmp"
+    writer = ChunkStoreWriter(staging_dir)
+    lexical = LexicalIndexWriter(staging_dir)
+
+    ids = []
+    added = 0
+    embedded = 0
+
+    try:
+        chunks = iter_chunks(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+        for window in iter_windows(chunks, window_size):
+
+            missing = [(cid, chunk) for cid, chunk in window if cid not in cache]
+
+            if missing:
+                vectors = encoder.encode([embedding_text(chunk) for _, chunk in missing])
+                cache.put([cid for cid, _ in missing], vectors)
+                embedded += len(missing)
+
+            new = [cid for cid, _ in window if cid not in existing_ids]
+
+            if index is None:
+                pending.extend(new)
+
+                if len(pending) >= train_size:
+                    index, manifest = new_index(cache, index_type, index_params, pending)
+                    add_to_index(index, manifest, cache, pending)
+                    added += len(pending)
+                    pending = []
+
+            elif new:
+                add_to_index(index, manifest, cache, new)
+                added += len(new)
+
+            for cid, chunk in window:
+                writer.add(cid, chunk["text"], {
+                    "source": chunk["source"],
+                    "section": chunk["section"],
+                    "start": chunk["start"],
+                    "end": chunk["end"]
+                })
+                lexical.add(cid, embedding_text(chunk))
+                ids.append(cid)
+
+            rate = len(ids) / max(time.perf_counter() - start, 1e-9)
+            print(f"  {len(ids)} chunks processed ({embedded} embedded, {rate:.0f} chunks/s)")
+
+    finally:
+        encoder.close()
+        writer.close()
+        lexical.close()
+
+    if not ids:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        print("No source chunks found under", RAW_DIR)
+        return
+
+    # Corpus smaller than the training target: train on all of it
+    if index is None:
+        index, manifest = new_index(cache, index_type, index_params, pending)
+        add_to_index(index, manifest, cache, pending)
+        added += len(pending)
+
+    removed = existing_ids - set(ids)
+
+    if removed and supports_remove(index_type):
+        index.remove_ids(np.array(sorted(removed), dtype=np.int64))
+
+    elif removed:
+        # Cached embeddings make this a re-index, not a re-embed
+        index, manifest = new_index(cache, index_type, index_params, ids)
+        add_to_index(index, manifest, cache, ids)
+
+    faiss.write_index(index, os.path.join(staging_dir, "index.faiss"))
+
+    manifest["chunk_count"] = len(ids)
+    manifest["chunker"] = {"max_tokens": max_tokens, "overlap_tokens": overlap_tokens}
+    write_manifest(staging_dir, manifest)
+
+    # The manifest goes in last, so it never describes files older than it
+    names = sorted(os.listdir(staging_dir), key=lambda name: name == MANIFEST_FILE)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+    for name in names:
+        os.replace(os.path.join(staging_dir, name), os.path.join(INDEX_DIR, name))
+    os.rmdir(staging_dir)
+
+    cache.save(ids)
+
+    print(
+        f"✅ Vector database built ({index_type}): {len(ids)} chunks, {added} added, "
+        f"{len(removed)} removed, {embedded} embedded "
+        f"in {time.perf_counter() - start:.2f}s."
+    )
+
+
+def parse_index_params(pairs):
+    params = {}
+
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        params[key] = int(value)
+
+    return params
 
-    print("✅ Vector database built successfully (local embeddings).")
 
 if __name__ == "__main__":
-    build_vector_store()
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store.")
+    parser.add_argument("--full", action="store_true", help="rebuild the index from scratch")
+    parser.add_argument("--workers", type=int, default=1, help="embedding worker processes")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="chunks per pipeline step")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="chunk token budget")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=DEFAULT_INDEX_TYPE)
+    parser.add_argument(
+        "--param", action="append", default=[], metavar="KEY=VALUE",
+        help="index parameter, e.g. nlist=256, nprobe=32, M=32, efSearch=128, m=48, nbits=8"
+    )
+    args = parser.parse_args()
+
+    build_vector_store(
+        full=args.full,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        window_size=args.window,
+        index_type=args.index_type,
+        index_params=parse_index_params(args.param),
+        max_tokens=args.max_tokens,
+        overlap_tokens=args.overlap_tokens
+    )
@@ -0,0 +1,198 @@
+import re
+
+# ===============================
+# SEMANTIC CHUNKER
+# ===============================
+
+# Splits a document into sections (at headings), paragraphs and sentences,
+# then packs whole sentences into chunks up to a token budget. Chunks never
+# cross a section boundary and never cut a word or sentence unless a single
+# sentence is longer than the budget. Consecutive chunks in a section share
+# up to overlap_tokens worth of trailing sentences.
+#
+# Each chunk is a dict:
+#   {"text", "source", "section", "start", "end"}
+# where start/end are character offsets of text in the source file.
+
+# MiniLM truncates input at 256 word pieces; stay well below it
+DEFAULT_MAX_TOKENS = 160
+DEFAULT_OVERLAP_TOKENS = 30
+
+MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def count_tokens(text):
+    """
+    Cheap word-piece estimate: long words split into several pieces.
+    """
+    return sum(1 + len(token) // 8 for token in TOKEN_PATTERN.findall(text))
+
+
+def _heading_title(line):
+    """
+    Section title if the line is a heading, else None. Besides markdown
+    headings, short lines ending in ':' and short ALL CAPS lines count.
+    """
+    match = MARKDOWN_HEADING.match(line)
+    if match:
+        return match.group(1)
+
+    stripped = line.strip()
+    words = stripped.split()
+
+    if not words or len(words) > 8:
+        return None
+
+    if stripped.endswith(":") and not stripped.endswith("::"):
+        return stripped[:-1].strip()
+
+    if stripped.isupper() and any(c.isalpha() for c in stripped):
+        return stripped.title()
+
+    return None
+
+
+def iter_sections(text):
+    """
+    Yields (title, start, end) spans; text before the first heading has
+    title None.
+    """
+    title = None
+    start = 0
+    offset = 0
+
+    for line in text.splitlines(keepends=True):
+        heading = _heading_title(line)
+
+        if heading is not None:
+            if text[start:offset].strip():
+                yield title, start, offset
+            title = heading
+            start = offset + len(line)
+
+        offset += len(line)
+
+    if text[start:].strip():
+        yield title, start, len(text)
+
+
+def _iter_spans(text, pattern, start, end):
+    """
+    Non-blank pieces of text[start:end] between pattern matches, with
+    surrounding whitespace trimmed from the offsets.
+    """
+    position = start
+
+    for match in pattern.finditer(text, start, end):
+        yield from _trim(text, position, match.start())
+        position = match.end()
+
+    yield from _trim(text, position, end)
+
+
+def _trim(text, start, end):
+    piece = text[start:end]
+    stripped = piece.strip()
+
+    if stripped:
+        start += len(piece) - len(piece.lstrip())
+        yield start, start + len(stripped)
+
+
+def _split_long(text, start, end, max_tokens):
+    """
+    Word-boundary pieces of a sentence that alone exceeds the budget.
+    """
+    piece_start = start
+    tokens = 0
+
+    for match in re.finditer(r"\S+", text[start:end]):
+        word_tokens = count_tokens(match.group())
+
+        if tokens and tokens + word_tokens > max_tokens:
+            yield piece_start, start + match.start() - 1
+            piece_start = start + match.start()
+            tokens = 0
+
+        tokens += word_tokens
+
+    yield from _trim(text, piece_start, end)
+
+
+def iter_units(text, start, end, max_tokens):
+    """
+    Sentence spans of a section, each tagged with whether it opens a new
+    paragraph.
+    """
+    for para_start, para_end in _iter_spans(text, PARAGRAPH_BREAK, start, end):
+        first = True
+
+        for sent_start, sent_end in _iter_spans(text, SENTENCE_END, para_start, para_end):
+            spans = [(sent_start, sent_end)]
+
+            if count_tokens(text[sent_start:sent_end]) > max_tokens:
+                spans = list(_split_long(text, sent_start, sent_end, max_tokens))
+
+            for span in spans:
+                yield span, first
+                first = False
+
+
+def chunk_text(text, source=None, max_tokens=DEFAULT_MAX_TOKENS,
+               overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Yields chunk dicts for one document.
+    """
+    for section, start, end in iter_sections(text):
+
+        # (start, end, tokens) of the sentences in the current chunk
+        window = []
+
+        for (unit_start, unit_end), new_paragraph in iter_units(text, start, end, max_tokens):
+            unit_tokens = count_tokens(text[unit_start:unit_end])
+            tokens = sum(t for _, _, t in window)
+
+            # Prefer to close a chunk at a paragraph break once it is
+            # reasonably full, not only when the budget runs out
+            full = tokens + unit_tokens > max_tokens
+            soft_break = new_paragraph and tokens >= max_tokens * 0.75
+
+            if window and (full or soft_break):
+                yield _chunk(text, source, section, window)
+                window = _overlap(window, overlap_tokens, max_tokens - unit_tokens)
+
+            window.append((unit_start, unit_end, unit_tokens))
+
+        if window:
+            yield _chunk(text, source, section, window)
+
+
+def _chunk(text, source, section, window):
+    start, end = window[0][0], window[-1][1]
+    return {
+        "text": text[start:end],
+        "source": source,
+        "section": section,
+        "start": start,
+        "end": end
+    }
+
+
+def _overlap(window, overlap_tokens, room):
+    """
+    Trailing sentences of window worth at most overlap_tokens (and at most
+    room, so the next sentence still fits).
+    """
+    carried = []
+    budget = min(overlap_tokens, room)
+
+    for unit in reversed(window):
+        if unit[2] > budget:
+            break
+        carried.insert(0, unit)
+        budget -= unit[2]
+
+    return carried